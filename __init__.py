@@ -1,13 +1,18 @@
 import logging
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import discovery
+from typing import TYPE_CHECKING
 from .const import DOMAIN
 
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
 
 _LOGGER = logging.getLogger(__name__)
 
 
-async def async_setup(hass:HomeAssistant, config):
+async def async_setup(hass:"HomeAssistant", config):
+    # imported here, so the simulator can import the package without Home Assistant
+    from homeassistant.helpers import discovery
+
     hass.states.async_set('valves.valves_queue', 0)
     await discovery.async_load_platform(hass, "cover", DOMAIN, config[DOMAIN], config)
     return True
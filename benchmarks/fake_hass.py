@@ -0,0 +1,205 @@
+import asyncio
+import os
+import tempfile
+
+from types import SimpleNamespace
+from typing import Any, Callable, Union
+
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import CoreState, Event, State
+from homeassistant.helpers.entity_registry import DATA_REGISTRY
+from homeassistant.helpers.restore_state import DATA_RESTORE_STATE
+
+# Lightweight in-process stand-in for the parts of a HomeAssistant instance the
+# valves component uses. It is not a full core: listeners run synchronously in
+# the thread which sets a state, and services are plain callables.
+
+class FakeBus:
+    def __init__(self, hass:"FakeHass"):
+        self._hass = hass
+        self._listeners: dict[str, list[tuple]] = {}
+        self.fired = 0
+
+    def async_listen(self, event_type:str, listener:Callable, event_filter=None,
+            run_immediately:bool = False) -> Callable[[], None]:
+        # run_immediately is ignored - every listener runs immediately
+        _ = (run_immediately)
+        entry = (listener, event_filter)
+        self._listeners.setdefault(event_type, []).append(entry)
+
+        def remove_listener():
+            listeners = self._listeners.get(event_type, [])
+            if entry in listeners:
+                listeners.remove(entry)
+        return remove_listener
+
+    def async_listen_once(self, event_type:str, listener:Callable) -> Callable[[], None]:
+        remove_listener = None
+
+        def listen_once(event):
+            remove_listener()
+            return listener(event)
+        remove_listener = self.async_listen(event_type, listen_once)
+        return remove_listener
+
+    def async_fire(self, event_type:str, event_data:Union[dict, None] = None) -> None:
+        self.fired += 1
+        event = Event(event_type, event_data or {})
+        for listener, event_filter in list(self._listeners.get(event_type, [])):
+            if event_filter is not None and not event_filter(event):
+                continue
+            self._hass.async_handle_result(listener(event))
+
+
+class FakeStates:
+    def __init__(self, hass:"FakeHass"):
+        self._hass = hass
+        self._states: dict[str, State] = {}
+        self.writes = 0
+
+    def get(self, entity_id:str) -> Union[State, None]:
+        return self._states.get(entity_id)
+
+    def async_all(self) -> list[State]:
+        return list(self._states.values())
+
+    def async_entity_ids(self) -> list[str]:
+        return list(self._states.keys())
+
+    def async_set(self, entity_id:str, new_state:Any, attributes:Union[dict, None] = None,
+            force_update:bool = False, context=None) -> None:
+        _ = (force_update, context)
+        self.writes += 1
+        old_state = self._states.get(entity_id)
+        state = State(entity_id, str(new_state), attributes)
+        self._states[entity_id] = state
+        self._hass.bus.async_fire(EVENT_STATE_CHANGED, {
+            "entity_id": entity_id,
+            "old_state": old_state,
+            "new_state": state
+        })
+
+    set = async_set
+
+    def async_set_attributes(self, entity_id:str, **attributes) -> None:
+        # update some attributes of an existing state, e.g. when a fake device reacts
+        state = self._states[entity_id]
+        new_attributes = dict(state.attributes)
+        new_attributes.update(attributes)
+        self.async_set(entity_id, state.state, new_attributes)
+
+
+class FakeServices:
+    def __init__(self, hass:"FakeHass", latency:float = 0.0):
+        self._hass = hass
+        # simulated round trip of async service calls in seconds
+        self.latency = latency
+        self._handlers: dict[tuple[str, str], Callable[[dict], Any]] = {}
+        self.calls: dict[tuple[str, str], int] = {}
+        self.in_flight = 0
+
+    def async_register(self, domain:str, service:str, handler:Callable[[dict], Any],
+            schema=None) -> None:
+        _ = (schema)
+        self._handlers[(domain, service)] = handler
+
+    def _handle(self, domain:str, service:str, data:Union[dict, None]) -> Any:
+        key = (domain, service)
+        self.calls[key] = self.calls.get(key, 0) + 1
+        handler = self._handlers.get(key)
+        return None if handler is None else handler(data or {})
+
+    def call(self, domain:str, service:str, service_data:Union[dict, None] = None,
+            blocking:bool = False, **kwargs) -> Any:
+        _ = (blocking, kwargs)
+        return self._handle(domain, service, service_data)
+
+    async def async_call(self, domain:str, service:str, service_data:Union[dict, None] = None,
+            blocking:bool = False, **kwargs) -> Any:
+        _ = (blocking, kwargs)
+        self.in_flight += 1
+        try:
+            if self.latency > 0.0:
+                await asyncio.sleep(self.latency)
+            return self._handle(domain, service, service_data)
+        finally:
+            self.in_flight -= 1
+
+    @property
+    def call_count(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeEntityRegistry:
+    def __init__(self):
+        self._entries: dict[str, SimpleNamespace] = {}
+
+    def async_register(self, entity_id:str, device_id:str) -> None:
+        self._entries[entity_id] = SimpleNamespace(
+                entity_id=entity_id,
+                device_id=device_id,
+                display_json_repr=f'{{"entity_id":"{entity_id}","device_id":"{device_id}"}}')
+
+    def async_get(self, entity_id:str) -> Union[SimpleNamespace, None]:
+        return self._entries.get(entity_id)
+
+    def async_get_device_id(self, entity_id:str) -> Union[str, None]:
+        entry = self._entries.get(entity_id)
+        return None if entry is None else entry.device_id
+
+    @property
+    def entities(self) -> dict[str, SimpleNamespace]:
+        return self._entries
+
+
+class FakeRestoreStateData:
+    def __init__(self):
+        self.last_states = {}
+
+    def async_restore_entity_added(self, entity) -> None:
+        _ = (entity)
+
+    def async_restore_entity_removed(self, entity_id:str, extra_data=None) -> None:
+        _ = (entity_id, extra_data)
+
+
+class FakeConfig:
+    def __init__(self, config_dir:str):
+        self.config_dir = config_dir
+        self.components = set()
+
+    def path(self, *path:str) -> str:
+        return os.path.join(self.config_dir, *path)
+
+
+class FakeHass:
+    def __init__(self, loop:Union[asyncio.AbstractEventLoop, None] = None,
+            service_latency:float = 0.0):
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.data = {}
+        self.state = CoreState.running
+        self.config = FakeConfig(tempfile.mkdtemp(prefix="valves_benchmark_"))
+        self.bus = FakeBus(self)
+        self.states = FakeStates(self)
+        self.services = FakeServices(self, service_latency)
+        self.entity_registry = FakeEntityRegistry()
+        self.data[DATA_REGISTRY] = self.entity_registry
+        self.data[DATA_RESTORE_STATE] = FakeRestoreStateData()
+
+    def async_handle_result(self, result) -> None:
+        if asyncio.iscoroutine(result):
+            self.loop.create_task(result)
+
+    def async_run_hass_job(self, hassjob, *args) -> None:
+        self.async_handle_result(hassjob.target(*args))
+
+    def async_add_hass_job(self, hassjob, *args) -> None:
+        self.async_run_hass_job(hassjob, *args)
+
+    def async_create_task(self, target, name:Union[str, None] = None, **kwargs) -> asyncio.Task:
+        # e.g. eager_start of newer Home Assistant versions
+        _ = (name, kwargs)
+        return self.loop.create_task(target)
+
+    def async_add_executor_job(self, target:Callable, *args) -> asyncio.Future:
+        return self.loop.run_in_executor(None, target, *args)
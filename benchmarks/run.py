@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Union
+
+from homeassistant.util import utcnow
+
+from ..const import LOGGER, SLOPE_ESTIMATOR_DELTA, SLOPE_ESTIMATOR_REGRESSION
+from ..cover import async_setup_platform
+from ..temperature_history import TemperatureHistory
+from .fake_hass import FakeHass
+
+# Benchmarks of the valves component against a fake Home Assistant core. Run
+# from the directory containing the valves package (Home Assistant must be
+# importable, it is not started):
+#
+#   python -m valves.benchmarks --valves 200 --rounds 20
+
+BACKENDS = ("homematic", "homematicip_local", "eurotronic", "bosch", "shelly")
+DUTY_CYCLE_SENSOR = "sensor.benchmark_duty_cycle"
+
+
+def build_fleet(hass:FakeHass, count:int, random_generator:random.Random) -> list[dict]:
+    # Creates the states of count valves with thermostats, spread over all backends,
+    # and fake devices which report written positions back.
+    hass.states.async_set("input_boolean.heating_on", "on")
+    hass.states.async_set("sensor.temperature_adjust", "0.0")
+    hass.states.async_set(DUTY_CYCLE_SENSOR, "10")
+    valve_configs = []
+    addresses = {}
+    device_ids = {}
+    for index in range(count):
+        backend = BACKENDS[index % len(BACKENDS)]
+        valve_id = f"climate.benchmark_{backend}_{index}"
+        thermostat_id = f"climate.benchmark_thermostat_{index}"
+        temperature = round(random_generator.uniform(19.0, 22.0), 1)
+        valve_temperature = round(temperature + random_generator.uniform(0.0, 3.0), 1)
+        position = random_generator.randint(0, 30)
+        hass.states.async_set(thermostat_id, "heat", {
+            "current_temperature": temperature,
+            "temperature": 21.0
+        })
+        valve_config = {
+            "id": valve_id,
+            "thermostat_sensor": thermostat_id
+        }
+        if backend == "homematic":
+            addresses[f"BENCH{index:07d}"] = valve_id
+            hass.states.async_set(valve_id, "heat", {
+                "interface": "rf",
+                "id": f"BENCH{index:07d}",
+                "current_temperature": valve_temperature,
+                "temperature": 30.5,
+                "valve": position
+            })
+        elif backend == "homematicip_local":
+            valve_position_id = f"sensor.benchmark_valve_position_{index}"
+            valve_config["valve_position"] = valve_position_id
+            device_ids[f"device{index}"] = valve_position_id
+            hass.entity_registry.async_register(valve_id, f"device{index}")
+            hass.states.async_set(valve_id, "heat", {
+                "interface_id": "benchmark-BidCos-RF",
+                "current_temperature": valve_temperature,
+                "temperature": 30.5
+            })
+            hass.states.async_set(valve_position_id, position)
+        elif backend == "eurotronic":
+            hass.states.async_set(valve_id, "auto", {
+                "eurotronic_system_mode": 1,
+                "local_temperature": valve_temperature,
+                "temperature": 30,
+                "pi_heating_demand": position
+            })
+        elif backend == "bosch":
+            valve_config["type"] = "bosch"
+            hass.states.async_set(valve_id, "heat", {
+                "local_temperature": valve_temperature,
+                "pi_heating_demand": position
+            })
+        else:
+            valve_position_id = f"number.benchmark_valve_position_{index}"
+            valve_config["type"] = "shelly"
+            valve_config["valve_position"] = valve_position_id
+            hass.states.async_set(valve_id, "heat", {
+                "current_temperature": valve_temperature
+            })
+            hass.states.async_set(valve_position_id, position)
+        valve_configs.append(valve_config)
+
+    def homematic_put_paramset(data):
+        hass.states.async_set_attributes(
+                addresses[data["address"]], valve=data["paramset"]["VALVE_MAXIMUM_POSITION"])
+
+    def homematicip_local_put_paramset(data):
+        hass.states.async_set(
+                device_ids[data["device_id"]], data["paramset"]["VALVE_MAXIMUM_POSITION"])
+
+    def mqtt_publish(data):
+        topic = data["topic"]
+        entity_id = "climate." + topic.split("/")[1]
+        if topic.endswith("/set/eurotronic_valve_position"):
+            hass.states.async_set_attributes(
+                    entity_id, pi_heating_demand=round(int(data["payload"]) * 100 / 255))
+        elif topic.endswith("/set"):
+            hass.states.async_set_attributes(
+                    entity_id, pi_heating_demand=json.loads(data["payload"])["pi_heating_demand"])
+        return True
+
+    def number_set_value(data):
+        hass.states.async_set(data["entity_id"], data["value"])
+
+    hass.services.async_register("homematic", "put_paramset", homematic_put_paramset)
+    hass.services.async_register(
+            "homematicip_local", "put_paramset", homematicip_local_put_paramset)
+    hass.services.async_register("mqtt", "publish", mqtt_publish)
+    hass.services.async_register("number", "set_value", number_set_value)
+    return valve_configs
+
+
+def random_walk(hass:FakeHass, valve_configs:list[dict], random_generator:random.Random) -> None:
+    # new temperatures for all thermostats and valves, like a round of sensor reports
+    for valve_config in valve_configs:
+        thermostat_state = hass.states.get(valve_config["thermostat_sensor"])
+        temperature = thermostat_state.attributes["current_temperature"]
+        hass.states.async_set_attributes(
+                valve_config["thermostat_sensor"],
+                current_temperature=round(temperature + random_generator.gauss(0.0, 0.1), 1))
+        valve_state = hass.states.get(valve_config["id"])
+        for attribute in ("current_temperature", "local_temperature"):
+            if attribute in valve_state.attributes:
+                hass.states.async_set_attributes(valve_config["id"], **{
+                    attribute: round(
+                            valve_state.attributes[attribute] + random_generator.gauss(0.0, 0.1),
+                            1)
+                })
+
+
+class LoopMonitor:
+    # Measures how late a short periodic sleep wakes up, i.e. how long the event
+    # loop was blocked.
+
+    def __init__(self, interval:float = 0.001):
+        self._interval = interval
+        self._lags: list[float] = []
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self._interval)
+            self._lags.append(loop.time() - started_at - self._interval)
+
+    def reset(self) -> list[float]:
+        lags = self._lags
+        self._lags = []
+        return lags
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+def percentile(values:list[float], fraction:float) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def latency_stats(seconds:list[float]) -> dict:
+    # in milliseconds
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.fmean(seconds) * 1000.0, 4) if len(seconds) > 0 else 0.0,
+        "p50_ms": round(percentile(seconds, 0.5) * 1000.0, 4),
+        "p95_ms": round(percentile(seconds, 0.95) * 1000.0, 4),
+        "max_ms": round(max(seconds, default=0.0) * 1000.0, 4)
+    }
+
+
+async def async_timed_updates(covers:list,
+        attributes:bool = True) -> tuple[list[float], list[float]]:
+    update_seconds = []
+    attributes_seconds = []
+    for cover in covers:
+        started_at = time.perf_counter()
+        await cover.async_update_valve()
+        update_seconds.append(time.perf_counter() - started_at)
+        if attributes:
+            started_at = time.perf_counter()
+            _ = cover.extra_state_attributes
+            attributes_seconds.append(time.perf_counter() - started_at)
+    return update_seconds, attributes_seconds
+
+
+def benchmark_temperature_history(samples:int) -> dict:
+    results = {}
+    for slope_estimator in (SLOPE_ESTIMATOR_DELTA, SLOPE_ESTIMATOR_REGRESSION):
+        history = TemperatureHistory(timedelta(minutes=60), slope_estimator=slope_estimator)
+        now = time.time()
+        started_at = time.perf_counter()
+        for index in range(samples):
+            history.add_value(20.0 + (index % 10) * 0.1, now + index * 30.0)
+            _ = history.slope_at(now + index * 30.0)
+        seconds = time.perf_counter() - started_at
+        results[slope_estimator] = {
+            "samples": samples,
+            "us_per_sample": round(seconds / samples * 1e6, 3)
+        }
+    return results
+
+
+async def async_run(args) -> dict:
+    loop = asyncio.get_running_loop()
+    random_generator = random.Random(args.seed)
+    hass = FakeHass(loop, args.service_latency)
+    valve_configs = build_fleet(hass, args.valves, random_generator)
+    results = {"valves": args.valves}
+    monitor = LoopMonitor()
+    monitor.start()
+
+    covers = []
+    config = {
+        "homematic_duty_cycle_sensor": DUTY_CYCLE_SENSOR,
+        "push_entities": args.push,
+        "queue_batch_size": args.batch_size,
+        # the queue is drained as fast as the backends allow
+        "queue_interval": {backend: args.queue_interval for backend in BACKENDS},
+        # the duty cycle budget is not the subject of this benchmark
+        "duty_cycle_target": 1e9
+    }
+    started_at = time.perf_counter()
+    await async_setup_platform(
+            hass, {}, covers.extend, {"config": config, "entities": valve_configs})
+    platform = SimpleNamespace(domain="cover")
+    for cover in covers:
+        cover.hass = hass
+        cover.platform = platform
+        cover.entity_id = cover.unique_id
+        await cover.async_added_to_hass()
+    await asyncio.sleep(0)
+    results["setup_ms"] = round((time.perf_counter() - started_at) * 1000.0, 1)
+    valves_queue = covers[0]._valves_queue
+    monitor.reset()
+
+    # steady state updates, on the event loop like Home Assistant does for
+    # polled entities
+    update_seconds = []
+    attributes_seconds = []
+    for _ in range(args.rounds):
+        random_walk(hass, valve_configs, random_generator)
+        seconds = await async_timed_updates(covers)
+        update_seconds.extend(seconds[0])
+        attributes_seconds.extend(seconds[1])
+    results["update"] = latency_stats(update_seconds)
+    results["attributes"] = latency_stats(attributes_seconds)
+    results["update_loop_lag"] = latency_stats(monitor.reset())
+
+    # a valve adjustment for every valve, which queues writes, and the time until
+    # the queue is drained and all writes are sent
+    for cover in covers:
+        cover._controller.last_valve_adjust_at = utcnow() - timedelta(days=1)
+    random_walk(hass, valve_configs, random_generator)
+    service_calls = hass.services.call_count
+    ticks = 0
+    started_at = time.perf_counter()
+    seconds = await async_timed_updates(covers, False)
+    results["adjust"] = latency_stats(seconds[0])
+    while ((valves_queue.queue_size > 0 or hass.services.in_flight > 0)
+            and ticks < args.max_ticks):
+        if valves_queue.queue_size > 0:
+            await valves_queue.async_process_queue()
+            ticks += 1
+        await asyncio.sleep(0.001)
+    results["drain"] = {
+        "ms": round((time.perf_counter() - started_at) * 1000.0, 1),
+        "ticks": ticks,
+        "service_calls": hass.services.call_count - service_calls,
+        "left": valves_queue.queue_size
+    }
+    results["drain_loop_lag"] = latency_stats(monitor.reset())
+
+    # the built-in metrics sensors as Home Assistant would show them
+    valves_queue.metrics.async_update_state()
+    results["metrics"] = {}
+    for entity_id in hass.states.async_entity_ids():
+        if entity_id.startswith("valves.valves_") and entity_id != "valves.valves_queue":
+            state = hass.states.get(entity_id)
+            results["metrics"][entity_id] = {
+                key: value for key, value in state.attributes.items() if key != "buckets"
+            } or state.state
+
+    # allocations of one update round
+    random_walk(hass, valve_configs, random_generator)
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    await async_timed_updates(covers)
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    statistics_diff = snapshot_after.compare_to(snapshot_before, "filename")
+    allocated = sum(max(0, stat.size_diff) for stat in statistics_diff)
+    blocks = sum(max(0, stat.count_diff) for stat in statistics_diff)
+    results["allocations"] = {
+        "retained_bytes_per_update": round(allocated / len(covers), 1),
+        "retained_blocks_per_update": round(blocks / len(covers), 2),
+        "peak_kib": round(peak / 1024.0, 1)
+    }
+
+    results["temperature_history"] = benchmark_temperature_history(args.history_samples)
+    results["state_writes"] = hass.states.writes
+    results["events"] = hass.bus.fired
+    monitor.stop()
+    # let queue runs scheduled by set_valve finish
+    while True:
+        await asyncio.sleep(args.queue_interval)
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if len(tasks) == 0:
+            return results
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def print_results(results:dict, prefix:str = "") -> None:
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print_results(value, f"{prefix}{key}.")
+        else:
+            print(f"{prefix}{key}: {value}")
+
+
+def main(argv:Union[list[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(
+            prog="python -m valves.benchmarks",
+            description="Benchmark the valves component against a fake Home Assistant.")
+    parser.add_argument("--valves", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20, help="update rounds of all valves")
+    parser.add_argument("--push", action="store_true", help="enable push_entities")
+    parser.add_argument("--batch-size", type=int, default=4, help="queue_batch_size")
+    parser.add_argument("--service-latency", type=float, default=0.005,
+            help="seconds per async service call (default: %(default)s)")
+    parser.add_argument("--queue-interval", type=float, default=0.01,
+            help="queue_interval of all backends in seconds (default: %(default)s)")
+    parser.add_argument("--max-ticks", type=int, default=100000)
+    parser.add_argument("--history-samples", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    LOGGER.setLevel(logging.WARNING)
+    results = asyncio.run(async_run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    return 0
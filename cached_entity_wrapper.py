@@ -1,15 +1,42 @@
+import functools
 
 from typing import Union
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import Event, HomeAssistant, State, callback
+from homeassistant.helpers.event import async_track_state_change_event
 
-from .const import LOGGER
+from .const import LOGGER, NORMALIZE_CONFIRMATION_TIMEOUT
+
+def push_cached(func):
+    # Property which is computed once per state change of the watched entities
+    # when the wrapper is in push mode.
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        return self.push_cached_value(name, lambda: func(self))
+    return property(wrapper)
 
 class CachedEntityWrapper:
-    def __init__(self, home_assistant:HomeAssistant, entity_name:str):
+    # attributes holding the temperature of the entity, the first one set is used
+    VALUE_ATTRIBUTES: tuple[str, ...] = ()
+
+    def __init__(self, home_assistant:HomeAssistant, entity_name:str, states=None,
+            push:bool = False, valves_queue=None):
         self._home_assistant = home_assistant
+        # normalize service calls are paced and debounced by the ValvesQueue
+        self._valves_queue = valves_queue
+        # anything with a states.get like interface, e.g. a StatesSnapshot
+        self._states = home_assistant.states if states is None else states
         self._entity_name = entity_name
         self._cached_entity_attributes = {}
+        self._subscribed = False
+        self._unsub_state_changed = None
+        self._watched_states = {}
+        self._value_cache = {}
+        self._value_cache_version = 0
+        if push:
+            self.async_subscribe()
         LOGGER.info("%s/%s: CachedEntityWrapper initialized",
                 self.__class__.__name__, self._entity_name)
 
@@ -18,16 +45,86 @@ class CachedEntityWrapper:
         return self._entity_name
 
     @property
-    def entity(self):
-        return self._home_assistant.states.get(self._entity_name)
+    def watched_entity_ids(self) -> list[str]:
+        return [self._entity_name]
+
+    @property
+    def backend(self) -> Union[str, None]:
+        return None
+
+    @callback
+    def async_subscribe(self) -> None:
+        if self._subscribed:
+            return
+        for entity_id in self.watched_entity_ids:
+            self._watched_states[entity_id] = self._home_assistant.states.get(entity_id)
+        self._unsub_state_changed = async_track_state_change_event(
+                self._home_assistant, self.watched_entity_ids, self.async_state_changed)
+        self._subscribed = True
+
+    @callback
+    def async_unsubscribe(self) -> None:
+        if self._unsub_state_changed is not None:
+            self._unsub_state_changed()
+            self._unsub_state_changed = None
+        self._subscribed = False
+
+    @callback
+    def async_state_changed(self, event:Event) -> None:
+        self._watched_states[event.data.get("entity_id")] = event.data.get("new_state")
+        self._value_cache_version += 1
+        self._value_cache = {}
+
+    def push_cached_value(self, key:str, compute):
+        if not self._subscribed:
+            return compute()
+        if key in self._value_cache:
+            return self._value_cache[key]
+        version = self._value_cache_version
+        value = compute()
+        # don't cache a value computed from states replaced in the meantime
+        if version == self._value_cache_version:
+            self._value_cache[key] = value
+        return value
+
+    def state_of(self, entity_id:str):
+        if self._subscribed and entity_id in self._watched_states:
+            return self._watched_states[entity_id]
+        return self._states.get(entity_id)
 
     @property
+    def entity(self):
+        return self.state_of(self._entity_name)
+
+    @push_cached
     def value(self) -> Union[float, None]:
-        raise NotImplementedError()
+        for attribute_name in self.VALUE_ATTRIBUTES:
+            value = self.entity_attribute(attribute_name)
+            if value is not None:
+                return float(value)
+        return None
+
+    @classmethod
+    def state_value(cls, state:State) -> Union[float, None]:
+        # value of a state from the past, e.g. from the recorder history
+        for attribute_name in cls.VALUE_ATTRIBUTES:
+            value = state.attributes.get(attribute_name)
+            if value is not None:
+                try:
+                    return float(value)
+                except ValueError:
+                    return None
+        return None
 
     def entity_attribute(self, attribute_name:str):
-        if self.entity is not None:
-            value = self.entity.attributes.get(attribute_name)
+        return self.push_cached_value(
+                "attribute:" + attribute_name,
+                lambda: self._entity_attribute(attribute_name))
+
+    def _entity_attribute(self, attribute_name:str):
+        entity = self.entity
+        if entity is not None:
+            value = entity.attributes.get(attribute_name)
         else:
             #LOGGER.info("%s is unavailable. Set value of %s to None"
             #       % (self._entity_name, attribute_name))
@@ -41,6 +138,12 @@ class CachedEntityWrapper:
             self._cached_entity_attributes[attribute_name] = value
         return value
 
-    @property
+    @callback
+    def async_normalize(self, name:str, domain:str, service:str, data:dict,
+            needed:bool = True, timeout=NORMALIZE_CONFIRMATION_TIMEOUT) -> bool:
+        return self._valves_queue.async_normalize(
+                self._entity_name, self.backend, name, domain, service, data, needed, timeout)
+
+    @push_cached
     def available(self) -> bool:
         return self.entity is not None and self.value is not None
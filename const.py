@@ -1,9 +1,16 @@
 from datetime import timedelta
 import logging
 
+DEFAULT_ERROR_EXP_FACTOR = 0.71
+DEFAULT_ERROR_EXP_RATE = 3.47
+DEFAULT_FELT_RATIO = 0.667
 DEFAULT_FELT_TEMP_DELTA = 0.0
+DEFAULT_LEARN_RATE = 0.00002
+DEFAULT_MAX_TARGET_TEMPERATURE_CONFIGS = 16
 DEFAULT_POSITION = -1.0
 DEFAULT_SWEET_SPOT = 10.0
+# cached lookups of (adjusted) target temperatures per TargetTemperatureConfigs
+TARGET_TEMPERATURE_LOOKUP_CACHE_SIZE = 32
 
 DELAY_LEARN_AFTER_TEMPERATURE_CHANGE = timedelta(hours=4)
 
@@ -15,3 +22,82 @@ UPDATE_INTERVAL = 30
 UPDATE_INTERVAL_TIMEDELTA = timedelta(seconds=UPDATE_INTERVAL)
 
 QUEUE_INTERVAL_TIMEDELTA = timedelta(seconds=10)
+# 1 keeps the classic behaviour of one valve write per queue interval
+DEFAULT_QUEUE_BATCH_SIZE = 1
+# maximum concurrent writes per backend within one queue interval
+DEFAULT_BACKEND_CONCURRENCY = {
+    "bosch": 4,
+    "eurotronic": 4,
+    "homematic": 1,
+    "homematicip_local": 1,
+    "shelly": 4
+}
+# backends sharing the Homematic radio and its duty cycle
+HOMEMATIC_BACKENDS = ("homematic", "homematicip_local")
+# Homematic duty cycle in percent of the hourly transmit budget
+DEFAULT_DUTY_CYCLE_TARGET = 75.0
+# estimated duty cycle cost of one put_paramset per rx_mode
+DEFAULT_DUTY_CYCLE_COST_BURST = 2.0
+DEFAULT_DUTY_CYCLE_COST_WAKEUP = 0.2
+# non-urgent writes stop this many percent below the target
+DUTY_CYCLE_NON_URGENT_HEADROOM = 10.0
+# queue priorities, lower is more important
+PRIORITY_HIGH = 0 # window open/close and boost mode
+PRIORITY_URGENT = 1
+PRIORITY_NORMAL = 2
+PRIORITY_NAMES = {
+    PRIORITY_HIGH: "high",
+    PRIORITY_URGENT: "urgent",
+    PRIORITY_NORMAL: "normal"
+}
+# waiting time which outweighs one priority level
+PRIORITY_AGING_SECONDS = 300.0
+# failed valve writes are retried with exponential backoff and parked after
+# the maximum number of attempts until the valve reports a new state
+DEFAULT_QUEUE_MAX_ATTEMPTS = 8
+RETRY_BACKOFF_BASE = timedelta(seconds=30)
+RETRY_BACKOFF_MAX = timedelta(minutes=30)
+# persisted valve write queue
+STORAGE_KEY = 'valves.valves_queue'
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = timedelta(seconds=30)
+# persisted detected valve types
+VALVE_TYPES_STORAGE_KEY = 'valves.valve_types'
+VALVE_TYPES_STORAGE_VERSION = 1
+# time to wait for a valve to report a sent position before it's sent again
+WRITE_CONFIRMATION_TIMEOUT = timedelta(minutes=10)
+# queue lane for valves whose backend is not detected yet
+UNKNOWN_BACKEND = "unknown"
+
+SLOPE_ESTIMATOR_DELTA = 'delta'
+SLOPE_ESTIMATOR_REGRESSION = 'regression'
+# histogram buckets of the metrics sensors
+METRICS_DURATION_BUCKETS_MS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0,
+        2000.0, 5000.0)
+METRICS_WAIT_BUCKETS_S = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+METRICS_INTERVAL_TIMEDELTA = timedelta(seconds=60)
+# runtime cProfile sampling window
+PROFILER_DEFAULT_DURATION = timedelta(minutes=5)
+PROFILER_MAX_DURATION = timedelta(hours=1)
+PROFILER_TOP_ENTRIES = 30
+# time to wait for a device to report the state a normalize command set
+NORMALIZE_CONFIRMATION_TIMEOUT = timedelta(minutes=5)
+# default minimum seconds between two polls of the Eurotronic local temperature, 0 polls
+# with every update
+DEFAULT_EUROTRONIC_POLL_INTERVAL = 0
+# rooms with several valves: bounds of the learned valve weights (mean weight is 1),
+# their learn rate relative to learn_rate, the maximum room error (K) they are learned
+# at and the settings which must be the same for all valves of a room
+ROOM_WEIGHT_MIN = 0.5
+ROOM_WEIGHT_MAX = 2.0
+ROOM_WEIGHT_LEARN_FACTOR = 1.0
+ROOM_WEIGHT_LEARN_MAX_ERROR = 0.5
+ROOM_SHARED_CONFIG_KEYS = ("thermostat_sensor", "settemp_input")
+# settings of the ValveController of a room, taken from the first valve of the room
+ROOM_CONTROLLER_CONFIG_KEYS = ("position_factor", "felt_ratio", "error_exp_factor",
+        "error_exp_rate", "learn_rate", "max_target_temperature_configs",
+        "target_temperature_interpolation", "thermostat_slope")
+# recorded history replayed into the temperature histories at startup
+WARM_START_TIMEDELTA = timedelta(hours=1)
+# lower valve temperatures are bogus readings, e.g. of Eurotronic TRVs
+VALVE_TEMPERATURE_MIN = 5.0
@@ -1,4 +1,3 @@
-import copy
 import json
 import math
 import random
@@ -6,31 +5,54 @@ import random
 from datetime import datetime, timedelta
 from typing import Any, Union
 
+import voluptuous as vol
+
 from homeassistant.components.cover import (
     ATTR_POSITION,
     SUPPORT_SET_POSITION,
     DEVICE_CLASS_DAMPER,
     CoverEntity,
 )
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, State, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+    async_track_time_interval
+)
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.util import Throttle, utcnow
 from homeassistant.util.dt import as_local
 
 from .const import (
-    DEFAULT_FELT_TEMP_DELTA,
+    DEFAULT_DUTY_CYCLE_COST_BURST,
+    DEFAULT_DUTY_CYCLE_COST_WAKEUP,
+    DEFAULT_DUTY_CYCLE_TARGET,
     DEFAULT_POSITION,
-    DEFAULT_SWEET_SPOT,
-    DELAY_LEARN_AFTER_TEMPERATURE_CHANGE,
+    DEFAULT_QUEUE_BATCH_SIZE,
+    DEFAULT_QUEUE_MAX_ATTEMPTS,
+    DOMAIN,
     LOGGER,
+    METRICS_INTERVAL_TIMEDELTA,
+    PRIORITY_HIGH,
+    PROFILER_DEFAULT_DURATION,
+    ROOM_CONTROLLER_CONFIG_KEYS,
+    ROOM_SHARED_CONFIG_KEYS,
     UPDATE_INTERVAL_TIMEDELTA,
-    QUEUE_INTERVAL_TIMEDELTA
+    VALVE_TEMPERATURE_MIN
 )
-from .target_temperature_config import TargetTemperaturConfig
+from .device_id_resolver import DeviceIdResolver
+from .duty_cycle_budget import DutyCycleBudget
+from .history_warm_start import HistoryWarmStart
+from .room_controller import RoomController
+from .states_snapshot import StatesSnapshot
 from .temperature_history import TemperatureHistory
 from .temperature_sensor import TemperatureSensor
 from .valve_actuator_proxy import ValveActuatorProxy
+from .valve_actuator_resolver import ValveActuatorResolver
+from .valve_controller import ValveController
+from .valves_metrics import ValvesMetrics
 from .valves_queue import ValvesQueue
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
@@ -38,153 +60,401 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     LOGGER.info("discovery_info=%s", discovery_info)
 
     homematic_duty_cycle_sensor = None
+    event_driven = False
+    push_entities = False
+    queue_batch_size = DEFAULT_QUEUE_BATCH_SIZE
+    queue_concurrency = None
+    queue_interval = None
+    queue_max_attempts = DEFAULT_QUEUE_MAX_ATTEMPTS
+    duty_cycle_target = DEFAULT_DUTY_CYCLE_TARGET
+    duty_cycle_cost_burst = DEFAULT_DUTY_CYCLE_COST_BURST
+    duty_cycle_cost_wakeup = DEFAULT_DUTY_CYCLE_COST_WAKEUP
     config = discovery_info['config']
     if config is not None:
         homematic_duty_cycle_sensor = config['homematic_duty_cycle_sensor']
-
-    valves_queue = ValvesQueue(hass, homematic_duty_cycle_sensor)
-    async_track_time_interval(hass, valves_queue.async_process_queue, QUEUE_INTERVAL_TIMEDELTA)
+        event_driven = bool(config.get('event_driven', False))
+        push_entities = bool(config.get('push_entities', False))
+        queue_batch_size = int(config.get('queue_batch_size', DEFAULT_QUEUE_BATCH_SIZE))
+        queue_concurrency = config.get('queue_concurrency', None)
+        queue_interval = config.get('queue_interval', None)
+        queue_max_attempts = config.get('queue_max_attempts', DEFAULT_QUEUE_MAX_ATTEMPTS)
+        duty_cycle_target = config.get('duty_cycle_target', DEFAULT_DUTY_CYCLE_TARGET)
+        duty_cycle_cost_burst = config.get('duty_cycle_cost_burst', DEFAULT_DUTY_CYCLE_COST_BURST)
+        duty_cycle_cost_wakeup = config.get(
+                'duty_cycle_cost_wakeup', DEFAULT_DUTY_CYCLE_COST_WAKEUP)
+
+    states_snapshot_entity_ids = ["sensor.temperature_adjust", "input_boolean.heating_on"]
+    if homematic_duty_cycle_sensor is not None:
+        states_snapshot_entity_ids.append(homematic_duty_cycle_sensor)
+    for valve_entity in discovery_info['entities']:
+        states_snapshot_entity_ids.extend(valve_config_entity_ids(valve_entity))
+    states_snapshot = StatesSnapshot(hass, states_snapshot_entity_ids)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, states_snapshot.async_unsubscribe)
+
+    duty_cycle_budget = DutyCycleBudget(
+            hass,
+            homematic_duty_cycle_sensor,
+            duty_cycle_target,
+            duty_cycle_cost_burst,
+            duty_cycle_cost_wakeup,
+            states_snapshot)
+    valves_metrics = ValvesMetrics(hass)
+    valves_queue = ValvesQueue(
+            hass, homematic_duty_cycle_sensor, queue_batch_size, queue_concurrency, queue_interval,
+            duty_cycle_budget, queue_max_attempts, valves_metrics)
+    rooms = valve_rooms(discovery_info['entities'])
+    valves_queue.set_rooms(rooms)
+    await valves_queue.async_load()
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, valves_queue.async_unsubscribe)
+    async_track_time_interval(hass, valves_queue.async_process_queue, valves_queue.tick_interval)
+    async_track_time_interval(hass, valves_metrics.async_update_state, METRICS_INTERVAL_TIMEDELTA)
+    hass.services.async_register(
+            DOMAIN, "profile_start", valves_metrics.profiler.async_handle_start,
+            schema=vol.Schema({
+                vol.Optional("duration", default=PROFILER_DEFAULT_DURATION): cv.time_period
+            }))
+    hass.services.async_register(
+            DOMAIN, "profile_stop", valves_metrics.profiler.async_handle_stop)
+
+    valve_actuator_resolver = ValveActuatorResolver(hass)
+    await valve_actuator_resolver.async_load()
+    device_ids = DeviceIdResolver(hass)
+    entity_names = [valve_entity["id"] for valve_entity in discovery_info['entities']]
+    device_ids.async_resolve(entity_names)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, device_ids.async_unsubscribe)
+    valves_queue.prune_restored(entity_names)
 
     entities = []
     for valve_entity in discovery_info['entities']:
-        entities.append(ValveCover(hass, valves_queue, valve_entity))
+        entities.append(ValveCover(
+                hass, valves_queue, valve_entity, event_driven, states_snapshot, push_entities,
+                device_ids))
+    join_rooms(entities, configured_rooms(discovery_info['entities']))
+    valve_actuator_resolver.async_resolve([entity.valve_actuator for entity in entities])
+    history_warm_start = HistoryWarmStart(hass)
+    for entity in entities:
+        entity.add_warm_start_histories(history_warm_start)
+    await history_warm_start.async_warm_start()
     async_add_entities(entities)
 
 
+def update_interval() -> float:
+    return 15 * 60.0 + random.randint(-60, 60) # randomly splay 2 minutes
+
+
+def configured_rooms(valve_configs:list[dict]) -> dict[str, list[str]]:
+    # Valves with the same room are controlled by one RoomController
+    rooms: dict[str, list[str]] = {}
+    for valve_config in valve_configs:
+        room_name = valve_config.get("room", None)
+        if room_name is not None:
+            rooms.setdefault("room:" + str(room_name), []).append(valve_config["id"])
+    return {room: sorted(members) for room, members in rooms.items()}
+
+
+def valve_rooms(valve_configs:list[dict]) -> dict[str, list[str]]:
+    # Valves with the same room or linked by peer_id, also in chains, share a room for
+    # the queue, which sends their writes together
+    links: list[set[str]] = []
+    named_rooms: dict[str, set[str]] = {}
+    room_name_of: dict[str, str] = {}
+    for valve_config in valve_configs:
+        room_name = valve_config.get("room", None)
+        if room_name is not None:
+            named_rooms.setdefault(str(room_name), set()).add(valve_config["id"])
+            room_name_of[valve_config["id"]] = str(room_name)
+        peer_id = valve_config.get("peer_id", None)
+        if peer_id is not None:
+            links.append({valve_config["id"], peer_id})
+    links.extend(named_rooms.values())
+
+    rooms: dict[str, set[str]] = {}
+    room_of: dict[str, str] = {}
+    for link in links:
+        if len(link) < 2:
+            continue
+        members = set(link)
+        for entity_name in list(members):
+            room = room_of.get(entity_name)
+            if room is not None:
+                members |= rooms.pop(room, set())
+        # named after the configured room, else after its first valve
+        room_names = [room_name_of[name] for name in members if name in room_name_of]
+        room = "room:" + (min(room_names) if room_names else min(members))
+        rooms[room] = members
+        for entity_name in members:
+            room_of[entity_name] = room
+    return {room: sorted(members) for room, members in rooms.items()}
+
+
+def join_rooms(covers:list["ValveCover"], rooms:dict[str, list[str]]) -> None:
+    # Configured valves of a room are controlled together by one RoomController
+    covers_by_name = {cover.valve_config["id"]: cover for cover in covers}
+    for room, members in rooms.items():
+        room_covers = {
+            entity_name: covers_by_name[entity_name]
+            for entity_name in members if entity_name in covers_by_name
+        }
+        if len(room_covers) < 2:
+            continue
+        valve_configs = [cover.valve_config for cover in room_covers.values()]
+        different_keys = [
+            key for key in ROOM_SHARED_CONFIG_KEYS
+            if len(set(valve_config.get(key) for valve_config in valve_configs)) > 1
+        ]
+        if len(different_keys) > 0:
+            LOGGER.error("%s: Valves %s need the same %s - controlling them separately",
+                    room, sorted(room_covers.keys()), different_keys)
+            continue
+        different_keys = [
+            key for key in ROOM_CONTROLLER_CONFIG_KEYS
+            if len(set(valve_config.get(key) for valve_config in valve_configs)) > 1
+        ]
+        if len(different_keys) > 0:
+            LOGGER.warning("%s: Valves have different %s - using the ones of %s",
+                    room, different_keys, valve_configs[0]["id"])
+        room_controller = RoomController(room, valve_configs, update_interval(), utcnow())
+        for cover in room_covers.values():
+            cover.join_room(room_controller, room_covers)
+
+
+def valve_config_entity_ids(valve_config:dict) -> list[str]:
+    entity_ids = [
+        valve_config["id"],
+        valve_config["thermostat_sensor"]
+    ]
+    valve_position_id = valve_config.get("valve_position", None)
+    if valve_position_id is not None:
+        entity_ids.append(valve_position_id)
+    settemp_input = valve_config.get("settemp_input", None)
+    if settemp_input is not None:
+        entity_ids.append(settemp_input)
+    window_sensor_ids = valve_config.get("window_sensor", None)
+    if window_sensor_ids is not None:
+        if not isinstance(window_sensor_ids, list):
+            window_sensor_ids = [ window_sensor_ids ]
+        entity_ids.extend(window_sensor_ids)
+    return entity_ids
+
+
 class ValveCover(CoverEntity, RestoreEntity):
 
-    def __init__(self, home_assistant:HomeAssistant, valves_queue:ValvesQueue, valve_config:dict):
+    def __init__(self, home_assistant:HomeAssistant, valves_queue:ValvesQueue, valve_config:dict,
+            event_driven:bool = False, states_snapshot:Union[StatesSnapshot, None] = None,
+            push_entities:bool = False, device_ids:Union[DeviceIdResolver, None] = None):
         self._home_assistant = home_assistant
+        # shared view of all states used by the valves
+        self._states = home_assistant.states if states_snapshot is None else states_snapshot
         self._valves_queue = valves_queue
         self._valve_config = valve_config
         self._name = valve_config["id"]
+        self._event_driven = bool(valve_config.get("event_driven", event_driven))
+        self._push_entities = bool(valve_config.get("push_entities", push_entities))
+        self._unsub_event_update = None
+        self._event_update_at = None
 
-        self._position = 0
-        # Kp=1.5 was ok without sweet_spot multiply, try 1.5/15 = 0.1
-        # 0.1 was ok, but a bit too high
-        self._position_factor = float(valve_config.get("position_factor", 0.07)) # Kp
-        self._update_interval = 15 * 60.0 + random.randint(-60, 60) # randomly splay 2 minutes
+        # control and learning loop, independent of Home Assistant
+        self._controller = ValveController(self._name, valve_config, update_interval(), utcnow())
+        # set by join_rooms if the valve shares its room with other valves
+        self._room = None
+        self._room_covers: dict[str, ValveCover] = {}
 
         self._thermostat_sensor_id = valve_config["thermostat_sensor"]
         self._peer_id = valve_config.get("peer_id", None)
         self._settemp_input = valve_config.get("settemp_input", None)
         self._window_sensor_id = valve_config.get("window_sensor", None)
-        self._min_position = valve_config.get("min_position", 0)
-        self._max_position = valve_config.get("max_position", 80)
         self._thermostat_inertia = float(valve_config.get("thermostat_inertia", 60))
         self._valve_inertia = float(valve_config.get("valve_inertia", 60))
-        self._raw_position = -1
-        self._raw_position_changed_at = utcnow()
-        self._target_temperature = -1.0
-        self._target_temperature_changed = False
-        self._target_temperature_configs: dict[float, TargetTemperaturConfig] = {}
-        self._adjusted_felt_temp = -1.0
-        self._felt_temp = -1.0
-        self._real_error = -1.0
-        self._error = -1.0
-        self._error_exp = -1.0
-        self._thermostat_history = TemperatureHistory(timedelta(minutes=60))
-        self._valve_history = TemperatureHistory(timedelta(minutes=10))
-        self._next_temp_adjust_at = utcnow()
-        self._last_valve_adjust_at = utcnow() - timedelta(seconds=self._update_interval / 2)
-        self._last_target_temperature_changed_at = utcnow() - DELAY_LEARN_AFTER_TEMPERATURE_CHANGE
-        self._heating_started_at = datetime.min
-        self._heating_until_target_temperature = False
+        self._attributes_key = None
+        self._attributes = {}
         self._window_open_until = None
         self._window_open_saved_position = -1.0
         self._valve_position_before_boost_mode = -1.0
         self._sweet_spot_blocked_until = utcnow()
         self._reset_boost_mode_at = utcnow() - timedelta(hours=1)
         self._temperature_sensor = None
-        self._valve_actuator = None
+        # resolved in bulk by the ValveActuatorResolver before the entity is added
+        self._valve_actuator = ValveActuatorProxy(
+                home_assistant, valve_config, self._states, self._push_entities, valves_queue,
+                device_ids)
         self._updated = False
+        self._last_update_at = utcnow() - UPDATE_INTERVAL_TIMEDELTA
 
     async def async_added_to_hass(self) -> None:
         last_state = await self.async_get_last_state()
         if last_state and 'target_temperature_configs' in last_state.attributes:
             target_temperature_configs_string = last_state.attributes['target_temperature_configs']
-            items = json.loads(target_temperature_configs_string).items()
-            for target_temperature, target_temperature_config_json in items:
-                target_temperature = float(target_temperature)
-                target_temperature_config = TargetTemperaturConfig()
-                target_temperature_config.from_json(target_temperature_config_json)
-                self._target_temperature_configs[target_temperature] = target_temperature_config
+            target_temperature_configs_json = json.loads(target_temperature_configs_string)
+            if self._room is None:
+                self._controller.configs.from_json(target_temperature_configs_json)
+            else:
+                # merged with the ones of the other valves of the room
+                self._room.restore_configs(target_temperature_configs_json)
             LOGGER.info("%s: Restored target_temperature_configs from %s",
                     self._name, target_temperature_configs_string)
 
+        controller = self._controller
+        position = DEFAULT_POSITION
         if last_state and 'position' in last_state.attributes:
-            self._position = last_state.attributes['position']
-            LOGGER.info("%s: Restored position to %.3f", self._name, self._position)
-        else:
-            self._position = DEFAULT_POSITION
+            position = last_state.attributes['position']
+            LOGGER.info("%s: Restored position to %.3f", self._name, position)
 
         if last_state and 'heating_until_target_temperature' in last_state.attributes:
-            self._heating_until_target_temperature = \
+            heating_until_target_temperature = \
                     last_state.attributes['heating_until_target_temperature']
+            if self._room is None:
+                controller.heating_until_target_temperature = heating_until_target_temperature
+            else:
+                self._room.restore_heating_until_target_temperature(
+                        heating_until_target_temperature)
             LOGGER.info("%s: Restored heating_until_target_temperature to %r",
-                    self._name, self._heating_until_target_temperature)
-        else:
-            self._heating_until_target_temperature = False
+                    self._name, heating_until_target_temperature)
+        elif self._room is None:
+            controller.heating_until_target_temperature = False
 
-        self._raw_position = math.ceil(self._position)
+        if self._room is None:
+            controller.position = position
+            controller.raw_position = math.ceil(controller.position)
+        else:
+            weight = last_state.attributes.get('weight', 1.0) if last_state else 1.0
+            self._room.restore_valve(self._name, position, weight)
         self._temperature_sensor = TemperatureSensor(
-                self._home_assistant, self._thermostat_sensor_id)
-        self._valve_actuator = ValveActuatorProxy(
-                self._home_assistant, self._valve_config)
+                self._home_assistant, self._thermostat_sensor_id, self._states,
+                self._push_entities, self._valves_queue)
+        self._valves_queue.restore_valve(self._valve_actuator)
 
         await super().async_added_to_hass()
 
+        if self._push_entities:
+            self.async_on_remove(self._temperature_sensor.async_unsubscribe)
+            self.async_on_remove(self._valve_actuator.async_unsubscribe)
+
+        if self._event_driven:
+            self.async_on_remove(async_track_state_change_event(
+                    self._home_assistant, self.input_entity_ids, self.async_input_changed))
+            self.async_on_remove(self.async_cancel_event_update)
+            self.async_schedule_event_update(utcnow())
+            LOGGER.info("%s: Event-driven updates for %s", self._name, self.input_entity_ids)
+
     @property
-    def felt_temp_delta(self):
-        best_target_temperature_config = self.find_best_target_temperature_config()
-        if best_target_temperature_config is None:
-            return DEFAULT_FELT_TEMP_DELTA
-        else:
-            return best_target_temperature_config.felt_temp_delta
+    def valve_actuator(self) -> ValveActuatorProxy:
+        return self._valve_actuator
+
+    @property
+    def valve_config(self) -> dict:
+        return self._valve_config
+
+    def join_room(self, room:RoomController, room_covers:dict[str, "ValveCover"]) -> None:
+        # The valves of a room share the controller of the room
+        self._room = room
+        self._room_covers = room_covers
+        self._controller = room.controller
+
+    def add_warm_start_histories(self, history_warm_start:HistoryWarmStart) -> None:
+        history_warm_start.add(self._thermostat_sensor_id, TemperatureSensor.state_value,
+                self._controller.thermostat_history)
+        history_warm_start.add(self._name, self.valve_state_value, self.valve_history)
+
+    def valve_state_value(self, state:State) -> Union[float, None]:
+        # skips strange valve temperatures like an update does
+        value = self._valve_actuator.state_value(state)
+        if value is None or value < VALVE_TEMPERATURE_MIN:
+            return None
+        return value
+
+    @property
+    def valve_position(self) -> float:
+        # in a room the valve's share of the room position
+        if self._room is None:
+            return self._controller.position
+        return self._room.valves[self._name].position
+
+    @property
+    def valve_raw_position(self) -> float:
+        if self._room is None:
+            return self._controller.raw_position
+        return self._room.valves[self._name].raw_position
+
+    @property
+    def valve_history(self) -> TemperatureHistory:
+        if self._room is None:
+            return self._controller.valve_history
+        return self._room.valves[self._name].valve_history
+
+    @property
+    def should_poll(self) -> bool:
+        return not self._event_driven
+
+    @property
+    def input_entity_ids(self) -> list[str]:
+        entity_ids = valve_config_entity_ids(self._valve_config)
+        entity_ids.append("sensor.temperature_adjust")
+        if self._peer_id is not None:
+            entity_ids.append(self.entity_id_to_cover_id(self._peer_id))
+        return entity_ids
+
+    @callback
+    def async_input_changed(self, event:Event) -> None:
+        old_state = event.data.get("old_state")
+        new_state = event.data.get("new_state")
+        if self._peer_id is not None and event.data.get("entity_id") == \
+                self.entity_id_to_cover_id(self._peer_id):
+            # Only the learned felt_temp_delta of the peer is an input. Reacting on every
+            # attribute change of the peer would make both covers trigger each other.
+            if (old_state is not None and new_state is not None and
+                    old_state.attributes.get("felt_temp_delta") ==
+                    new_state.attributes.get("felt_temp_delta")):
+                return
+        self.async_schedule_event_update(self._last_update_at + UPDATE_INTERVAL_TIMEDELTA)
+
+    @callback
+    def async_schedule_event_update(self, update_at:datetime) -> None:
+        update_at = max(utcnow(), update_at)
+        if self._unsub_event_update is not None:
+            if self._event_update_at <= update_at:
+                return
+            self._unsub_event_update()
+        self._event_update_at = update_at
+        self._unsub_event_update = async_track_point_in_utc_time(
+                self._home_assistant, self.async_event_update, update_at)
+
+    @callback
+    def async_cancel_event_update(self) -> None:
+        if self._unsub_event_update is not None:
+            self._unsub_event_update()
+            self._unsub_event_update = None
+
+    async def async_event_update(self, now=None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (now)
+
+        self._unsub_event_update = None
+        await self.async_update_valve()
+        self.async_write_ha_state()
+        self.async_schedule_event_update(self.next_event_update_at)
 
-    @felt_temp_delta.setter
-    def felt_temp_delta(self, value):
-        target_temperature_config = self.find_or_initialize_target_temperature_config()
-        target_temperature_config.felt_temp_delta = value
+    @property
+    def next_event_update_at(self) -> datetime:
+        # The next time based step: adjust deadline, window open/close timers and boost
+        # mode reset. Input changes in between are handled by async_input_changed.
+        update_at = (self._controller.last_valve_adjust_at
+                + timedelta(seconds=self._controller.update_interval))
+        if self._window_open_until is not None:
+            update_at = min(update_at, self._window_open_until)
+        for window_entity in self.window_entities:
+            if window_entity is not None and window_entity.state == "on":
+                update_at = min(update_at, window_entity.last_changed + timedelta(minutes=2))
+        if self._valve_position_before_boost_mode >= 0:
+            update_at = min(update_at, self._reset_boost_mode_at + timedelta(minutes=5))
+        return max(update_at, self._last_update_at + UPDATE_INTERVAL_TIMEDELTA)
+
+    @property
+    def felt_temp_delta(self):
+        return self._controller.felt_temp_delta
 
     @property
     def sweet_spot(self):
-        best_target_temperature_config = self.find_best_target_temperature_config()
-        if best_target_temperature_config is None:
-            return DEFAULT_SWEET_SPOT
-        else:
-            return best_target_temperature_config.sweet_spot
-
-    @sweet_spot.setter
-    def sweet_spot(self, value):
-        target_temperature_config = self.find_or_initialize_target_temperature_config()
-        # ensure minimum value
-        target_temperature_config.sweet_spot = max(1.0, value)
-
-    def find_best_target_temperature_config(self) -> Union[TargetTemperaturConfig, None]:
-        best_target_temperature_delta = 100.0
-        best_target_temperature_config = None
-        adjusted_target_temperatue = self.get_adjusted_target_temperature()
-        items = self._target_temperature_configs.items()
-        for target_temperature, target_temperature_config in items:
-            target_temperature_delta = abs(target_temperature - adjusted_target_temperatue)
-            if best_target_temperature_delta > target_temperature_delta:
-                best_target_temperature_delta = target_temperature_delta
-                best_target_temperature_config = target_temperature_config
-        return best_target_temperature_config
-
-    def find_or_initialize_target_temperature_config(self) -> TargetTemperaturConfig:
-        adjusted_target_temperatue = self.get_adjusted_target_temperature()
-        target_temperature_config = self._target_temperature_configs.get(
-                adjusted_target_temperatue, None)
-        if target_temperature_config is None:
-            best_target_temperature_config = self.find_best_target_temperature_config()
-            if best_target_temperature_config is None:
-                target_temperature_config = TargetTemperaturConfig()
-            else:
-                target_temperature_config = copy.deepcopy(best_target_temperature_config)
-            self._target_temperature_configs[adjusted_target_temperatue] = target_temperature_config
-        return target_temperature_config
+        return self._controller.sweet_spot
 
     @property
     def supported_features(self):
@@ -207,12 +477,13 @@ class ValveCover(CoverEntity, RestoreEntity):
 
     @property
     def current_cover_position(self):
-        return None if self._position < 0 else self._position
+        position = self.valve_position
+        return None if position < 0 else position
 
-    def set_cover_position(self, **kwargs):
+    async def async_set_cover_position(self, **kwargs):
         if ATTR_POSITION in kwargs:
             position = kwargs[ATTR_POSITION]
-            self.queue_set_valve(position)
+            self.async_queue_set_valve(position)
 
     @property
     def state(self) -> int:
@@ -223,34 +494,66 @@ class ValveCover(CoverEntity, RestoreEntity):
         if not self._updated:
             return {}
 
-        target_temperature_configs_json :dict[str, dict] = {}
-        items =  self._target_temperature_configs.items()
-        for target_temperature, target_temperature_config in items:
-            target_temperature_configs_json[str(target_temperature)] = \
-                    target_temperature_config.to_json()
-        target_temperature_configs_str = json.dumps(
-                target_temperature_configs_json, indent=2, sort_keys=True)
-
-        attributes = {
-            "adjusted_felt_temp": self._adjusted_felt_temp,
-            "error_exp": round(self._error_exp, 3),
-            "error": round(self._error, 3),
-            "felt_temp_delta": round(self.felt_temp_delta, 3),
-            "felt_temp": round(self._felt_temp, 3),
-            "heating_until_target_temperature": self._heating_until_target_temperature,
-            "next_temp_adjust_at": as_local(self._next_temp_adjust_at).strftime("%H:%M:%S"),
-            "position": round(self._position, 2),
-            "raw_position": round(self._raw_position, 2),
-            "real_error": self._real_error,
-            "sweet_spot": round(self.sweet_spot, 3),
-            "target_temperature_configs": target_temperature_configs_str,
-            "thermostat_slope": round(self._thermostat_history.slope, 3),
-            "valve_slope": round(self._valve_history.slope, 3)
+        controller = self._controller
+        felt_temp_delta, sweet_spot = controller.configs.lookup(
+                controller.get_adjusted_target_temperature())
+        thermostat_slope = round(controller.thermostat_history.slope, 3)
+        valve_slope = round(self.valve_history.slope, 3)
+        weight = None if self._room is None else self._room.valves[self._name].weight
+
+        attributes_key = (
+            controller.configs.version,
+            controller.adjusted_felt_temp,
+            controller.error_exp,
+            controller.error,
+            felt_temp_delta,
+            controller.felt_temp,
+            controller.heating_until_target_temperature,
+            controller.next_temp_adjust_at,
+            self.valve_position,
+            self.valve_raw_position,
+            controller.real_error,
+            sweet_spot,
+            thermostat_slope,
+            valve_slope,
+            weight
+        )
+        if attributes_key == self._attributes_key:
+            return self._attributes
+
+        self._attributes_key = attributes_key
+        self._attributes = {
+            "adjusted_felt_temp": controller.adjusted_felt_temp,
+            "error_exp": round(controller.error_exp, 3),
+            "error": round(controller.error, 3),
+            "felt_temp_delta": round(felt_temp_delta, 3),
+            "felt_temp": round(controller.felt_temp, 3),
+            "heating_until_target_temperature": controller.heating_until_target_temperature,
+            "next_temp_adjust_at": as_local(controller.next_temp_adjust_at).strftime("%H:%M:%S"),
+            "position": round(self.valve_position, 2),
+            "raw_position": round(self.valve_raw_position, 2),
+            "real_error": controller.real_error,
+            "sweet_spot": round(sweet_spot, 3),
+            "target_temperature_configs": controller.configs.to_json_str(),
+            "thermostat_slope": thermostat_slope,
+            "valve_slope": valve_slope
         }
-        return attributes
+        if self._room is not None:
+            self._attributes["room"] = self._room.name
+            self._attributes["room_position"] = round(controller.position, 2)
+            self._attributes["weight"] = round(weight, 3)
+        return self._attributes
 
     @Throttle(UPDATE_INTERVAL_TIMEDELTA)
-    def update(self) -> None:
+    async def async_update(self) -> None:
+        await self.async_update_valve()
+
+    async def async_update_valve(self) -> None:
+        await self._valves_queue.metrics.async_measure_update(self.async_control_valve)
+
+    async def async_control_valve(self) -> None:
+        now = utcnow()
+        self._last_update_at = now
         if (not self._valve_actuator.available or
                 not self._temperature_sensor.available):
             LOGGER.info("%s: not updating %s %s",
@@ -259,7 +562,7 @@ class ValveCover(CoverEntity, RestoreEntity):
                         self._temperature_sensor.available)
             return
 
-        self.normalize_devices_state()
+        self.async_normalize_devices_state()
 
         #LOGGER.info("%s", self._valve_temperature_sensor.entity)
         raw_position = self._valve_actuator.valve_position
@@ -267,300 +570,115 @@ class ValveCover(CoverEntity, RestoreEntity):
             LOGGER.info("%s: Position not available", self._name)
             return
 
-        if raw_position != self._raw_position:
-            if raw_position == math.ceil(self._position):
-                LOGGER.info("%s: Position changed from %.1f to %.1f",
-                        self._name, self._raw_position, raw_position)
-            else:
-                LOGGER.info("%s: Position changed by third party from %.1f to %.1f",
-                        self._name, self._raw_position, raw_position)
-                self._position = raw_position
-            self._raw_position = raw_position
-            self._raw_position_changed_at = utcnow()
+        if self._room is None:
+            self._controller.observe_position(raw_position, now)
 
-        self.update_target_temperature()
+        self.update_target_temperature(now)
 
         # eurotronic has bug - try to work-around
-        if self._valve_actuator.value < 5.0:
+        if self._valve_actuator.value < VALVE_TEMPERATURE_MIN:
             LOGGER.info("%s skipping update: Has strange temp %.1f",
                     self._name, self._valve_actuator.value)
             return
 
-        self._thermostat_history.add_value(self._temperature_sensor.value)
-        self._valve_history.add_value(self._valve_actuator.value)
-
-        felt_ratio = 0.667
-        self._felt_temp = (
-            self._temperature_sensor.value * felt_ratio
-            + self._valve_actuator.value * (1.0 - felt_ratio))
-        #average_felt_temp = self._felt_temp
-        adjusted_felt_temp_delta = self.felt_temp_delta
-        peer_entity = self.peer_entity
-        # if peer_entity is not None:
-        #     peer_felt_temp = peer_entity.attributes.get("felt_temp")
-        #     if peer_felt_temp is not None:
-        #         average_felt_temp = 0.5 * (average_felt_temp + float(peer_felt_temp))
-        #         #LOGGER.info("%s: Average felt temp: %.3f", self._name, average_felt_temp)
-        if peer_entity is not None:
-            peer_felt_temp_delta = peer_entity.attributes.get("felt_temp_delta")
-            if peer_felt_temp_delta is not None:
-                diff = self.felt_temp_delta - float(peer_felt_temp_delta)
-                # "+=" would be wrong here - tested with Wohnzimmer valves where
-                # the colder turned off earlier
-                # weight with only 0.25 instead of 0.5 (=average)
-                adjusted_felt_temp_delta -= 0.25 * diff
-                #LOGGER.info("%s: Adjusted felt temp delta from %.3f to %.3f",
-                #       self._name, self.felt_temp_delta, adjusted_felt_temp_delta)
-
-        # kd with felt_ratio of 0.5: 0.5 overshoots, 1.0 turns off too early
-        # kd with felt_ratio of 0.667: try 0.5
-        self._real_error = round(self._temperature_sensor.value - self._target_temperature, 3)
-        self._adjusted_felt_temp = (
-            self._felt_temp
-            + max(-0.5, min(0.5, self._thermostat_history.slope * 0.5)) # kd, clamp to +/-0.5
-            - adjusted_felt_temp_delta)
-        self._error = self._adjusted_felt_temp - self._target_temperature
-
-        # make delta exponential, see https://www.wolframalpha.com/input/
-        # and https://www.desmos.com/calculator
-        # 0.1=>0.1, 0.5=>1.0 => a=0.84, b=1.73
-        # a*0.1*e^(b*0.1)=0.1,a*0.3*e^(b*0.3)=0.6 => a=0.71, b=3.47
-        self._error_exp = 0.71 * self._error * math.exp(3.47 * abs(self._error))
+        if self._room is None:
+            peer_felt_temp_delta = None
+            peer_entity = self.peer_entity
+            if peer_entity is not None:
+                peer_felt_temp_delta = peer_entity.attributes.get("felt_temp_delta")
+            self._controller.update(
+                    now,
+                    self._temperature_sensor.value,
+                    self._valve_actuator.value,
+                    peer_felt_temp_delta)
+        else:
+            self._room.observe_valve(self._name, raw_position, self._valve_actuator.value, now)
+            self._room.update(now, self._temperature_sensor.value)
 
         self._updated = True
 
-        if self.update_boost_mode():
+        suspended = self.async_update_boost_mode() or self.async_update_window_open()
+        if self._room is not None:
+            # boost mode and window open set the valve apart from the room
+            self._room.set_active(self._name, not suspended)
+        if suspended:
             return
 
-        if self.update_window_open():
+        if self._room is None:
+            _, valve_pos = self._controller.adjust(now)
+            if valve_pos is not None:
+                self.async_queue_set_valve(valve_pos, False)
+        else:
+            self.async_adjust_room(now)
+
+    @callback
+    def async_adjust_room(self, now:datetime) -> None:
+        # Whichever valve of the room updates first when the adjustment is due sets all
+        # valves of the room, the queue sends their writes together
+        valve_positions = self._room.adjust(now)
+        if valve_positions is None:
             return
+        for entity_name, valve_pos in valve_positions.items():
+            self._room_covers[entity_name].async_queue_set_valve(valve_pos, False)
 
-        self._next_temp_adjust_at = (
-                self._last_valve_adjust_at +
-                timedelta(seconds=self._update_interval))
-        if utcnow() >= self._next_temp_adjust_at:
-            self._last_valve_adjust_at = utcnow()
-            self.adjust_position()
-
-    def normalize_devices_state(self):
+    @callback
+    def async_normalize_devices_state(self):
         #LOGGER.info("temp sensor %s", repr(self._thermostat_temperature_sensor.entity.device_info))
         #LOGGER.info("valve %s", repr(self._valve_temperature_sensor.entity.device_info))
         if self._temperature_sensor.entity_attribute("mode") != "Boost":
-            res = self._valve_actuator.normalize_valve_state()
-            res = res or self._temperature_sensor.normalize_thermostat_state()
+            res = self._valve_actuator.async_normalize_valve_state()
+            res = res or self._temperature_sensor.async_normalize_thermostat_state()
             if res:
-                self.queue_set_valve(math.ceil(self.sweet_spot), False)
+                self.async_queue_set_valve(math.ceil(self.sweet_spot), False)
 
     @property
     def peer_entity(self):
         if self._peer_id is None:
             return None
         else:
-            return self._home_assistant.states.get(self.entity_id_to_cover_id(self._peer_id))
+            return self._states.get(self.entity_id_to_cover_id(self._peer_id))
 
     @property
-    def window_entities(self):
+    def window_sensor_ids(self) -> list[str]:
         if self._window_sensor_id is None:
             return []
-        else:
-            window_sensor_ids = self._window_sensor_id
-            if not isinstance(window_sensor_ids, list):
-                window_sensor_ids = [ window_sensor_ids ]
-            entities = []
-            for window_sensor_id in window_sensor_ids:
-                entities.append(self._home_assistant.states.get(window_sensor_id))
-            return entities
-
-    def get_adjusted_target_temperature(
-            self,
-            target_temperature: Union[float, None] = None) -> float:
-        if target_temperature is None:
-            target_temperature = self._target_temperature
-        temperature_adjust_sensor = self._home_assistant.states.get("sensor.temperature_adjust")
+        window_sensor_ids = self._window_sensor_id
+        if not isinstance(window_sensor_ids, list):
+            window_sensor_ids = [ window_sensor_ids ]
+        return window_sensor_ids
+
+    @property
+    def window_entities(self):
+        entities = []
+        for window_sensor_id in self.window_sensor_ids:
+            entities.append(self._states.get(window_sensor_id))
+        return entities
+
+    @property
+    def temperature_adjust(self) -> float:
+        temperature_adjust_sensor = self._states.get("sensor.temperature_adjust")
         try:
-            return target_temperature + float(temperature_adjust_sensor.state)
+            return float(temperature_adjust_sensor.state)
         except ValueError:
             LOGGER.warning("%s: target_temperature not a float", self._name)
-        return target_temperature
+        return 0.0
 
-    def update_target_temperature(self) -> None:
+    def update_target_temperature(self, now:datetime) -> None:
         if self._settemp_input is not None:
-            target_temperature = float(self._home_assistant.states.get(self._settemp_input).state)
+            target_temperature = float(self._states.get(self._settemp_input).state)
         else:
             target_temperature = self._temperature_sensor.entity_attribute("temperature")
-        target_temperature = self.get_adjusted_target_temperature(target_temperature)
-        if (self._target_temperature >= 0 and
-                abs(self._target_temperature - target_temperature) >= 0.5):
-            self._last_valve_adjust_at = utcnow() - timedelta(seconds=self._update_interval)
-            self._last_target_temperature_changed_at = utcnow()
-            self._target_temperature_changed = True
-        if self._target_temperature != target_temperature:
-            self._target_temperature = target_temperature
-            # ignore heating caused by changed target temperature
-            self._heating_started_at = datetime.min
-
-
-    def adjust_position(self) -> None:
-        # use raw_position instead of position for learning because,
-        # e.g. for eurotronic they may differ alot.
-        if self._raw_position > 0:
-            felt_temp_delta = self._felt_temp - self._temperature_sensor.value
-            # felt_temp_delta < 0 will decrease ratio, 0 is 1, > 0 will incrase ratio
-            #felt_temp_learn_weight = learn_weight * math.exp(felt_temp_delta)
-            # (felt_temp_delta - self.felt_temp_delta) < 0 will decrease, 0 is 1, > 0 will increase
-            felt_temp_delta_delta = felt_temp_delta - self.felt_temp_delta
-            felt_temp_sigmoid = 1.0 / (1.0 + math.exp(-felt_temp_delta_delta * 3.0))
-            felt_temp_learn_weight = (
-                0.00002
-                * self._update_interval
-                * (1.0 + felt_temp_sigmoid))
-            # default simple method
-            #felt_temp_learn_weight = learn_weight
-            #felt_temp_learn_weight = felt_temp_learn_weight * 100.0 # only temporary: faster!
-            self.felt_temp_delta = (
-                self.felt_temp_delta * (1.0 - felt_temp_learn_weight)
-                + felt_temp_delta * felt_temp_learn_weight)
-            LOGGER.info((
-                    "%s: New felt_temp learn: felt_temp_delta=%.3f"
-                    ", felt_temp_delta_delta=%.3f"
-                    ", felt_temp_sigmoid=%.3f"
-                    ", felt_temp_learn_weight=%.3f"),
-                self._name,
-                self.felt_temp_delta,
-                felt_temp_delta_delta,
-                felt_temp_sigmoid,
-                felt_temp_learn_weight)
-
-            # update sweet spot only when not heating to target or last target temp change was more
-            # than 4 hours ago
-            if (not self._heating_until_target_temperature
-                    or utcnow() >= self._last_target_temperature_changed_at +
-                            DELAY_LEARN_AFTER_TEMPERATURE_CHANGE):
-                combined_fitness = max(
-                        0.5,
-                        1.0 - abs(self._thermostat_history.slope) - abs(self._real_error))
-                learn_weight = 0.00002 * self._update_interval * combined_fitness
-
-                sweet_spot_learn_weight = learn_weight
-                # cap sweet spot at half of maximum position
-                self.sweet_spot = min(self._max_position / 2.0,(
-                        self.sweet_spot * (1.0 - sweet_spot_learn_weight)
-                        + float(self._raw_position) * sweet_spot_learn_weight))
-                # sweet_spot_learn_weight = 0.000005 * self._update_interval
-                # if self.sweet_spot < self._raw_position:
-                #     self.sweet_spot = min(40.0, self.sweet_spot * sweet_spot_learn_weight)
-                # else:
-                #     self.sweet_spot = max(1.0, self.sweet_spot / sweet_spot_learn_weight)
-                LOGGER.info((
-                        "%s: New sweet spot learn: real_error=%.3f, slope=%.3f"
-                        ", learn_weight=%.3f, sweet_spot_learn_weight=%.3f"),
-                    self._name,
-                    self._real_error,
-                    self._thermostat_history.slope,
-                    learn_weight,
-                    sweet_spot_learn_weight)
-
-        average_sweet_spot = self.sweet_spot
-        # peer_entity = self.peer_entity
-        # if peer_entity is not None:
-        #     peer_sweet_spot = peer_entity.attributes.get("sweet_spot")
-        #     if peer_sweet_spot is not None:
-        #         average_sweet_spot = 0.5 * (average_sweet_spot + float(peer_sweet_spot))
-        #         LOGGER.info("%s: Average sweet spot: %.3f", self._name, average_sweet_spot)
-
-        valve_pos = self._position
-        new_valve_pos = -1.0
-        if self._target_temperature_changed:
-            new_valve_pos = valve_pos - 2.0 * self._error * self.sweet_spot
-
-        # If it's colder than 0.5 degress from target temperature, enable
-        # heating_until_target_temperature
-        if (self._temperature_sensor.value < self._target_temperature - 0.5
-                and not self._heating_until_target_temperature):
-            LOGGER.info("%s: Start heating to target temperature.",
-                    self.name)
-            self._heating_until_target_temperature = True
-        elif (self._temperature_sensor.value >= self._target_temperature
-                and self._heating_until_target_temperature):
-            self._heating_until_target_temperature = False
-            if self._raw_position > self.sweet_spot:
-                LOGGER.info("%s: Reached target temperature after heating. "
-                        "Going to sweet spot %.2f.",
-                        self.name, self.sweet_spot)
-                new_valve_pos = self.sweet_spot
-            else:
-                LOGGER.info("%s: Reached target temperature after heating but position below"
-                        " sweet spot - performing standard adjust.",
-                        self.name)
-
-        # If new_valve_pos was not yet set by a special case perform standard adjust
-        if new_valve_pos < 0.0:
-            #valve_delta = float(-self._error_exp * self._position_factor * self.sweet_spot)
-            valve_delta = float(-self._error_exp * self._position_factor * average_sweet_spot)
-            # ensure minimum change
-            if valve_delta >= 0:
-                valve_delta = max(0.333, valve_delta)
-            else:
-                valve_delta = min(-0.333, valve_delta)
-            # put valve delta on a logarithmic scale: valve_pos 0=>1, 20=>2
-            #valve_delta = valve_delta * math.exp(math.log(2) * valve_pos / 20.0)
-            new_valve_pos = valve_pos + valve_delta
-
-        adaptive_max_position = max(5.0, min(self._max_position, self.sweet_spot * 2.0))
-        new_valve_pos = min(adaptive_max_position, max(self._min_position, new_valve_pos))
-        # if coming from position 0 directly jump to ratio of sweet spot
-        # (depending on slope disabled for now)
-        if (not self._target_temperature_changed
-                and self._position == 0
-                and new_valve_pos > 0):
-                #and self._thermostat_history.slope < 0):
-
-            # slope factor 1.0 was a too agressive (esp. during night)
-            # slope_factor = 0.75
-            # new_valve_pos = max(
-            #         new_valve_pos,
-            #         self.sweet_spot * slope_factor * -self._thermostat_history.slope)
-            new_valve_pos = self.sweet_spot
-            self._heating_started_at = utcnow()
-            LOGGER.info("%s: Turning on from position 0. Directly go to %.2f.",
-                    self.name, new_valve_pos)
-
-        valve_pos_changes = math.ceil(new_valve_pos) != self._raw_position
-
-        # Reset _target_temperature_changed
-        self._target_temperature_changed = False
-
-        self._position = new_valve_pos
-        if valve_pos_changes:
-            if (new_valve_pos == 0
-                    and self._heating_started_at != datetime.min):
-                heating_duration = utcnow() - self._heating_started_at
-                if heating_duration < timedelta(hours=3):
-                    # if we heated less than 3 hours sweet spot is probably too high
-                    self.sweet_spot = self.sweet_spot * 0.67
-                    LOGGER.info("%s: Heating period too short => decreased sweetspot to %.1f",
-                                self._name,
-                                self.sweet_spot)
-                self._heating_started_at = datetime.min
-
-            self.queue_set_valve(math.ceil(new_valve_pos), False)
-            LOGGER.info((
-                        "%s: queued: "
-                        "  current_temperature=%.2f  target_temperature=%.2f  "
-                        "  error=%.2f  valve_pos=%.2f  new_valve_pos=%.2f"
-                    ),
-                    self.name,
-                    self._temperature_sensor.value,
-                    self._target_temperature,
-                    self._error,
-                    valve_pos,
-                    new_valve_pos)
-
+        self._controller.temperature_adjust = self.temperature_adjust
+        self._controller.set_target_temperature(
+                self._controller.get_adjusted_target_temperature(target_temperature), now)
 
-    def queue_set_valve(self, valve_pos:int, urgent:bool = True) -> None:
-        self._valves_queue.set_valve(self._valve_actuator, valve_pos, urgent)
+    @callback
+    def async_queue_set_valve(self, valve_pos:int, urgent:bool = True,
+            priority:Union[int, None] = None) -> None:
+        self._valves_queue.async_set_valve(self._valve_actuator, valve_pos, urgent, priority)
 
-    def update_window_open(self) -> bool:
+    @callback
+    def async_update_window_open(self) -> bool:
         window_entities_longer_open = False
         for window_entity in self.window_entities:
             window_entities_longer_open = window_entities_longer_open or (
@@ -570,14 +688,15 @@ class ValveCover(CoverEntity, RestoreEntity):
         #LOGGER.info("%s: window_entity_is_longer_open = %r",
         #       self.name, window_entity_is_longer_open)
         #if window_entity_is_longer_open:
-        if self._valve_history.slope < -10.0 or window_entities_longer_open:
+        valve_slope = self.valve_history.slope
+        if valve_slope < -10.0 or window_entities_longer_open:
             self._window_open_until = utcnow() + timedelta(minutes=10)
             self._sweet_spot_blocked_until = utcnow() + timedelta(hours=2)
             if self._window_open_saved_position < 0:
                 LOGGER.info("%s: slope %.2f too low or window switch open. Window open triggered.",
-                        self.name, self._valve_history.slope)
-                self._window_open_saved_position = self._position
-                self.queue_set_valve(0)
+                        self.name, valve_slope)
+                self._window_open_saved_position = self.valve_position
+                self.async_queue_set_valve(0, priority=PRIORITY_HIGH)
             return True
 
         if self._window_open_saved_position < 0:
@@ -586,32 +705,34 @@ class ValveCover(CoverEntity, RestoreEntity):
         if utcnow() > self._window_open_until:
             LOGGER.info("%s: Reset window open and set valve back to position %d",
                     self.name, self._window_open_saved_position)
-            self.queue_set_valve(self._window_open_saved_position)
-            self._thermostat_history.reset()
+            self.async_queue_set_valve(self._window_open_saved_position, priority=PRIORITY_HIGH)
+            self._controller.window_closed(utcnow())
             self._window_open_until = None
             self._window_open_saved_position = -1
-            self._last_valve_adjust_at = utcnow()
 
         return True
 
-    def update_boost_mode(self) -> bool:
+    @callback
+    def async_update_boost_mode(self) -> bool:
         is_boost_mode = self._temperature_sensor.entity_attribute("mode") == "Boost"
         if self._valve_position_before_boost_mode < 0 and is_boost_mode:
             LOGGER.info("%s: Starting boost mode", self.name)
-            self._valve_position_before_boost_mode = self._position
-            self.queue_set_valve(80)
+            self._valve_position_before_boost_mode = self.valve_position
+            self.async_queue_set_valve(80, priority=PRIORITY_HIGH)
             return True
         if self._valve_position_before_boost_mode >= 0 and not is_boost_mode:
-            if self._position == self._valve_position_before_boost_mode:
+            if self.valve_position == self._valve_position_before_boost_mode:
                 LOGGER.info("%s: Boost mode ended", self.name)
                 self._valve_position_before_boost_mode = -1
             else:
-                self.reset_boost_mode()
+                self.async_reset_boost_mode()
             return True
         return is_boost_mode
 
-    def reset_boost_mode(self) -> None:
+    @callback
+    def async_reset_boost_mode(self) -> None:
         if utcnow() > self._reset_boost_mode_at + timedelta(minutes=5):
             LOGGER.info("%s: Resetting boost mode", self.name)
             self._reset_boost_mode_at = utcnow()
-            self.queue_set_valve(self._valve_position_before_boost_mode)
+            self.async_queue_set_valve(
+                    self._valve_position_before_boost_mode, priority=PRIORITY_HIGH)
@@ -0,0 +1,65 @@
+from typing import Union
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers import entity_registry
+
+from .const import LOGGER
+
+class DeviceIdResolver:
+    # Device ids of the configured TRV entities, e.g. for HomematicIP Local put_paramset.
+    # All are looked up in one pass at setup and kept up to date by entity registry
+    # events, so no write has to wait for a registry lookup.
+
+    def __init__(self, hass:HomeAssistant):
+        self._hass = hass
+        self._device_ids: dict[str, Union[str, None]] = {}
+        self._unsub_registry_updated = None
+
+    @callback
+    def async_resolve(self, entity_ids:list[str]) -> None:
+        registry = entity_registry.async_get(self._hass)
+        for entity_id in entity_ids:
+            self._device_ids[entity_id] = self.registry_device_id(registry, entity_id)
+        LOGGER.info("Resolved device ids of %d of %d entities",
+                sum(1 for device_id in self._device_ids.values() if device_id is not None),
+                len(self._device_ids))
+        if self._unsub_registry_updated is None:
+            self._unsub_registry_updated = self._hass.bus.async_listen(
+                    entity_registry.EVENT_ENTITY_REGISTRY_UPDATED, self.async_registry_updated)
+
+    @staticmethod
+    def registry_device_id(registry, entity_id:str) -> Union[str, None]:
+        entry = registry.async_get(entity_id)
+        return None if entry is None else entry.device_id
+
+    def device_id(self, entity_id:str) -> Union[str, None]:
+        return self._device_ids.get(entity_id)
+
+    @callback
+    def async_unsubscribe(self, event:Union[Event, None] = None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (event)
+
+        if self._unsub_registry_updated is not None:
+            self._unsub_registry_updated()
+            self._unsub_registry_updated = None
+
+    @callback
+    def async_registry_updated(self, event:Event) -> None:
+        entity_id = event.data.get("entity_id")
+        old_entity_id = event.data.get("old_entity_id")
+        if (event.data.get("action") == "update" and old_entity_id is not None
+                and old_entity_id in self._device_ids):
+            # renamed entity
+            LOGGER.info("%s: entity_id changed to %s", old_entity_id, entity_id)
+            self._device_ids[entity_id] = self._device_ids.pop(old_entity_id)
+        if entity_id not in self._device_ids:
+            return
+        if event.data.get("action") == "remove":
+            device_id = None
+        else:
+            device_id = self.registry_device_id(entity_registry.async_get(self._hass), entity_id)
+        if device_id != self._device_ids[entity_id]:
+            LOGGER.info("%s: device_id changed from %s to %s",
+                    entity_id, self._device_ids[entity_id], device_id)
+            self._device_ids[entity_id] = device_id
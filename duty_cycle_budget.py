@@ -0,0 +1,102 @@
+from typing import Union
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import utcnow
+
+from .const import (
+    DEFAULT_DUTY_CYCLE_COST_BURST,
+    DEFAULT_DUTY_CYCLE_COST_WAKEUP,
+    DEFAULT_DUTY_CYCLE_TARGET,
+    DUTY_CYCLE_NON_URGENT_HEADROOM,
+    LOGGER
+)
+
+class DutyCycleBudget:
+    # Token bucket model of the Homematic duty cycle. The duty cycle is the used
+    # percentage of the 1% transmit time budget per hour, so it recovers by about
+    # 100% per hour when nothing is sent.
+    RECOVERY_PER_SECOND = 100.0 / 3600.0
+
+    def __init__(self, hass:HomeAssistant, duty_cycle_sensor:Union[str, None],
+            target:float = DEFAULT_DUTY_CYCLE_TARGET,
+            burst_cost:float = DEFAULT_DUTY_CYCLE_COST_BURST,
+            wakeup_cost:float = DEFAULT_DUTY_CYCLE_COST_WAKEUP,
+            states=None):
+        self._hass = hass
+        self._states = hass.states if states is None else states
+        self._duty_cycle_sensor = duty_cycle_sensor
+        self._target = float(target)
+        self._burst_cost = float(burst_cost)
+        self._wakeup_cost = float(wakeup_cost)
+
+        # estimated cost of writes not yet reflected by the duty cycle sensor
+        self._pending_cost = 0.0
+        self._pending_updated_at = utcnow()
+        self._sensor_updated_at = None
+        # urgent flags of the writes which are currently over budget, for logging changes
+        self._exhausted: set[bool] = set()
+        if duty_cycle_sensor is None:
+            LOGGER.warning("DutyCycleBudget: homematic_duty_cycle_sensor missing in config"
+                    " - using estimated duty cycle only")
+
+    @property
+    def target(self) -> float:
+        return self._target
+
+    @property
+    def measured_duty_cycle(self) -> Union[float, None]:
+        if self._duty_cycle_sensor is None:
+            return None
+        duty_cycle_state = self._states.get(self._duty_cycle_sensor)
+        if duty_cycle_state is None:
+            LOGGER.warning("DutyCycleBudget: homematic_duty_cycle_sensor does not exist")
+            return None
+        try:
+            duty_cycle = float(duty_cycle_state.state)
+        except (TypeError, ValueError):
+            LOGGER.warning("DutyCycleBudget: homematic_duty_cycle_sensor state is %s",
+                    duty_cycle_state.state)
+            return None
+        if self._sensor_updated_at != duty_cycle_state.last_updated:
+            # The new reading contains the writes sent so far
+            self._sensor_updated_at = duty_cycle_state.last_updated
+            self._pending_cost = 0.0
+            self._pending_updated_at = utcnow()
+        return duty_cycle
+
+    @property
+    def estimated_duty_cycle(self) -> float:
+        measured_duty_cycle = self.measured_duty_cycle
+        now = utcnow()
+        elapsed = (now - self._pending_updated_at).total_seconds()
+        self._pending_updated_at = now
+        # pending writes recover like everything else, which also covers a stale sensor
+        self._pending_cost = max(0.0, self._pending_cost - elapsed * self.RECOVERY_PER_SECOND)
+        if measured_duty_cycle is None:
+            measured_duty_cycle = 0.0
+        return measured_duty_cycle + self._pending_cost
+
+    def cost(self, urgent:bool) -> float:
+        # BURST wakes up the TRV immediately and needs a long preamble, WAKEUP
+        # waits for the next regular contact of the device
+        return self._burst_cost if urgent else self._wakeup_cost
+
+    def limit(self, urgent:bool) -> float:
+        # keep some headroom for urgent writes
+        return self._target if urgent else self._target - DUTY_CYCLE_NON_URGENT_HEADROOM
+
+    def try_consume(self, urgent:bool) -> bool:
+        estimated_duty_cycle = self.estimated_duty_cycle
+        if estimated_duty_cycle + self.cost(urgent) > self.limit(urgent):
+            # skipped entries are checked on every queue tick - log only the change
+            if urgent not in self._exhausted:
+                self._exhausted.add(urgent)
+                LOGGER.info("DutyCycleBudget: estimated duty cycle %.1f too high for %s writes",
+                        estimated_duty_cycle, "urgent" if urgent else "non-urgent")
+            return False
+        if urgent in self._exhausted:
+            self._exhausted.discard(urgent)
+            LOGGER.info("DutyCycleBudget: estimated duty cycle %.1f allows %s writes again",
+                    estimated_duty_cycle, "urgent" if urgent else "non-urgent")
+        self._pending_cost += self.cost(urgent)
+        return True
@@ -0,0 +1,82 @@
+import functools
+
+from datetime import datetime
+from typing import Callable, Union
+
+from homeassistant.core import HomeAssistant, State
+from homeassistant.util import utcnow
+
+from .const import LOGGER, UPDATE_INTERVAL, WARM_START_TIMEDELTA
+from .temperature_history import TemperatureHistory
+
+class HistoryWarmStart:
+    # Fills the TemperatureHistorys after a restart from the recorder, so the slopes are
+    # known from the first update on. The recorded states of all entities are read in
+    # one executor job and replayed at every update interval like the polled updates
+    # would have seen them.
+
+    def __init__(self, hass:HomeAssistant):
+        self._hass = hass
+        self._histories: dict[str, list[tuple[Callable[[State], Union[float, None]],
+                TemperatureHistory]]] = {}
+        self._added: set[int] = set()
+
+    def add(self, entity_id:str, state_value:Callable[[State], Union[float, None]],
+            history:TemperatureHistory) -> None:
+        # e.g. all valves of a room add the shared thermostat history
+        if id(history) in self._added:
+            return
+        self._added.add(id(history))
+        self._histories.setdefault(entity_id, []).append((state_value, history))
+
+    async def async_warm_start(self) -> None:
+        if "recorder" not in self._hass.config.components or len(self._histories) == 0:
+            return
+        # recorder is optional, only import it if it's loaded
+        # pylint: disable=import-outside-toplevel
+        from homeassistant.components.recorder import get_instance, history
+
+        end_time = utcnow()
+        start_time = end_time - WARM_START_TIMEDELTA
+        try:
+            states = await get_instance(self._hass).async_add_executor_job(
+                    functools.partial(
+                        history.get_significant_states,
+                        self._hass,
+                        start_time,
+                        end_time,
+                        list(self._histories.keys()),
+                        include_start_time_state=True,
+                        significant_changes_only=False))
+        except Exception as exception:  # pylint: disable=broad-except
+            LOGGER.warning("Reading history for warm start failed: %s", exception)
+            return
+
+        values = 0
+        for entity_id, entity_histories in self._histories.items():
+            entity_states = states.get(entity_id, [])
+            for state_value, temperature_history in entity_histories:
+                values += self.replay(
+                        entity_states, state_value, temperature_history, start_time, end_time)
+        LOGGER.info("Warm start with %d values of %d entities from %s", values,
+                len(states), start_time)
+
+    @staticmethod
+    def replay(states:list[State], state_value:Callable[[State], Union[float, None]],
+            temperature_history:TemperatureHistory, start_time:datetime,
+            end_time:datetime) -> int:
+        now = start_time.timestamp()
+        end = end_time.timestamp()
+        index = 0
+        value = None
+        values = 0
+        while now <= end:
+            while index < len(states) and states[index].last_updated.timestamp() <= now:
+                value = state_value(states[index])
+                index += 1
+            # like an update, which skips unavailable entities
+            if value is not None:
+                temperature_history.add_value(value, now)
+                values += 1
+            now += UPDATE_INTERVAL
+        return values
@@ -0,0 +1,31 @@
+from typing import Any
+
+class PendingCommands:
+    # Normalize commands sent to a device which did not report the expected state yet.
+    # Each key (entity and command) maps to the expected state, i.e. the service data,
+    # and the time after which the command is given up and may be sent again.
+
+    def __init__(self):
+        self._pending: dict[str, tuple[Any, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key:str) -> bool:
+        return key in self._pending
+
+    def is_pending(self, key:str, expected:Any, now:float) -> bool:
+        pending = self._pending.get(key)
+        if pending is None:
+            return False
+        pending_expected, expires_at = pending
+        if now >= expires_at:
+            del self._pending[key]
+            return False
+        return pending_expected == expected
+
+    def add(self, key:str, expected:Any, expires_at:float) -> None:
+        self._pending[key] = (expected, expires_at)
+
+    def confirm(self, key:str) -> None:
+        self._pending.pop(key, None)
@@ -0,0 +1,183 @@
+import math
+
+from datetime import datetime, timedelta
+from typing import Any, Union
+
+from .const import (
+    DEFAULT_POSITION,
+    LOGGER,
+    ROOM_WEIGHT_LEARN_FACTOR,
+    ROOM_WEIGHT_LEARN_MAX_ERROR,
+    ROOM_WEIGHT_MAX,
+    ROOM_WEIGHT_MIN,
+    SLOPE_ESTIMATOR_DELTA,
+    UPDATE_INTERVAL_TIMEDELTA
+)
+from .target_temperature_config import TargetTemperaturConfig
+from .temperature_history import TemperatureHistory
+from .valve_controller import ValveController
+
+class RoomValve:
+    # One valve of a room controlled by a RoomController
+
+    def __init__(self, name:str, valve_config:dict):
+        self.name = name
+        self.min_position = valve_config.get("min_position", 0)
+        self.max_position = valve_config.get("max_position", 80)
+        # share of the room position, the mean weight of a room is 1
+        self.weight = 1.0
+        self.position = DEFAULT_POSITION
+        self.raw_position = -1
+        self.valve_temperature = None
+        self.valve_history = TemperatureHistory(
+                timedelta(minutes=10),
+                slope_estimator=valve_config.get("valve_slope", SLOPE_ESTIMATOR_DELTA))
+        # False while e.g. window open or boost mode set the valve
+        self.active = True
+
+
+class RoomController:
+    # Control and learning loop of a room with several valves and one thermostat without
+    # any Home Assistant dependency. The ValveController runs once for the room on the
+    # mean valve temperature, its position is the room position. A valve is set to the
+    # room position times its weight. The weights are learned to even out the valve
+    # temperatures, so a valve which heats more than the others gets a lower share.
+
+    def __init__(self, name:str, valve_configs:list[dict], update_interval:float,
+            now:datetime):
+        self.name = name
+        # the first valve config holds the room settings, e.g. position_factor
+        self.controller = ValveController(name, valve_configs[0], update_interval, now)
+        self.valves = {
+            valve_config["id"]: RoomValve(valve_config["id"], valve_config)
+            for valve_config in valve_configs
+        }
+        self._updated_at = None
+        # restored target temperature configs of the valves per target temperature
+        self._restored_configs: dict[float, list[TargetTemperaturConfig]] = {}
+
+    @property
+    def active_valves(self) -> list[RoomValve]:
+        return [valve for valve in self.valves.values() if valve.active]
+
+    def restore_configs(self, json_dict:dict[str, Any]) -> None:
+        # The valves of a room may have learned their own target temperature configs
+        # before, e.g. as single valves. The room starts with their mean per target
+        # temperature.
+        for target_temperature, target_temperature_config_json in json_dict.items():
+            target_temperature_config = TargetTemperaturConfig()
+            target_temperature_config.from_json(target_temperature_config_json)
+            self._restored_configs.setdefault(float(target_temperature), []).append(
+                    target_temperature_config)
+        configs = self.controller.configs
+        for target_temperature, restored_configs in self._restored_configs.items():
+            target_temperature_config = TargetTemperaturConfig()
+            target_temperature_config.felt_temp_delta = sum(
+                    config.felt_temp_delta for config in restored_configs) / len(restored_configs)
+            target_temperature_config.sweet_spot = sum(
+                    config.sweet_spot for config in restored_configs) / len(restored_configs)
+            configs.put(target_temperature, target_temperature_config)
+        configs.evict(None)
+
+    def restore_heating_until_target_temperature(self, heating:bool) -> None:
+        # the room heats until the target temperature if any of its valves did
+        controller = self.controller
+        controller.heating_until_target_temperature = (
+                controller.heating_until_target_temperature or bool(heating))
+
+    def restore_valve(self, name:str, position:float, weight:float) -> None:
+        valve = self.valves[name]
+        valve.weight = min(ROOM_WEIGHT_MAX, max(ROOM_WEIGHT_MIN, float(weight)))
+        valve.position = position
+        valve.raw_position = math.ceil(position)
+        restored = [valve for valve in self.valves.values() if valve.position >= 0]
+        if len(restored) == 0:
+            return
+        self.controller.position = (
+                sum(valve.position / valve.weight for valve in restored) / len(restored))
+        self.controller.raw_position = math.ceil(self.controller.position)
+
+    def set_active(self, name:str, active:bool) -> None:
+        valve = self.valves[name]
+        if valve.active != active:
+            LOGGER.info("%s: %s %s room control", self.name, name,
+                    "returns to" if active else "is excluded from")
+            valve.active = active
+
+    def observe_valve(self, name:str, raw_position:float, valve_temperature:float,
+            now:datetime) -> None:
+        valve = self.valves[name]
+        if raw_position != valve.raw_position:
+            if raw_position != math.ceil(valve.position):
+                LOGGER.info("%s: Position changed by third party from %.1f to %.1f",
+                        name, valve.raw_position, raw_position)
+                valve.position = raw_position
+            valve.raw_position = raw_position
+        valve.valve_temperature = valve_temperature
+        valve.valve_history.add_value(valve_temperature, now.timestamp())
+
+    def update(self, now:datetime, thermostat_temperature:float) -> None:
+        # Every valve of the room calls update, the room is computed once per update
+        # interval for all of them. The valves' updates jitter, so waiting the full
+        # interval would skip every other one.
+        if (self._updated_at is not None
+                and now < self._updated_at + UPDATE_INTERVAL_TIMEDELTA / 2):
+            return
+        valves = [valve for valve in self.active_valves if valve.valve_temperature is not None]
+        if len(valves) == 0:
+            return
+        self._updated_at = now
+        controller = self.controller
+        if all(valve.raw_position == math.ceil(valve.position) for valve in valves):
+            # all valves are where the room put them
+            room_raw_position = math.ceil(controller.position)
+        else:
+            room_raw_position = sum(
+                    valve.raw_position / valve.weight for valve in valves) / len(valves)
+        controller.observe_position(room_raw_position, now)
+        controller.update(
+                now,
+                thermostat_temperature,
+                sum(valve.valve_temperature for valve in valves) / len(valves))
+
+    def learn_weights(self) -> None:
+        valves = [valve for valve in self.active_valves if valve.valve_temperature is not None]
+        if len(valves) < 2:
+            return
+        # Far from the target, e.g. while heating up, the valve temperatures differ by
+        # how fast each radiator warms up, which would push a cold valve to the maximum
+        if abs(self.controller.real_error) > ROOM_WEIGHT_LEARN_MAX_ERROR:
+            return
+        mean_valve_temperature = sum(valve.valve_temperature for valve in valves) / len(valves)
+        learn_weight = (
+                self.controller.learn_rate
+                * self.controller.update_interval
+                * ROOM_WEIGHT_LEARN_FACTOR)
+        # Only the weights of the valves taking part are learned, their mean stays the
+        # same, so the weights of e.g. a valve with open window are kept as they are.
+        mean_weight = sum(valve.weight for valve in valves) / len(valves)
+        for valve in valves:
+            valve.weight *= math.exp(
+                    -learn_weight * (valve.valve_temperature - mean_valve_temperature))
+        scale = mean_weight * len(valves) / sum(valve.weight for valve in valves)
+        for valve in valves:
+            valve.weight = min(ROOM_WEIGHT_MAX, max(ROOM_WEIGHT_MIN, valve.weight * scale))
+        LOGGER.debug("%s: New valve weights %s", self.name,
+                {valve.name: round(valve.weight, 3) for valve in self.valves.values()})
+
+    def adjust(self, now:datetime) -> Union[dict[str, int], None]:
+        # Returns the new positions of the valves whose position changes if an adjustment
+        # of the room is due
+        controller = self.controller
+        due, _ = controller.adjust(now)
+        if not due:
+            return None
+        if controller.position > 0:
+            self.learn_weights()
+        positions = {}
+        for valve in self.active_valves:
+            valve.position = min(valve.max_position, max(valve.min_position,
+                    controller.position * valve.weight))
+            if math.ceil(valve.position) != valve.raw_position:
+                positions[valve.name] = math.ceil(valve.position)
+        return positions
@@ -0,0 +1,341 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import random
+import sys
+import time
+
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Union
+
+from .const import LOGGER, UPDATE_INTERVAL
+from .valve_controller import ValveController
+
+# Offline simulator for ValveController. Either a thermal room model is heated by the
+# controller (closed loop), or recorded thermostat/valve temperatures are replayed
+# (open loop - the recording doesn't react to the simulated valve positions). Run it
+# from the directory containing the valves package:
+#
+#   python -m valves.simulator --days 14 --set position_factor=0.05
+#   python -m valves.simulator --csv bedroom.csv
+
+SIMULATION_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DEFAULT_SCHEDULE = "06:00=21,22:00=18"
+# comfort band for the convergence time in Kelvin
+DEFAULT_CONVERGENCE_BAND = 0.3
+# errors shortly after a target temperature change don't count against convergence
+CONVERGENCE_SETTLE_TIME = timedelta(hours=2)
+
+class RoomModel:
+    # Lumped model of a radiator heating the room air, which loses heat to the
+    # outside. Rates are per hour. The defaults need a valve position of about
+    # 12% to hold 21°C at 5°C outside.
+
+    def __init__(self, room_temperature:float = 18.0, outside_temperature:float = 5.0,
+            outside_amplitude:float = 4.0, supply_temperature:float = 55.0,
+            radiator_gain:float = 3.0, radiator_emission:float = 2.0,
+            room_gain:float = 0.15, room_loss:float = 0.05,
+            valve_sensor_coupling:float = 0.3, noise:float = 0.05,
+            seed:Union[int, None] = None):
+        self._room_temperature = room_temperature
+        self._radiator_temperature = room_temperature
+        self._outside_temperature = outside_temperature
+        self._outside_amplitude = outside_amplitude
+        self._supply_temperature = supply_temperature
+        self._radiator_gain = radiator_gain
+        self._radiator_emission = radiator_emission
+        self._room_gain = room_gain
+        self._room_loss = room_loss
+        # share of the radiator temperature seen by the sensor of the TRV
+        self._valve_sensor_coupling = valve_sensor_coupling
+        self._noise = noise
+        self._random = random.Random(seed)
+
+    @property
+    def room_temperature(self) -> float:
+        return self._room_temperature
+
+    def outside_temperature(self, now:datetime) -> float:
+        # coldest at 4:00, warmest at 16:00
+        hours = now.hour + now.minute / 60.0
+        return (self._outside_temperature
+                - self._outside_amplitude * math.cos((hours - 4.0) * math.pi / 12.0))
+
+    def step(self, valve_position:float, now:datetime, seconds:float) -> None:
+        hours = seconds / 3600.0
+        flow = max(0.0, min(100.0, valve_position)) / 100.0
+        radiator_delta = (
+            self._radiator_gain * flow * (self._supply_temperature - self._radiator_temperature)
+            - self._radiator_emission * (self._radiator_temperature - self._room_temperature))
+        room_delta = (
+            self._room_gain * (self._radiator_temperature - self._room_temperature)
+            - self._room_loss * (self._room_temperature - self.outside_temperature(now)))
+        self._radiator_temperature += radiator_delta * hours
+        self._room_temperature += room_delta * hours
+
+    def measure(self, temperature:float) -> float:
+        # sensors report with noise and a resolution of 0.1
+        return round(temperature + self._random.gauss(0.0, self._noise), 1)
+
+    @property
+    def thermostat_temperature(self) -> float:
+        return self.measure(self._room_temperature)
+
+    @property
+    def valve_temperature(self) -> float:
+        return self.measure(self._room_temperature + self._valve_sensor_coupling * (
+                self._radiator_temperature - self._room_temperature))
+
+
+class SimulationResult:
+    def __init__(self, name:str, convergence_band:float = DEFAULT_CONVERGENCE_BAND):
+        self.name = name
+        self.convergence_band = convergence_band
+        self.started_at = None
+        self.ended_at = None
+        self.samples = 0
+        self.absolute_error_sum = 0.0
+        self.valve_moves = 0
+        self.last_target_temperature = None
+        self.last_target_temperature_changed_at = None
+        # last sample outside of the comfort band after settling
+        self.last_discomfort_at = None
+        self.sweet_spot = None
+        self.felt_temp_delta = None
+        self.wall_seconds = 0.0
+
+    def add_sample(self, now:datetime, temperature:float, target_temperature:float) -> None:
+        if self.started_at is None:
+            self.started_at = now
+        self.ended_at = now
+        if target_temperature != self.last_target_temperature:
+            self.last_target_temperature = target_temperature
+            self.last_target_temperature_changed_at = now
+        error = abs(temperature - target_temperature)
+        self.samples += 1
+        self.absolute_error_sum += error
+        if (error > self.convergence_band
+                and now >= self.last_target_temperature_changed_at + CONVERGENCE_SETTLE_TIME):
+            self.last_discomfort_at = now
+
+    @property
+    def comfort_error(self) -> float:
+        # mean absolute deviation of the thermostat temperature from the target
+        return self.absolute_error_sum / self.samples if self.samples > 0 else 0.0
+
+    @property
+    def convergence_time(self) -> Union[timedelta, None]:
+        # time after which the temperature stays within the comfort band, None if
+        # it left the band until the end
+        if self.started_at is None:
+            return None
+        if self.last_discomfort_at is None:
+            return timedelta(0)
+        if self.last_discomfort_at >= self.ended_at - CONVERGENCE_SETTLE_TIME:
+            return None
+        return self.last_discomfort_at - self.started_at
+
+    @property
+    def speedup(self) -> float:
+        if self.wall_seconds <= 0.0 or self.started_at is None:
+            return 0.0
+        return (self.ended_at - self.started_at).total_seconds() / self.wall_seconds
+
+    def to_json(self) -> dict:
+        convergence_time = self.convergence_time
+        return {
+            "name": self.name,
+            "samples": self.samples,
+            "simulated_hours": round(
+                    (self.ended_at - self.started_at).total_seconds() / 3600.0, 1)
+                    if self.started_at is not None else 0.0,
+            "comfort_error": round(self.comfort_error, 3),
+            "valve_moves": self.valve_moves,
+            "convergence_hours": round(convergence_time.total_seconds() / 3600.0, 1)
+                    if convergence_time is not None else None,
+            "sweet_spot": round(self.sweet_spot, 2) if self.sweet_spot is not None else None,
+            "felt_temp_delta": round(self.felt_temp_delta, 3)
+                    if self.felt_temp_delta is not None else None,
+            "speedup": round(self.speedup)
+        }
+
+
+def parse_schedule(schedule:str) -> list[tuple[int, float]]:
+    # "06:00=21,22:00=18" => [(360, 21.0), (1320, 18.0)] in minutes of the day
+    entries = []
+    for entry in schedule.split(","):
+        clock, target_temperature = entry.split("=")
+        hours, minutes = clock.split(":")
+        entries.append((int(hours) * 60 + int(minutes), float(target_temperature)))
+    if len(entries) == 0:
+        raise ValueError("Empty schedule")
+    entries.sort()
+    return entries
+
+
+def scheduled_target_temperature(schedule:list[tuple[int, float]], now:datetime) -> float:
+    minute_of_day = now.hour * 60 + now.minute
+    # before the first entry of the day the last entry of the previous day applies
+    target_temperature = schedule[-1][1]
+    for minute, scheduled_temperature in schedule:
+        if minute > minute_of_day:
+            break
+        target_temperature = scheduled_temperature
+    return target_temperature
+
+
+def new_controller(valve_config:dict, now:datetime) -> ValveController:
+    # same update interval as ValveCover without the random splay
+    return ValveController(valve_config.get("id", "simulated"), valve_config, 15 * 60.0, now)
+
+
+def simulate_room(valve_config:dict, room_model:RoomModel, days:float = 14.0,
+        schedule:str = DEFAULT_SCHEDULE,
+        convergence_band:float = DEFAULT_CONVERGENCE_BAND) -> SimulationResult:
+    target_schedule = parse_schedule(schedule)
+    now = SIMULATION_START
+    end = now + timedelta(days=days)
+    step = timedelta(seconds=UPDATE_INTERVAL)
+    controller = new_controller(valve_config, now)
+    result = SimulationResult(controller.name, convergence_band)
+    # position reported by the valve, the first write happens with the first adjust
+    valve_position = 0
+    wall_started_at = time.perf_counter()
+    while now < end:
+        room_model.step(valve_position, now, UPDATE_INTERVAL)
+        target_temperature = scheduled_target_temperature(target_schedule, now)
+        thermostat_temperature = room_model.thermostat_temperature
+
+        controller.observe_position(valve_position, now)
+        controller.set_target_temperature(target_temperature, now)
+        controller.update(now, thermostat_temperature, room_model.valve_temperature)
+        _, new_valve_position = controller.adjust(now)
+        if new_valve_position is not None:
+            result.valve_moves += 1
+            valve_position = new_valve_position
+
+        result.add_sample(now, room_model.room_temperature, target_temperature)
+        now += step
+    result.wall_seconds = time.perf_counter() - wall_started_at
+    result.sweet_spot = controller.sweet_spot
+    result.felt_temp_delta = controller.felt_temp_delta
+    return result
+
+
+def parse_timestamp(timestamp:str) -> datetime:
+    try:
+        return datetime.fromtimestamp(float(timestamp), timezone.utc)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def read_csv(path:str) -> Iterable[tuple[datetime, float, float, float]]:
+    # Columns: timestamp (POSIX or ISO 8601), thermostat_temperature,
+    # valve_temperature, target_temperature
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        for row in csv.DictReader(csv_file):
+            try:
+                yield (
+                    parse_timestamp(row["timestamp"]),
+                    float(row["thermostat_temperature"]),
+                    float(row["valve_temperature"]),
+                    float(row["target_temperature"]))
+            except (TypeError, ValueError):
+                # e.g. unavailable or unknown in a recorder export
+                continue
+
+
+def replay(valve_config:dict, rows:Iterable[tuple[datetime, float, float, float]],
+        convergence_band:float = DEFAULT_CONVERGENCE_BAND) -> SimulationResult:
+    controller = None
+    result = None
+    valve_position = 0
+    updated_at = None
+    step = timedelta(seconds=UPDATE_INTERVAL)
+    wall_started_at = time.perf_counter()
+    for now, thermostat_temperature, valve_temperature, target_temperature in rows:
+        if controller is None:
+            controller = new_controller(valve_config, now)
+            result = SimulationResult(controller.name, convergence_band)
+        # ValveCover updates at most once per UPDATE_INTERVAL
+        if updated_at is not None and now < updated_at + step:
+            continue
+        updated_at = now
+
+        controller.observe_position(valve_position, now)
+        controller.set_target_temperature(target_temperature, now)
+        controller.update(now, thermostat_temperature, valve_temperature)
+        _, new_valve_position = controller.adjust(now)
+        if new_valve_position is not None:
+            result.valve_moves += 1
+            valve_position = new_valve_position
+
+        result.add_sample(now, thermostat_temperature, target_temperature)
+    if result is None:
+        raise ValueError("No samples to replay")
+    result.wall_seconds = time.perf_counter() - wall_started_at
+    result.sweet_spot = controller.sweet_spot
+    result.felt_temp_delta = controller.felt_temp_delta
+    return result
+
+
+def parse_config_value(value:str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main(argv:Union[list[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(
+            prog="python -m valves.simulator",
+            description="Simulate the valves control and learning loop offline.")
+    parser.add_argument("--csv", help="replay recorded temperatures instead of the room model")
+    parser.add_argument("--days", type=float, default=14.0,
+            help="simulated days of the room model (default: %(default)s)")
+    parser.add_argument("--schedule", default=DEFAULT_SCHEDULE,
+            help="daily target temperatures (default: %(default)s)")
+    parser.add_argument("--outside", type=float, default=5.0,
+            help="mean outside temperature (default: %(default)s)")
+    parser.add_argument("--supply", type=float, default=55.0,
+            help="supply temperature of the radiator (default: %(default)s)")
+    parser.add_argument("--noise", type=float, default=0.05,
+            help="standard deviation of the sensor noise (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--band", type=float, default=DEFAULT_CONVERGENCE_BAND,
+            help="comfort band for the convergence time (default: %(default)s)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+            help="valve config value, e.g. position_factor=0.05 or thermostat_slope=regression")
+    parser.add_argument("--verbose", action="store_true", help="log the controller decisions")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        LOGGER.setLevel(logging.WARNING)
+
+    valve_config = {}
+    for key_value in args.set:
+        key, value = key_value.split("=", 1)
+        valve_config[key] = parse_config_value(value)
+
+    if args.csv is not None:
+        result = replay(valve_config, read_csv(args.csv), args.band)
+    else:
+        room_model = RoomModel(
+                outside_temperature=args.outside,
+                supply_temperature=args.supply,
+                noise=args.noise,
+                seed=args.seed)
+        result = simulate_room(valve_config, room_model, args.days, args.schedule, args.band)
+    print(json.dumps(result.to_json(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
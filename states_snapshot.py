@@ -0,0 +1,37 @@
+from typing import Iterable, Union
+
+from homeassistant.core import Event, HomeAssistant, State, callback
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import LOGGER
+
+class StatesSnapshot:
+    # Shared view of the states of all entities used by the valves. Only the state
+    # changes of these entities are tracked, other entities are read from hass.states.
+
+    def __init__(self, hass:HomeAssistant, entity_ids:Iterable[str]):
+        self._hass = hass
+        self._states: dict[str, Union[State, None]] = {}
+        for entity_id in entity_ids:
+            self._states[entity_id] = hass.states.get(entity_id)
+        self._unsub_state_changed = async_track_state_change_event(
+                hass, list(self._states.keys()), self.async_state_changed)
+        LOGGER.info("StatesSnapshot: tracking %d entities", len(self._states))
+
+    @callback
+    def async_state_changed(self, event:Event) -> None:
+        self._states[event.data.get("entity_id")] = event.data.get("new_state")
+
+    @callback
+    def async_unsubscribe(self, event:Union[Event, None] = None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (event)
+
+        if self._unsub_state_changed is not None:
+            self._unsub_state_changed()
+            self._unsub_state_changed = None
+
+    def get(self, entity_id:str) -> Union[State, None]:
+        if entity_id in self._states:
+            return self._states[entity_id]
+        return self._hass.states.get(entity_id)
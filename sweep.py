@@ -0,0 +1,533 @@
+import argparse
+import csv
+import itertools
+import math
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .const import (
+    DEFAULT_ERROR_EXP_FACTOR,
+    DEFAULT_ERROR_EXP_RATE,
+    DEFAULT_FELT_RATIO,
+    DEFAULT_FELT_TEMP_DELTA,
+    DEFAULT_LEARN_RATE,
+    DEFAULT_SWEET_SPOT,
+    DELAY_LEARN_AFTER_TEMPERATURE_CHANGE,
+    UPDATE_INTERVAL
+)
+from .simulator import (
+    DEFAULT_SCHEDULE,
+    SIMULATION_START,
+    RoomModel,
+    parse_schedule,
+    read_csv,
+    scheduled_target_temperature
+)
+
+# Batch evaluation of the ValveController control law for many parameter
+# combinations and rooms at once. Every lane of the arrays is one (parameters,
+# room) pair, so a step of all lanes costs a few NumPy operations. Needs NumPy,
+# which is not a requirement of the component itself:
+#
+#   python -m valves.sweep --days 14 --rooms 8 --position-factor 0.03,0.05,0.07,0.1
+#
+# Differences to ValveController: thermostat slope is always the delta estimator,
+# window/boost handling, peers, rooms, temperature_adjust and the eviction of target
+# temperature configs are not simulated.
+
+SWEEP_PARAMETERS = (
+    ("position_factor", 0.07),
+    ("error_exp_factor", DEFAULT_ERROR_EXP_FACTOR),
+    ("error_exp_rate", DEFAULT_ERROR_EXP_RATE),
+    ("felt_ratio", DEFAULT_FELT_RATIO),
+    ("learn_rate", DEFAULT_LEARN_RATE)
+)
+# same as ValveController in the simulator
+CONTROL_INTERVAL = 15 * 60.0
+THERMOSTAT_HISTORY_SECONDS = 3600
+# parameter combinations per process pool job
+DEFAULT_CHUNK_SIZE = 64
+
+
+class VectorizedController:
+    # ValveController for n lanes. Times are seconds since the start of the run.
+
+    def __init__(self, parameters:dict, target_temperatures:list[float],
+            min_position:float = 0, max_position:float = 80):
+        self.position_factor = parameters["position_factor"]
+        self.error_exp_factor = parameters["error_exp_factor"]
+        self.error_exp_rate = parameters["error_exp_rate"]
+        self.felt_ratio = parameters["felt_ratio"]
+        self.learn_rate = parameters["learn_rate"]
+        self.min_position = min_position
+        self.max_position = max_position
+        lanes = len(self.position_factor)
+        self._lanes = np.arange(lanes)
+
+        self.position = np.zeros(lanes)
+        self.raw_position = np.full(lanes, -1.0)
+        self.target_temperature = np.full(lanes, -1.0)
+        self.target_index = np.zeros(lanes, dtype=np.int64)
+        self.target_temperature_changed = np.zeros(lanes, dtype=bool)
+        self.last_valve_adjust_at = np.full(lanes, -CONTROL_INTERVAL / 2)
+        self.last_target_temperature_changed_at = np.full(
+                lanes, -DELAY_LEARN_AFTER_TEMPERATURE_CHANGE.total_seconds())
+        # NaN if not heating
+        self.heating_started_at = np.full(lanes, np.nan)
+        self.heating_until_target_temperature = np.zeros(lanes, dtype=bool)
+        self.valve_moves = np.zeros(lanes, dtype=np.int64)
+
+        # one column of learned values per target temperature
+        self.config_temperatures = np.array(sorted(target_temperatures))
+        self.felt_temp_deltas = np.full((lanes, len(target_temperatures)), DEFAULT_FELT_TEMP_DELTA)
+        self.sweet_spots = np.full((lanes, len(target_temperatures)), DEFAULT_SWEET_SPOT)
+        self.configured = np.zeros((lanes, len(target_temperatures)), dtype=bool)
+
+        # ring buffer of the last hour of thermostat temperatures
+        self._history_size = int(THERMOSTAT_HISTORY_SECONDS / UPDATE_INTERVAL) + 1
+        self._history = np.zeros((lanes, self._history_size))
+        self._history_count = 0
+
+        self.felt_temp = np.zeros(lanes)
+        self.real_error = np.zeros(lanes)
+        self.error = np.zeros(lanes)
+        self.error_exp = np.zeros(lanes)
+        self.thermostat_slope = np.zeros(lanes)
+
+    def lookup(self) -> tuple:
+        # nearest configured target temperature like TargetTemperatureConfigs.find_best
+        distances = np.where(
+                self.configured,
+                np.abs(self.config_temperatures[None, :]
+                        - self.config_temperatures[self.target_index][:, None]),
+                np.inf)
+        best = np.argmin(distances, axis=1)
+        found = np.isfinite(distances[self._lanes, best])
+        return (
+            np.where(found, self.felt_temp_deltas[self._lanes, best], DEFAULT_FELT_TEMP_DELTA),
+            np.where(found, self.sweet_spots[self._lanes, best], DEFAULT_SWEET_SPOT))
+
+    def store(self, mask, felt_temp_delta, sweet_spot) -> None:
+        # find_or_initialize and set for the current target temperature of the lanes in mask
+        lanes = self._lanes[mask]
+        index = self.target_index[mask]
+        self.felt_temp_deltas[lanes, index] = felt_temp_delta[mask]
+        self.sweet_spots[lanes, index] = sweet_spot[mask]
+        self.configured[lanes, index] = True
+
+    def set_target_temperature(self, target_temperature, now:float) -> None:
+        changed = ((self.target_temperature >= 0)
+                & (np.abs(self.target_temperature - target_temperature) >= 0.5))
+        self.last_valve_adjust_at = np.where(
+                changed, now - CONTROL_INTERVAL, self.last_valve_adjust_at)
+        self.last_target_temperature_changed_at = np.where(
+                changed, now, self.last_target_temperature_changed_at)
+        self.target_temperature_changed |= changed
+        different = self.target_temperature != target_temperature
+        self.heating_started_at = np.where(different, np.nan, self.heating_started_at)
+        self.target_temperature = np.array(target_temperature, dtype=float)
+        self.target_index = np.searchsorted(self.config_temperatures, self.target_temperature)
+
+    def update(self, thermostat_temperature, valve_temperature) -> None:
+        # delta slope estimator: newest minus oldest sample of the last hour
+        self._history[:, self._history_count % self._history_size] = thermostat_temperature
+        self._history_count += 1
+        if self._history_count < self._history_size:
+            oldest = self._history[:, 0]
+        else:
+            oldest = self._history[:, self._history_count % self._history_size]
+        self.thermostat_slope = (
+                (thermostat_temperature - oldest) * 3600.0 / THERMOSTAT_HISTORY_SECONDS)
+
+        self.felt_temp = (
+            thermostat_temperature * self.felt_ratio
+            + valve_temperature * (1.0 - self.felt_ratio))
+        felt_temp_delta, _ = self.lookup()
+        self.real_error = np.round(thermostat_temperature - self.target_temperature, 3)
+        adjusted_felt_temp = (
+            self.felt_temp
+            + np.clip(self.thermostat_slope * 0.5, -0.5, 0.5)
+            - felt_temp_delta)
+        self.error = adjusted_felt_temp - self.target_temperature
+        self.error_exp = (
+            self.error_exp_factor * self.error * np.exp(self.error_exp_rate * np.abs(self.error)))
+
+    def adjust(self, thermostat_temperature, valve_position, now:float):
+        # returns the new valve positions, unchanged where no write is due
+        self.raw_position = np.array(valve_position, dtype=float)
+        due = now >= self.last_valve_adjust_at + CONTROL_INTERVAL
+        if not due.any():
+            return valve_position
+        self.last_valve_adjust_at = np.where(due, now, self.last_valve_adjust_at)
+        felt_temp_delta, sweet_spot = self.lookup()
+
+        learn = due & (self.raw_position > 0)
+        observed_felt_temp_delta = self.felt_temp - thermostat_temperature
+        felt_temp_delta_delta = observed_felt_temp_delta - felt_temp_delta
+        felt_temp_sigmoid = 1.0 / (1.0 + np.exp(-felt_temp_delta_delta * 3.0))
+        felt_temp_learn_weight = self.learn_rate * CONTROL_INTERVAL * (1.0 + felt_temp_sigmoid)
+        felt_temp_delta = np.where(
+                learn,
+                felt_temp_delta * (1.0 - felt_temp_learn_weight)
+                    + observed_felt_temp_delta * felt_temp_learn_weight,
+                felt_temp_delta)
+        learn_sweet_spot = learn & (
+                ~self.heating_until_target_temperature
+                | (now >= self.last_target_temperature_changed_at
+                        + DELAY_LEARN_AFTER_TEMPERATURE_CHANGE.total_seconds()))
+        combined_fitness = np.maximum(
+                0.5, 1.0 - np.abs(self.thermostat_slope) - np.abs(self.real_error))
+        learn_weight = self.learn_rate * CONTROL_INTERVAL * combined_fitness
+        sweet_spot = np.where(
+                learn_sweet_spot,
+                np.maximum(1.0, np.minimum(
+                        self.max_position / 2.0,
+                        sweet_spot * (1.0 - learn_weight) + self.raw_position * learn_weight)),
+                sweet_spot)
+        self.store(learn, felt_temp_delta, sweet_spot)
+
+        valve_pos = self.position
+        new_valve_pos = np.where(
+                self.target_temperature_changed,
+                valve_pos - 2.0 * self.error * sweet_spot,
+                -1.0)
+        start_heating = (
+                (thermostat_temperature < self.target_temperature - 0.5)
+                & ~self.heating_until_target_temperature)
+        stop_heating = (
+                ~start_heating
+                & (thermostat_temperature >= self.target_temperature)
+                & self.heating_until_target_temperature)
+        self.heating_until_target_temperature = np.where(
+                due,
+                (self.heating_until_target_temperature | start_heating) & ~stop_heating,
+                self.heating_until_target_temperature)
+        new_valve_pos = np.where(
+                stop_heating & (self.raw_position > sweet_spot), sweet_spot, new_valve_pos)
+
+        valve_delta = -self.error_exp * self.position_factor * sweet_spot
+        valve_delta = np.where(
+                valve_delta >= 0, np.maximum(0.333, valve_delta), np.minimum(-0.333, valve_delta))
+        new_valve_pos = np.where(new_valve_pos < 0.0, valve_pos + valve_delta, new_valve_pos)
+
+        adaptive_max_position = np.maximum(
+                5.0, np.minimum(self.max_position, sweet_spot * 2.0))
+        new_valve_pos = np.minimum(
+                adaptive_max_position, np.maximum(self.min_position, new_valve_pos))
+        turn_on = ~self.target_temperature_changed & (valve_pos == 0) & (new_valve_pos > 0)
+        new_valve_pos = np.where(turn_on, sweet_spot, new_valve_pos)
+        self.heating_started_at = np.where(due & turn_on, now, self.heating_started_at)
+
+        new_raw_position = np.ceil(new_valve_pos)
+        changes = due & (new_raw_position != self.raw_position)
+        self.target_temperature_changed &= ~due
+        self.position = np.where(due, new_valve_pos, self.position)
+
+        turn_off = changes & (new_valve_pos == 0) & ~np.isnan(self.heating_started_at)
+        # if we heated less than 3 hours sweet spot is probably too high
+        too_short = turn_off & (now - self.heating_started_at < 3 * 3600.0)
+        self.store(too_short, felt_temp_delta, np.maximum(1.0, sweet_spot * 0.67))
+        self.heating_started_at = np.where(turn_off, np.nan, self.heating_started_at)
+
+        self.valve_moves += changes
+        return np.where(changes, new_raw_position, valve_position)
+
+
+class VectorizedRoomModel:
+    # RoomModel for each of the rooms repeated for every parameter combination, see
+    # simulator.py. All repetitions of a room see the same sensor noise.
+
+    def __init__(self, rooms:list[RoomModel], repeat:int, seed:Union[int, None] = None):
+        def parameter(name):
+            return np.tile(np.array([getattr(room, name) for room in rooms], dtype=float), repeat)
+        self._rooms = len(rooms)
+        self._repeat = repeat
+        self.room_temperature = parameter("_room_temperature")
+        self.radiator_temperature = parameter("_radiator_temperature")
+        self.outside_temperature_mean = parameter("_outside_temperature")
+        self.outside_amplitude = parameter("_outside_amplitude")
+        self.supply_temperature = parameter("_supply_temperature")
+        self.radiator_gain = parameter("_radiator_gain")
+        self.radiator_emission = parameter("_radiator_emission")
+        self.room_gain = parameter("_room_gain")
+        self.room_loss = parameter("_room_loss")
+        self.valve_sensor_coupling = parameter("_valve_sensor_coupling")
+        self.noise = parameter("_noise")
+        self._random = np.random.default_rng(seed)
+
+    def outside_temperature(self, hours:float):
+        return (self.outside_temperature_mean
+                - self.outside_amplitude * math.cos((hours - 4.0) * math.pi / 12.0))
+
+    def step(self, valve_position, hours_of_day:float, seconds:float) -> None:
+        hours = seconds / 3600.0
+        flow = np.clip(valve_position, 0.0, 100.0) / 100.0
+        radiator_delta = (
+            self.radiator_gain * flow * (self.supply_temperature - self.radiator_temperature)
+            - self.radiator_emission * (self.radiator_temperature - self.room_temperature))
+        room_delta = (
+            self.room_gain * (self.radiator_temperature - self.room_temperature)
+            - self.room_loss * (self.room_temperature - self.outside_temperature(hours_of_day)))
+        self.radiator_temperature = self.radiator_temperature + radiator_delta * hours
+        self.room_temperature = self.room_temperature + room_delta * hours
+
+    def measure(self, temperature):
+        noise = np.tile(self._random.normal(0.0, 1.0, self._rooms), self._repeat) * self.noise
+        return np.round(temperature + noise, 1)
+
+    @property
+    def thermostat_temperature(self):
+        return self.measure(self.room_temperature)
+
+    @property
+    def valve_temperature(self):
+        return self.measure(self.room_temperature + self.valve_sensor_coupling * (
+                self.radiator_temperature - self.room_temperature))
+
+
+def parameter_grid(values:dict[str, list[float]]) -> list[dict[str, float]]:
+    names = [name for name, _ in SWEEP_PARAMETERS]
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*(values[name] for name in names))]
+
+
+def lane_parameters(combinations:list[dict[str, float]], rooms:int) -> dict:
+    # lane = combination * rooms + room
+    return {
+        name: np.repeat(np.array([combination[name] for combination in combinations]), rooms)
+        for name, _ in SWEEP_PARAMETERS
+    }
+
+
+def evaluate_rooms(combinations:list[dict[str, float]], rooms:list[RoomModel], days:float,
+        schedule:str, seed:Union[int, None] = None) -> tuple:
+    # closed loop: mean absolute room temperature error and valve moves per combination
+    target_schedule = parse_schedule(schedule)
+    room_model = VectorizedRoomModel(rooms, len(combinations), seed)
+    controller = VectorizedController(
+            lane_parameters(combinations, len(rooms)),
+            sorted(set(target_temperature for _, target_temperature in target_schedule)))
+    lanes = len(combinations) * len(rooms)
+    valve_position = np.zeros(lanes)
+    absolute_error_sum = np.zeros(lanes)
+    steps = int(days * 24 * 3600 / UPDATE_INTERVAL)
+    step = timedelta(seconds=UPDATE_INTERVAL)
+    now = SIMULATION_START
+    for index in range(steps):
+        seconds = index * UPDATE_INTERVAL
+        room_model.step(valve_position, now.hour + now.minute / 60.0, UPDATE_INTERVAL)
+        target_temperature = np.full(
+                lanes, scheduled_target_temperature(target_schedule, now))
+        thermostat_temperature = room_model.thermostat_temperature
+        controller.set_target_temperature(target_temperature, seconds)
+        controller.update(thermostat_temperature, room_model.valve_temperature)
+        valve_position = controller.adjust(thermostat_temperature, valve_position, seconds)
+        absolute_error_sum += np.abs(room_model.room_temperature - target_temperature)
+        now += step
+    return (
+        (absolute_error_sum / max(1, steps)).reshape(len(combinations), len(rooms)).mean(axis=1),
+        controller.valve_moves.reshape(len(combinations), len(rooms)).mean(axis=1) / days)
+
+
+def load_recordings(paths:list[str]) -> tuple:
+    # Resample every recording to UPDATE_INTERVAL steps relative to its start and
+    # cut all of them to the shortest one.
+    recordings = []
+    for path in paths:
+        samples = []
+        started_at = None
+        next_at = None
+        for row in read_csv(path):
+            if started_at is None:
+                started_at = row[0]
+                next_at = started_at
+            while row[0] >= next_at:
+                samples.append(row[1:])
+                next_at += timedelta(seconds=UPDATE_INTERVAL)
+        if len(samples) == 0:
+            raise ValueError(f"No samples in {path}")
+        recordings.append(np.array(samples))
+    steps = min(len(recording) for recording in recordings)
+    # shape (steps, recordings, 3) of thermostat, valve and target temperature
+    return np.stack([recording[:steps] for recording in recordings], axis=1)
+
+
+def evaluate_recordings(combinations:list[dict[str, float]], recordings) -> tuple:
+    # Open loop: the recorded temperatures don't react to the valve, so the error is
+    # the control error of the controller instead of the room temperature error.
+    steps = recordings.shape[0]
+    rooms = recordings.shape[1]
+    lanes = len(combinations) * rooms
+    controller = VectorizedController(
+            lane_parameters(combinations, rooms),
+            sorted(set(np.unique(recordings[:, :, 2]).tolist())))
+    valve_position = np.zeros(lanes)
+    absolute_error_sum = np.zeros(lanes)
+    for index in range(steps):
+        seconds = index * UPDATE_INTERVAL
+        thermostat_temperature = np.tile(recordings[index, :, 0], len(combinations))
+        controller.set_target_temperature(
+                np.tile(recordings[index, :, 2], len(combinations)), seconds)
+        controller.update(
+                thermostat_temperature, np.tile(recordings[index, :, 1], len(combinations)))
+        valve_position = controller.adjust(thermostat_temperature, valve_position, seconds)
+        absolute_error_sum += np.abs(controller.error)
+    days = max(1, steps) * UPDATE_INTERVAL / 86400.0
+    return (
+        (absolute_error_sum / max(1, steps)).reshape(len(combinations), rooms).mean(axis=1),
+        controller.valve_moves.reshape(len(combinations), rooms).mean(axis=1) / days)
+
+
+def evaluate_chunk(job:tuple) -> tuple:
+    # process pool entry point
+    kind, combinations, arguments = job
+    if kind == "rooms":
+        return evaluate_rooms(combinations, *arguments)
+    return evaluate_recordings(combinations, *arguments)
+
+
+def pareto_ranks(errors, moves):
+    # 1 for combinations which no other beats in both error and valve moves, 2 for
+    # those only beaten by rank 1 and so on
+    ranks = np.zeros(len(errors), dtype=np.int64)
+    rank = 0
+    while (ranks == 0).any():
+        rank += 1
+        open_indexes = np.nonzero(ranks == 0)[0]
+        for index in open_indexes:
+            dominated = (
+                (errors[open_indexes] <= errors[index]) & (moves[open_indexes] <= moves[index])
+                & ((errors[open_indexes] < errors[index]) | (moves[open_indexes] < moves[index])))
+            if not dominated.any():
+                ranks[index] = rank
+    return ranks
+
+
+def sweep(combinations:list[dict[str, float]], kind:str, arguments:tuple, workers:int = 1,
+        chunk_size:int = DEFAULT_CHUNK_SIZE) -> list[dict]:
+    chunks = [combinations[index:index + chunk_size]
+            for index in range(0, len(combinations), chunk_size)]
+    jobs = [(kind, chunk, arguments) for chunk in chunks]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(evaluate_chunk, jobs))
+    else:
+        results = [evaluate_chunk(job) for job in jobs]
+    errors = np.concatenate([result[0] for result in results])
+    moves = np.concatenate([result[1] for result in results])
+    ranks = pareto_ranks(errors, moves)
+    rows = []
+    for index, combination in enumerate(combinations):
+        row = dict(combination)
+        row["pareto_rank"] = int(ranks[index])
+        row["error"] = float(errors[index])
+        row["moves_per_day"] = float(moves[index])
+        rows.append(row)
+    rows.sort(key=lambda row: (row["pareto_rank"], row["error"], row["moves_per_day"]))
+    return rows
+
+
+def parse_values(values:str) -> list[float]:
+    return [float(value) for value in values.split(",")]
+
+
+def room_variants(count:int, base:dict, seed:Union[int, None]) -> list[RoomModel]:
+    # the first room is the base room, the others vary insulation, radiator size and climate
+    random_generator = np.random.default_rng(seed)
+    rooms = [RoomModel(**base)]
+    for _ in range(count - 1):
+        rooms.append(RoomModel(
+                room_temperature=base["room_temperature"],
+                outside_temperature=base["outside_temperature"]
+                        + random_generator.uniform(-3.0, 3.0),
+                supply_temperature=base["supply_temperature"],
+                radiator_gain=3.0 * random_generator.uniform(0.7, 1.3),
+                room_loss=0.05 * random_generator.uniform(0.7, 1.3),
+                noise=base["noise"]))
+    return rooms
+
+
+def print_table(rows:list[dict], top:int) -> None:
+    columns = [name for name, _ in SWEEP_PARAMETERS] + ["pareto_rank", "error", "moves_per_day"]
+    lines = [columns]
+    for row in rows[:top]:
+        lines.append([
+            f"{row[column]:.6g}" if isinstance(row[column], float) else str(row[column])
+            for column in columns])
+    widths = [max(len(line[index]) for line in lines) for index in range(len(columns))]
+    for line in lines:
+        print("  ".join(value.rjust(width) for value, width in zip(line, widths)))
+
+
+def main(argv:Union[list[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(
+            prog="python -m valves.sweep",
+            description="Rank controller parameters by temperature error and valve moves.")
+    for name, default in SWEEP_PARAMETERS:
+        parser.add_argument("--" + name.replace("_", "-"), default=str(default),
+                help=f"comma separated values (default: {default})")
+    parser.add_argument("--csv", action="append", default=[],
+            help="recorded room, see simulator.py - may be given several times")
+    parser.add_argument("--rooms", type=int, default=4,
+            help="number of simulated rooms without --csv (default: %(default)s)")
+    parser.add_argument("--days", type=float, default=14.0,
+            help="simulated days without --csv (default: %(default)s)")
+    parser.add_argument("--schedule", default=DEFAULT_SCHEDULE,
+            help="daily target temperatures (default: %(default)s)")
+    parser.add_argument("--outside", type=float, default=5.0)
+    parser.add_argument("--supply", type=float, default=55.0)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1,
+            help="processes for large grids (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+            help="parameter combinations per process job (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=20, help="rows to print")
+    parser.add_argument("--output", help="write all rows to this CSV file")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("valves.sweep needs NumPy: pip install numpy", file=sys.stderr)
+        return 1
+
+    combinations = parameter_grid({
+        name: parse_values(getattr(args, name)) for name, _ in SWEEP_PARAMETERS
+    })
+    if len(args.csv) > 0:
+        kind = "recordings"
+        arguments = (load_recordings(args.csv),)
+    else:
+        kind = "rooms"
+        base = {
+            "room_temperature": 18.0,
+            "outside_temperature": args.outside,
+            "supply_temperature": args.supply,
+            "noise": args.noise
+        }
+        arguments = (room_variants(args.rooms, base, args.seed), args.days, args.schedule,
+                args.seed)
+
+    started_at = time.perf_counter()
+    rows = sweep(combinations, kind, arguments, args.workers, max(1, args.chunk_size))
+    print(f"{len(combinations)} combinations in {time.perf_counter() - started_at:.1f}s")
+    print_table(rows, args.top)
+
+    if args.output is not None:
+        with open(args.output, "w", newline="", encoding="utf-8") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import json
+
+from bisect import bisect_left, insort
+from typing import Any, Union
+
+from .const import (
+    DEFAULT_FELT_TEMP_DELTA,
+    DEFAULT_MAX_TARGET_TEMPERATURE_CONFIGS,
+    DEFAULT_SWEET_SPOT,
+    LOGGER,
+    TARGET_TEMPERATURE_LOOKUP_CACHE_SIZE
+)
+from .target_temperature_config import TargetTemperaturConfig
+
+class TargetTemperatureConfigs:
+    def __init__(self, max_size:int = DEFAULT_MAX_TARGET_TEMPERATURE_CONFIGS,
+            interpolate:bool = False):
+        self._max_size = max(1, int(max_size))
+        self._interpolate = interpolate
+        self._configs: dict[float, TargetTemperaturConfig] = {}
+        self._target_temperatures: list[float] = []
+        self._version = 0
+        # (felt_temp_delta, sweet_spot) per target temperature for the current version
+        self._lookup_cache: dict[float, tuple[float, float]] = {}
+        self._lookup_cache_version = 0
+        self._json_str = "{}"
+        self._json_str_version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def changed(self) -> None:
+        self._version += 1
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def items(self):
+        return self._configs.items()
+
+    def get(self, target_temperature:float) -> Union[TargetTemperaturConfig, None]:
+        return self._configs.get(target_temperature)
+
+    def put(self, target_temperature:float, target_temperature_config:TargetTemperaturConfig):
+        if target_temperature not in self._configs:
+            insort(self._target_temperatures, target_temperature)
+        self._configs[target_temperature] = target_temperature_config
+        self.changed()
+
+    def neighbours(self, target_temperature:float) -> tuple[Union[float, None], Union[float, None]]:
+        index = bisect_left(self._target_temperatures, target_temperature)
+        lower = self._target_temperatures[index - 1] if index > 0 else None
+        upper = (self._target_temperatures[index]
+                if index < len(self._target_temperatures) else None)
+        return lower, upper
+
+    def find_best(self, target_temperature:float) -> Union[TargetTemperaturConfig, None]:
+        lower, upper = self.neighbours(target_temperature)
+        if lower is None and upper is None:
+            return None
+        if upper is None or (lower is not None
+                and target_temperature - lower <= upper - target_temperature):
+            return self._configs[lower]
+        return self._configs[upper]
+
+    def lookup(self, target_temperature:float) -> tuple[float, float]:
+        # adjusted target temperatures are floats, so bound the cache as well
+        if (self._lookup_cache_version != self._version
+                or len(self._lookup_cache) >= TARGET_TEMPERATURE_LOOKUP_CACHE_SIZE):
+            self._lookup_cache.clear()
+            self._lookup_cache_version = self._version
+        values = self._lookup_cache.get(target_temperature)
+        if values is None:
+            values = self._lookup(target_temperature)
+            self._lookup_cache[target_temperature] = values
+        return values
+
+    def _lookup(self, target_temperature:float) -> tuple[float, float]:
+        lower, upper = self.neighbours(target_temperature)
+        if (self._interpolate and lower is not None and upper is not None
+                and upper != target_temperature):
+            lower_config = self._configs[lower]
+            upper_config = self._configs[upper]
+            ratio = (target_temperature - lower) / (upper - lower)
+            return (
+                lower_config.felt_temp_delta
+                    + ratio * (upper_config.felt_temp_delta - lower_config.felt_temp_delta),
+                lower_config.sweet_spot
+                    + ratio * (upper_config.sweet_spot - lower_config.sweet_spot))
+        best_target_temperature_config = self.find_best(target_temperature)
+        if best_target_temperature_config is None:
+            return DEFAULT_FELT_TEMP_DELTA, DEFAULT_SWEET_SPOT
+        return (best_target_temperature_config.felt_temp_delta,
+                best_target_temperature_config.sweet_spot)
+
+    def find_or_initialize(self, target_temperature:float) -> TargetTemperaturConfig:
+        target_temperature_config = self._configs.get(target_temperature)
+        if target_temperature_config is None:
+            target_temperature_config = TargetTemperaturConfig()
+            if len(self._configs) > 0:
+                felt_temp_delta, sweet_spot = self.lookup(target_temperature)
+                target_temperature_config.felt_temp_delta = felt_temp_delta
+                target_temperature_config.sweet_spot = sweet_spot
+            self.put(target_temperature, target_temperature_config)
+            self.evict(target_temperature)
+        return target_temperature_config
+
+    def evict(self, keep_target_temperature:Union[float, None]) -> None:
+        # Merge the two closest neighbours until the maximum size is reached. The
+        # just created config is never merged away.
+        while len(self._configs) > self._max_size:
+            best_index = None
+            best_gap = None
+            for index in range(len(self._target_temperatures) - 1):
+                lower = self._target_temperatures[index]
+                upper = self._target_temperatures[index + 1]
+                if keep_target_temperature in (lower, upper):
+                    continue
+                if best_gap is None or upper - lower < best_gap:
+                    best_gap = upper - lower
+                    best_index = index
+            if best_index is None:
+                # every pair contains the just created config, which was initialized from
+                # its nearest neighbour, so the farthest one is dropped
+                farthest = max(
+                        (target_temperature
+                            for target_temperature in self._target_temperatures
+                            if target_temperature != keep_target_temperature),
+                        key=lambda target_temperature: abs(
+                            target_temperature - keep_target_temperature))
+                self._target_temperatures.remove(farthest)
+                del self._configs[farthest]
+                LOGGER.info("Dropped target temperature config %.2f", farthest)
+                self.changed()
+                continue
+            lower = self._target_temperatures[best_index]
+            upper = self._target_temperatures.pop(best_index + 1)
+            lower_config = self._configs[lower]
+            upper_config = self._configs.pop(upper)
+            lower_config.felt_temp_delta = 0.5 * (
+                    lower_config.felt_temp_delta + upper_config.felt_temp_delta)
+            lower_config.sweet_spot = 0.5 * (lower_config.sweet_spot + upper_config.sweet_spot)
+            LOGGER.info("Merged target temperature config %.2f into %.2f", upper, lower)
+            self.changed()
+
+    def from_json(self, json_dict:dict[str, Any]) -> None:
+        for target_temperature, target_temperature_config_json in json_dict.items():
+            target_temperature_config = TargetTemperaturConfig()
+            target_temperature_config.from_json(target_temperature_config_json)
+            self.put(float(target_temperature), target_temperature_config)
+        # e.g. saved with a larger maximum size
+        self.evict(None)
+
+    def to_json_str(self) -> str:
+        if self._json_str_version != self._version:
+            target_temperature_configs_json :dict[str, dict] = {}
+            for target_temperature, target_temperature_config in self._configs.items():
+                target_temperature_configs_json[str(target_temperature)] = \
+                        target_temperature_config.to_json()
+            # compact because it's written to the recorder with every state change
+            self._json_str = json.dumps(
+                    target_temperature_configs_json, separators=(",", ":"), sort_keys=True)
+            self._json_str_version = self._version
+        return self._json_str
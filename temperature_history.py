@@ -1,69 +1,210 @@
-from collections import deque
+import time
+
+from array import array
 from datetime import timedelta
+from typing import Union
 
-from homeassistant.util import utcnow
+from .const import (
+    SLOPE_ESTIMATOR_DELTA,
+    SLOPE_ESTIMATOR_REGRESSION,
+    UPDATE_INTERVAL
+)
 
 class TemperatureHistory:
-    class Item:
-        value = 0.0
-        timestamp = None
+    __slots__ = (
+        "_history_timedelta",
+        "_history_seconds",
+        "_capacity",
+        "_max_capacity",
+        "_values",
+        "_timestamps",
+        "_start",
+        "_size",
+        "_sum",
+        "_slope_estimator",
+        "_time_base",
+        "_sum_t",
+        "_sum_tv",
+        "_sum_tt",
+        "_value",
+        "_updated_at",
+        "_last_value",
+        "_last_updated_at",
+        "_average_value"
+    )
 
-    def __init__(self, history_timedelta:timedelta):
+    def __init__(self, history_timedelta:timedelta, capacity:Union[int, None] = None,
+            slope_estimator:str = SLOPE_ESTIMATOR_DELTA):
+        if slope_estimator not in (SLOPE_ESTIMATOR_DELTA, SLOPE_ESTIMATOR_REGRESSION):
+            raise ValueError(f"Unknown slope estimator {slope_estimator}")
+        self._slope_estimator = slope_estimator
         self._history_timedelta = history_timedelta
-        self._history = deque()
+        self._history_seconds = history_timedelta.total_seconds()
+        if capacity is None:
+            # one sample per update interval plus some headroom
+            capacity = int(self._history_seconds / UPDATE_INTERVAL) + 2
+        self._capacity = max(1, int(capacity))
+        # at most one sample per second is kept
+        self._max_capacity = max(self._capacity, int(self._history_seconds) + 2)
+        # Preallocated ring buffer of parallel arrays. If more samples arrive within the
+        # history window than fit into the buffer, it grows up to _max_capacity, beyond
+        # that the oldest ones are overwritten.
+        self._values = array('d', [0.0]) * self._capacity
+        self._timestamps = array('d', [0.0]) * self._capacity
+        self._start = 0
+        self._size = 0
+        self._sum = 0.0
+        # Running sums for the least squares slope. Timestamps are relative to
+        # _time_base to keep the sums numerically small.
+        self._time_base = 0.0
+        self._sum_t = 0.0
+        self._sum_tv = 0.0
+        self._sum_tt = 0.0
 
-        now = utcnow()
+        now = time.time()
         self._value = 0.0
         self._updated_at = now
         self._last_value = 0.0
         self._last_updated_at = now
         self._average_value = 0.0
 
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def size(self) -> int:
+        return self._size
+
     @property
     def average_value(self):
         return self._average_value
 
+    @property
+    def slope_estimator(self) -> str:
+        return self._slope_estimator
+
+    def _clear(self) -> None:
+        self._start = 0
+        self._size = 0
+        self._sum = 0.0
+        self._sum_t = 0.0
+        self._sum_tv = 0.0
+        self._sum_tt = 0.0
 
-    def add_value(self, value):
-        now = utcnow()
-        expire_at = now - self._history_timedelta
-        while len(self._history) > 0 and self._history[0].timestamp < expire_at:
-            #LOGGER.info("delete with ts=%s because of e=%s", self._history[0].timestamp, expire_at)
-            self._history.popleft()
+    def _pop_oldest(self) -> None:
+        value = self._values[self._start]
+        t = self._timestamps[self._start] - self._time_base
+        self._sum -= value
+        self._sum_t -= t
+        self._sum_tv -= t * value
+        self._sum_tt -= t * t
+        self._start = (self._start + 1) % self._capacity
+        self._size -= 1
+        if self._size == 0:
+            # avoid accumulating rounding errors of the running sums
+            self._clear()
 
+    def _grow(self) -> None:
+        # Overwriting samples would shorten the window, but the delta slope divides by
+        # the full window. Runs only a few times until the buffer fits the sample rate.
+        capacity = min(self._max_capacity, 2 * self._capacity)
+        values = array('d', [0.0]) * capacity
+        timestamps = array('d', [0.0]) * capacity
+        for offset in range(self._size):
+            index = (self._start + offset) % self._capacity
+            values[offset] = self._values[index]
+            timestamps[offset] = self._timestamps[index]
+        self._values = values
+        self._timestamps = timestamps
+        self._start = 0
+        self._capacity = capacity
+
+    def _rebase(self, time_base:float) -> None:
+        # Recompute the running sums relative to a new time base. This happens only
+        # once every few history windows, so it's O(1) amortized per sample.
+        self._time_base = time_base
+        self._sum = 0.0
+        self._sum_t = 0.0
+        self._sum_tv = 0.0
+        self._sum_tt = 0.0
+        for offset in range(self._size):
+            index = (self._start + offset) % self._capacity
+            value = self._values[index]
+            t = self._timestamps[index] - time_base
+            self._sum += value
+            self._sum_t += t
+            self._sum_tv += t * value
+            self._sum_tt += t * t
+
+    def add_value(self, value, now:Union[float, None] = None):
+        # now is a POSIX timestamp, which allows replaying recorded values
+        if now is None:
+            now = time.time()
+        expire_at = now - self._history_seconds
+        while self._size > 0 and self._timestamps[self._start] < expire_at:
+            #LOGGER.info("delete with ts=%s because of e=%s", self._timestamps[self._start], expire_at)
+            self._pop_oldest()
+        if self._size == self._capacity:
+            if self._capacity < self._max_capacity:
+                self._grow()
+            else:
+                self._pop_oldest()
+        if self._size == 0:
+            self._time_base = now
+        elif now - self._time_base > 8 * self._history_seconds:
+            self._rebase(self._timestamps[self._start])
+
+        value = float(value)
         self._value = value
         self._updated_at = now
 
-        item = TemperatureHistory.Item()
-        item.value = value
-        item.timestamp = now
-        self._history.append(item)
+        index = (self._start + self._size) % self._capacity
+        self._values[index] = value
+        self._timestamps[index] = now
+        self._size += 1
+        t = now - self._time_base
+        self._sum += value
+        self._sum_t += t
+        self._sum_tv += t * value
+        self._sum_tt += t * t
 
-        if len(self._history) == 1:
+        if self._size == 1:
             self._last_value = value
-            self._last_updated_at = now - self._history_timedelta
+            self._last_updated_at = now - self._history_seconds
             self._average_value = value
         else:
-            total = 0.0
-            for item in self._history:
-                total = total + item.value
-            self._average_value = total / len(self._history)
-
-            last_item = self._history[0]
-            self._last_value = last_item.value
-            self._last_updated_at = last_item.timestamp
+            self._average_value = self._sum / self._size
+            self._last_value = self._values[self._start]
+            self._last_updated_at = self._timestamps[self._start]
 
-        #LOGGER.info("history size %d for delta %s", len(self._history), self._history_timedelta)
+        #LOGGER.info("history size %d for delta %s", self._size, self._history_timedelta)
 
     @property
     def slope(self) -> float:
-        last_update_age_in_seconds = (utcnow() - self._last_updated_at).total_seconds()
+        return self.slope_at(time.time())
+
+    def slope_at(self, now:float) -> float:
+        last_update_age_in_seconds = now - self._last_updated_at
         # If there was no update for one hour, set slope to 0
         if last_update_age_in_seconds > 3600:
             return 0
+        elif self._slope_estimator == SLOPE_ESTIMATOR_REGRESSION:
+            return self.regression_slope
         else:
-            return (self._value - self._last_value) * 3600.0 / self._history_timedelta.total_seconds()
+            return (self._value - self._last_value) * 3600.0 / self._history_seconds
+
+    @property
+    def regression_slope(self) -> float:
+        # least squares fit of value over time in degrees per hour
+        if self._size < 2:
+            return 0.0
+        variance_t = self._sum_tt - self._sum_t * self._sum_t / self._size
+        if variance_t <= 1e-9:
+            return 0.0
+        covariance_tv = self._sum_tv - self._sum_t * self._sum / self._size
+        return covariance_tv / variance_t * 3600.0
 
-    def reset(self) -> None:
-        self._history.clear()
-        self.add_value(self._value)
+    def reset(self, now:Union[float, None] = None) -> None:
+        self._clear()
+        self.add_value(self._value, now)
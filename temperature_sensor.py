@@ -1,33 +1,38 @@
 
 from typing import Union
 
+from homeassistant.core import HomeAssistant, callback
+
 from .cached_entity_wrapper import CachedEntityWrapper
 from .const import LOGGER
+from .valve_actuator_types import detect_valve_actuator_type
 
 class TemperatureSensor(CachedEntityWrapper):
+    # homematic, aqara
+    VALUE_ATTRIBUTES = ("current_temperature", "temperature")
+
+    def __init__(self, home_assistant:HomeAssistant, entity_name:str, states=None,
+            push:bool = False, valves_queue=None):
+        self._backend = None
+        super().__init__(home_assistant, entity_name, states, push, valves_queue)
 
     @property
-    def value(self) -> Union[float, None]:
-        # homematic
-        value = self.entity_attribute("current_temperature")
-        if value is None:
-            # aqara
-            value = self.entity_attribute("temperature")
-        if value is None:
-            return None
-        else:
-            float_value = float(value)
-            return float_value
+    def backend(self) -> Union[str, None]:
+        # e.g. Homematic thermostats share the radio and duty cycle with the TRVs. Detected
+        # once the entity is loaded.
+        if self._backend is None:
+            self._backend = detect_valve_actuator_type(self.entity)
+        return self._backend
 
-    def normalize_thermostat_state(self, mode_from="auto", mode_to="heat") -> bool:
+    @callback
+    def async_normalize_thermostat_state(self, mode_from="auto", mode_to="heat") -> bool:
         if not self.available:
             return False
-        if self.entity.state == mode_from:
-            self._home_assistant.services.call('climate', 'set_hvac_mode', {
-                'entity_id' : self.entity_name,
-                'hvac_mode': mode_to
-            })
-            LOGGER.info("%s: Normalized hvac_mode state to %s", self._entity_name, mode_to)
+        if self.async_normalize('hvac_mode', 'climate', 'set_hvac_mode', {
+                    'entity_id' : self.entity_name,
+                    'hvac_mode': mode_to
+                }, self.entity.state == mode_from):
+            LOGGER.info("%s: Normalizing hvac_mode state to %s", self._entity_name, mode_to)
             return True
         else:
             return False
@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+# The repository is the valves package itself, so it is registered under its name
+# to make the relative imports of the modules work.
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "valves" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+            "valves",
+            os.path.join(REPOSITORY_DIR, "__init__.py"),
+            submodule_search_locations=[REPOSITORY_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["valves"] = package
+    spec.loader.exec_module(package)
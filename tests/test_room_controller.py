@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valves.const import ROOM_WEIGHT_MAX, ROOM_WEIGHT_MIN, UPDATE_INTERVAL
+from valves.room_controller import RoomController
+
+START = datetime(2024, 1, 15, 6, 0, tzinfo=timezone.utc)
+
+
+def make_room(count:int = 2) -> RoomController:
+    valve_configs = [{"id": f"climate.trv{index}"} for index in range(count)]
+    return RoomController("room:lounge", valve_configs, 900.0, START)
+
+
+def observe(room:RoomController, now:datetime, valve_temperatures:list[float],
+        thermostat_temperature:float) -> None:
+    for index, valve_temperature in enumerate(valve_temperatures):
+        room.observe_valve(f"climate.trv{index}", 0, valve_temperature, now)
+        room.update(now, thermostat_temperature)
+
+
+def test_updates_once_per_update_interval_with_jitter():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    updates = 0
+    for step in range(10):
+        # the valves update shortly before and after each other
+        now = START + timedelta(seconds=step * UPDATE_INTERVAL + (step % 2) * 3 - 1)
+        observe(room, now, [20.0, 20.0], 20.5)
+        if room.controller.thermostat_history.size > updates:
+            updates += 1
+    assert updates == 10
+
+
+def test_restored_configs_are_merged():
+    room = make_room()
+    room.restore_configs({
+        "21.0": {"felt_temp_delta": 1.0, "sweet_spot": 20.0},
+        "22.0": {"felt_temp_delta": 0.5, "sweet_spot": 30.0}
+    })
+    room.restore_configs({"21.0": {"felt_temp_delta": 0.0, "sweet_spot": 10.0}})
+    configs = room.controller.configs
+    assert configs.get(21.0).felt_temp_delta == pytest.approx(0.5)
+    assert configs.get(21.0).sweet_spot == pytest.approx(15.0)
+    assert configs.get(22.0).sweet_spot == pytest.approx(30.0)
+
+
+def test_heating_until_target_temperature_if_any_valve_was():
+    room = make_room(3)
+    for heating in (False, True, False):
+        room.restore_heating_until_target_temperature(heating)
+    assert room.controller.heating_until_target_temperature
+
+
+def test_weights_even_out_valve_temperatures():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    observe(room, START, [26.0, 22.0], 21.2)
+    room.learn_weights()
+    warm_valve, cold_valve = room.valves.values()
+    assert warm_valve.weight < 1.0 < cold_valve.weight
+    assert (warm_valve.weight + cold_valve.weight) / 2 == pytest.approx(1.0)
+
+
+def test_weights_are_not_learned_far_from_target():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    observe(room, START, [26.0, 16.0], 18.0)
+    room.learn_weights()
+    assert [valve.weight for valve in room.valves.values()] == [1.0, 1.0]
+
+
+def test_weights_are_bounded():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    observe(room, START, [40.0, 10.0], 21.0)
+    for _ in range(100):
+        room.learn_weights()
+    for valve in room.valves.values():
+        assert ROOM_WEIGHT_MIN <= valve.weight <= ROOM_WEIGHT_MAX
+
+
+def test_adjust_sets_valves_by_weight():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    room.valves["climate.trv0"].weight = 0.5
+    room.valves["climate.trv1"].weight = 1.5
+    now = START + timedelta(seconds=900)
+    observe(room, now, [19.0, 19.0], 19.0)
+    positions = room.adjust(now)
+    # the room opens to its sweet spot of 10
+    assert positions == {"climate.trv0": 5, "climate.trv1": 15}
+    assert room.adjust(now + timedelta(seconds=30)) is None
+
+
+def test_inactive_valve_keeps_its_position():
+    room = make_room()
+    room.controller.set_target_temperature(21.0, START)
+    room.set_active("climate.trv1", False)
+    now = START + timedelta(seconds=900)
+    observe(room, now, [19.0, 19.0], 19.0)
+    assert list(room.adjust(now).keys()) == ["climate.trv0"]
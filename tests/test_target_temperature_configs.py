@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from valves.target_temperature_configs import TargetTemperatureConfigs
+
+
+def learn(configs:TargetTemperatureConfigs, target_temperature:float, sweet_spot:float):
+    configs.find_or_initialize(target_temperature).sweet_spot = sweet_spot
+    configs.changed()
+
+
+def target_temperatures(configs:TargetTemperatureConfigs) -> list[float]:
+    return sorted(target_temperature for target_temperature, _ in configs.items())
+
+
+@pytest.mark.parametrize("max_size", [1, 2, 3, 4])
+def test_eviction_keeps_maximum_size(max_size):
+    configs = TargetTemperatureConfigs(max_size)
+    for target_temperature in (18.0, 23.0, 20.5, 21.0, 17.0, 22.5, 19.0, 20.0):
+        learn(configs, target_temperature, target_temperature)
+        assert len(configs) <= max_size
+        # the just created config is never evicted
+        assert configs.get(target_temperature) is not None
+
+
+def test_new_config_between_two_others():
+    configs = TargetTemperatureConfigs(2)
+    learn(configs, 18.0, 10.0)
+    learn(configs, 22.0, 30.0)
+    learn(configs, 21.0, 25.0)
+    # every neighbour pair contains the new config, the farthest one is dropped
+    assert target_temperatures(configs) == [21.0, 22.0]
+
+
+def test_closest_neighbours_are_merged():
+    configs = TargetTemperatureConfigs(3)
+    learn(configs, 18.0, 10.0)
+    learn(configs, 18.5, 20.0)
+    learn(configs, 22.0, 30.0)
+    learn(configs, 24.0, 40.0)
+    assert target_temperatures(configs) == [18.0, 22.0, 24.0]
+    assert configs.get(18.0).sweet_spot == pytest.approx(15.0)
+
+
+def test_from_json_evicts_to_maximum_size():
+    configs = TargetTemperatureConfigs(4)
+    for target_temperature in (18.0, 19.0, 20.0, 22.0):
+        learn(configs, target_temperature, target_temperature)
+    restored = TargetTemperatureConfigs(2)
+    restored.from_json(json.loads(configs.to_json_str()))
+    assert len(restored) == 2
+
+
+def test_lookup_follows_changes():
+    configs = TargetTemperatureConfigs(4)
+    learn(configs, 20.0, 10.0)
+    assert configs.lookup(20.0)[1] == pytest.approx(10.0)
+    learn(configs, 20.0, 12.0)
+    assert configs.lookup(20.0)[1] == pytest.approx(12.0)
+    assert configs.lookup(26.0)[1] == pytest.approx(12.0)
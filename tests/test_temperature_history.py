@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import pytest
+
+from valves.const import SLOPE_ESTIMATOR_REGRESSION
+from valves.temperature_history import TemperatureHistory
+
+START = 1_700_000_000.0
+
+
+def add_ramp(history:TemperatureHistory, seconds:int, step:int, kelvin_per_hour:float):
+    for offset in range(0, seconds + 1, step):
+        history.add_value(20.0 + kelvin_per_hour * offset / 3600.0, START + offset)
+    return START + seconds
+
+
+def test_delta_slope_of_ramp():
+    history = TemperatureHistory(timedelta(minutes=10))
+    now = add_ramp(history, 3600, 30, 1.0)
+    assert history.slope_at(now) == pytest.approx(1.0)
+
+
+def test_regression_slope_of_ramp():
+    history = TemperatureHistory(timedelta(minutes=10), slope_estimator=SLOPE_ESTIMATOR_REGRESSION)
+    now = add_ramp(history, 3600, 30, -2.0)
+    assert history.slope_at(now) == pytest.approx(-2.0)
+
+
+def test_expires_values_older_than_window():
+    history = TemperatureHistory(timedelta(minutes=10))
+    add_ramp(history, 3600, 30, 1.0)
+    assert history.size == 21
+    assert history.capacity == 22
+
+
+def test_grows_instead_of_shortening_window():
+    # five times the sample rate the buffer is sized for
+    history = TemperatureHistory(timedelta(minutes=10))
+    now = add_ramp(history, 3600, 6, 1.0)
+    assert history.size == 101
+    assert history.capacity >= 101
+    assert history.slope_at(now) == pytest.approx(1.0)
+
+
+def test_capacity_is_bounded():
+    history = TemperatureHistory(timedelta(seconds=10), capacity=2)
+    for offset in range(100):
+        history.add_value(20.0, START + offset * 0.1)
+    assert history.capacity == 12
+    assert history.size == 12
+
+
+def test_no_slope_without_updates():
+    history = TemperatureHistory(timedelta(minutes=10))
+    now = add_ramp(history, 600, 30, 1.0)
+    assert history.slope_at(now + 3601) == 0
+
+
+def test_unknown_slope_estimator():
+    with pytest.raises(ValueError):
+        TemperatureHistory(timedelta(minutes=10), slope_estimator="spline")
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from valves.valve_controller import ValveController
+
+START = datetime(2024, 1, 15, 6, 0, tzinfo=timezone.utc)
+UPDATE_INTERVAL = 900.0
+
+
+def make_controller(target_temperature:float = 21.0, raw_position:float = 0) -> ValveController:
+    controller = ValveController("climate.trv", {}, UPDATE_INTERVAL, START)
+    controller.set_target_temperature(target_temperature, START)
+    controller.observe_position(raw_position, START)
+    return controller
+
+
+def test_adjust_is_due_once_per_update_interval():
+    controller = make_controller()
+    controller.update(START, 20.8, 21.0)
+    assert controller.adjust(START) == (False, None)
+    now = START + timedelta(seconds=UPDATE_INTERVAL / 2)
+    controller.update(now, 20.8, 21.0)
+    due, _ = controller.adjust(now)
+    assert due
+    assert controller.adjust(now + timedelta(seconds=60)) == (False, None)
+
+
+def test_cold_room_opens_to_sweet_spot():
+    controller = make_controller()
+    now = START + timedelta(seconds=UPDATE_INTERVAL)
+    controller.update(now, 19.0, 19.0)
+    _, valve_position = controller.adjust(now)
+    assert valve_position == 10
+    assert controller.heating_until_target_temperature
+
+
+def test_warm_room_closes_valve():
+    controller = make_controller(raw_position=20)
+    controller.position = 20
+    now = START + timedelta(seconds=UPDATE_INTERVAL)
+    controller.update(now, 23.0, 25.0)
+    _, valve_position = controller.adjust(now)
+    assert valve_position is not None and valve_position < 20
+
+
+def test_position_changed_by_third_party():
+    controller = make_controller(raw_position=20)
+    controller.position = 20
+    controller.observe_position(35, START + timedelta(seconds=30))
+    assert controller.position == 35
+    assert controller.raw_position == 35
+
+
+def test_peer_felt_temp_delta_moves_a_quarter():
+    controller = make_controller()
+    peer_controller = make_controller()
+    controller.update(START, 20.0, 20.0)
+    peer_controller.update(START, 20.0, 20.0, peer_felt_temp_delta=1.0)
+    assert controller.felt_temp_delta == 0.0
+    assert controller.adjusted_felt_temp - peer_controller.adjusted_felt_temp == \
+            pytest.approx(0.25)
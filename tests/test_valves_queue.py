@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+# pylint: disable=wrong-import-position
+from homeassistant.util import utcnow
+
+from valves.benchmarks.fake_hass import FakeHass
+from valves.const import RETRY_BACKOFF_MAX
+from valves.valves_queue import ValvesQueue
+
+
+class FakeValveActuator:
+    def __init__(self, entity_name:str, result:bool = True):
+        self.entity_name = entity_name
+        self.backend = "shelly"
+        self.reports_written_position = True
+        self.valve_position = None
+        self.result = result
+        self.values = []
+
+    async def async_set_valve_position(self, value:float, urgent:bool) -> bool:
+        _ = (urgent)
+        self.values.append(value)
+        return self.result
+
+
+def run(test):
+    async def async_run():
+        hass = FakeHass()
+        hass.states.async_set("climate.a", "heat", {"current_temperature": 20.0})
+        hass.states.async_set("climate.b", "heat", {"current_temperature": 20.0})
+        await test(hass)
+    asyncio.run(async_run())
+
+
+def queued_entry(queue:ValvesQueue, valve_actuator:FakeValveActuator) -> dict:
+    entry = queue.lane(valve_actuator.backend).get(valve_actuator.entity_name)
+    queue.lane(valve_actuator.backend).remove(valve_actuator.entity_name)
+    return entry
+
+
+async def park(queue:ValvesQueue, valve_actuator:FakeValveActuator, attempts:int) -> None:
+    queue.async_set_valve(valve_actuator, 30, urgent=False)
+    for _ in range(attempts):
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+
+
+def test_failed_write_is_retried_with_backoff():
+    async def test(hass):
+        queue = ValvesQueue(hass, None)
+        valve_actuator = FakeValveActuator("climate.a", result=False)
+        queue.async_set_valve(valve_actuator, 30, urgent=False)
+        now = utcnow().timestamp()
+        assert not await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        entry = queue.lane(valve_actuator.backend).get("climate.a")
+        assert entry["value"] == 30
+        assert now + 10 <= entry["retry_at"] <= now + 31
+        assert queue.dead_letters == []
+    run(test)
+
+
+def test_retry_delay_is_bounded():
+    async def test(hass):
+        queue = ValvesQueue(hass, None)
+        assert queue.retry_delay(100) <= RETRY_BACKOFF_MAX.total_seconds()
+    run(test)
+
+
+def test_parks_after_max_attempts_and_readmits_when_back_online():
+    async def test(hass):
+        queue = ValvesQueue(hass, None, max_attempts=3)
+        valve_actuator = FakeValveActuator("climate.a", result=False)
+        await park(queue, valve_actuator, 3)
+        assert queue.dead_letters == ["climate.a"]
+        assert queue.queue_size == 0
+
+        # an online valve reporting temperatures is not re-admitted
+        hass.states.async_set("climate.a", "heat", {"current_temperature": 21.0})
+        assert queue.dead_letters == ["climate.a"]
+
+        hass.states.async_set("climate.a", "unavailable")
+        hass.states.async_set("climate.a", "heat", {"current_temperature": 21.0})
+        assert queue.dead_letters == []
+        assert queue.lane(valve_actuator.backend).get("climate.a")["value"] == 30
+        # it gets all attempts again
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        assert queue.dead_letters == []
+        assert valve_actuator.values == [30, 30, 30, 30]
+    run(test)
+
+
+def test_parked_valve_is_retried_slowly():
+    async def test(hass):
+        queue = ValvesQueue(hass, None, max_attempts=2)
+        valve_actuator = FakeValveActuator("climate.a", result=False)
+        await park(queue, valve_actuator, 2)
+        now = utcnow().timestamp()
+        queue.retry_parked(now)
+        assert queue.dead_letters == ["climate.a"]
+
+        queue.retry_parked(now + RETRY_BACKOFF_MAX.total_seconds() + 1)
+        assert queue.dead_letters == []
+        # the attempts are kept, so a single failure parks it again
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        assert queue.dead_letters == ["climate.a"]
+    run(test)
+
+
+def test_new_value_resets_attempts():
+    async def test(hass):
+        queue = ValvesQueue(hass, None, max_attempts=2)
+        valve_actuator = FakeValveActuator("climate.a", result=False)
+        queue.async_set_valve(valve_actuator, 30, urgent=False)
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        queue.async_set_valve(valve_actuator, 40, urgent=False)
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        assert queue.dead_letters == []
+
+        # the same value keeps counting
+        queue.async_set_valve(valve_actuator, 40, urgent=False)
+        await queue.async_dispatch(queued_entry(queue, valve_actuator))
+        assert queue.dead_letters == ["climate.a"]
+    run(test)
+
+
+def test_unsubscribe_removes_dead_letter_listeners():
+    async def test(hass):
+        queue = ValvesQueue(hass, None, max_attempts=1)
+        valve_actuator = FakeValveActuator("climate.a", result=False)
+        await park(queue, valve_actuator, 1)
+        queue.async_unsubscribe()
+        hass.states.async_set("climate.a", "unavailable")
+        hass.states.async_set("climate.a", "heat", {"current_temperature": 21.0})
+        assert queue.dead_letters == ["climate.a"]
+    run(test)
+
+
+def test_room_writes_share_one_backoff():
+    async def test(hass):
+        queue = ValvesQueue(hass, None, max_attempts=2)
+        queue.set_rooms({"room:lounge": ["climate.a", "climate.b"]})
+        valve_a = FakeValveActuator("climate.a")
+        valve_b = FakeValveActuator("climate.b", result=False)
+        queue.async_set_valve(valve_a, 30, urgent=False)
+        queue.async_set_valve(valve_b, 40, urgent=False)
+        entries = [queued_entry(queue, valve_a), queued_entry(queue, valve_b)]
+        assert not await queue.async_dispatch_group("room:lounge", entries)
+        assert valve_a.values == [30]
+        assert queue.lane("shelly").entity_names == ["climate.b"]
+        assert not await queue.async_dispatch_group(
+                "room:lounge", [queued_entry(queue, valve_b)])
+        assert queue.dead_letters == ["climate.b"]
+    run(test)
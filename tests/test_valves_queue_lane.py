@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+# pylint: disable=wrong-import-position
+from homeassistant.util import utcnow
+
+from valves.const import PRIORITY_AGING_SECONDS, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_URGENT
+from valves.valves_queue_lane import ValvesQueueLane
+
+
+def make_lane(concurrency:int = 10, admit=None) -> ValvesQueueLane:
+    return ValvesQueueLane("homematic", timedelta(seconds=0), concurrency, [], admit)
+
+
+def make_entry(value:int, priority:int, enqueued_at:float, urgent:bool = False) -> dict:
+    return {"value": value, "priority": priority, "enqueued_at": enqueued_at, "urgent": urgent}
+
+
+def test_orders_by_priority():
+    lane = make_lane()
+    now = utcnow().timestamp()
+    lane.put("climate.normal", make_entry(10, PRIORITY_NORMAL, now))
+    lane.put("climate.urgent", make_entry(20, PRIORITY_URGENT, now))
+    lane.put("climate.high", make_entry(30, PRIORITY_HIGH, now))
+    assert lane.entity_names == ["climate.high", "climate.urgent", "climate.normal"]
+    assert [entry["value"] for entry in lane.pop_batch(3)] == [30, 20, 10]
+
+
+def test_waiting_entries_overtake_higher_priorities():
+    lane = make_lane()
+    now = utcnow().timestamp()
+    lane.put("climate.new", make_entry(10, PRIORITY_HIGH, now))
+    lane.put("climate.old", make_entry(20, PRIORITY_NORMAL,
+            now - PRIORITY_NORMAL * PRIORITY_AGING_SECONDS - 1))
+    assert lane.entity_names == ["climate.old", "climate.new"]
+
+
+def test_coalesces_entries_of_an_entity():
+    lane = make_lane()
+    now = utcnow().timestamp()
+    lane.put("climate.a", make_entry(10, PRIORITY_URGENT, now - 60, urgent=True))
+    lane.put("climate.b", make_entry(20, PRIORITY_URGENT, now - 30))
+    lane.put("climate.a", make_entry(15, PRIORITY_NORMAL, now))
+    assert lane.queue_size == 2
+    entry = lane.get("climate.a")
+    # the latest value keeps the place, priority and urgency of the queued one
+    assert entry["value"] == 15
+    assert entry["enqueued_at"] == now - 60
+    assert entry["priority"] == PRIORITY_URGENT
+    assert entry["urgent"]
+    assert lane.entity_names == ["climate.a", "climate.b"]
+
+
+def test_coalescing_keeps_backoff():
+    lane = make_lane()
+    now = utcnow().timestamp()
+    queued_entry = make_entry(10, PRIORITY_NORMAL, now)
+    queued_entry["retry_at"] = now + 600
+    lane.put("climate.a", queued_entry)
+    lane.put("climate.a", make_entry(20, PRIORITY_HIGH, now))
+    assert lane.get("climate.a")["retry_at"] == now + 600
+    assert lane.pop_batch(1) == []
+    assert lane.queue_size == 1
+
+
+def test_pop_batch_respects_concurrency_and_admit():
+    lane = make_lane(concurrency=2, admit=lambda entry: entry["value"] != 20)
+    now = utcnow().timestamp()
+    for index, value in enumerate((10, 20, 30, 40)):
+        lane.put(f"climate.{value}", make_entry(value, PRIORITY_NORMAL, now + index))
+    assert [entry["value"] for entry in lane.pop_batch(5)] == [10, 30]
+    assert lane.entity_names == ["climate.20", "climate.40"]
+
+
+def test_take_and_remove():
+    lane = make_lane()
+    now = utcnow().timestamp()
+    lane.put("climate.a", make_entry(10, PRIORITY_NORMAL, now))
+    lane.put("climate.b", make_entry(20, PRIORITY_NORMAL, now + 1))
+    assert lane.take("climate.b", now)["value"] == 20
+    assert lane.take("climate.b", now) is None
+    lane.remove("climate.a")
+    assert lane.queue_size == 0
+    assert lane.pop_batch(5) == []
+
+
+def test_gates_block_the_lane():
+    blocked = [True]
+    lane = ValvesQueueLane("homematic", timedelta(seconds=0), 1, [lambda: blocked[0]])
+    lane.put("climate.a", make_entry(10, PRIORITY_NORMAL, utcnow().timestamp()))
+    assert not lane.ready
+    blocked[0] = False
+    assert lane.ready
@@ -1,15 +1,34 @@
 
 from typing import Union
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 from .cached_entity_wrapper import CachedEntityWrapper
 from .const import LOGGER
 
 class ValveActuator(CachedEntityWrapper):
-    def __init__(self, home_assistant:HomeAssistant, valve_config:dict):
-        super().__init__(home_assistant, valve_config["id"])
+    BACKEND = None
+    # False if valve_position is not the written position, e.g. a heating demand
+    REPORTS_WRITTEN_POSITION = True
+
+    def __init__(self, home_assistant:HomeAssistant, valve_config:dict, states=None,
+            push:bool = False, valves_queue=None, device_ids=None):
         self._valve_config = valve_config
+        # DeviceIdResolver shared by all valves
+        self._device_ids = device_ids
+        super().__init__(home_assistant, valve_config["id"], states, push, valves_queue)
+
+    @property
+    def backend(self) -> Union[str, None]:
+        return self.BACKEND
+
+    @property
+    def watched_entity_ids(self) -> list[str]:
+        watched_entity_ids = [self.entity_name]
+        valve_position_id = self._valve_config.get("valve_position", None)
+        if valve_position_id is not None:
+            watched_entity_ids.append(valve_position_id)
+        return watched_entity_ids
 
     @property
     def stripped_entity_name(self):
@@ -19,10 +38,6 @@ class ValveActuator(CachedEntityWrapper):
             stripped_entity_name = stripped_entity_name[len(prefix):]
         return stripped_entity_name
 
-    @property
-    def value(self) -> Union[float, None]:
-        raise NotImplementedError()
-
     @property
     def valve_position(self) -> Union[float, None]:
         raise NotImplementedError()
@@ -30,29 +45,30 @@ class ValveActuator(CachedEntityWrapper):
     async def async_set_valve_position(self, value:float, urgent:bool) -> bool:
         raise NotImplementedError()
 
-    def normalize_valve_state(self) -> bool:
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         raise NotImplementedError()
 
-    def normalize_hvac_mode(self, mode_from="auto", mode_to="heat") -> bool:
+    @callback
+    def async_normalize_hvac_mode(self, mode_from="auto", mode_to="heat") -> bool:
         if not self.available:
             return False
-        if self.entity.state == mode_from:
-            self._home_assistant.services.call('climate', 'set_hvac_mode', {
-                'entity_id' : self.entity_name,
-                'hvac_mode': mode_to
-            })
-            LOGGER.info("%s: Normalized hvac_mode state to %s", self._entity_name, mode_to)
+        if self.async_normalize('hvac_mode', 'climate', 'set_hvac_mode', {
+                    'entity_id' : self.entity_name,
+                    'hvac_mode': mode_to
+                }, self.entity.state == mode_from):
+            LOGGER.info("%s: Normalizing hvac_mode state to %s", self._entity_name, mode_to)
             return True
         else:
             return False
 
-    def normalize_target_temp(self, target_temp) -> bool:
-        if self.entity_attribute('temperature') != target_temp:
-            self._home_assistant.services.call('climate', 'set_temperature', {
-                'entity_id' : self.entity_name,
-                'temperature': target_temp
-            })
-            LOGGER.info("%s: Normalized temperature state", self._entity_name)
+    @callback
+    def async_normalize_target_temp(self, target_temp) -> bool:
+        if self.async_normalize('temperature', 'climate', 'set_temperature', {
+                    'entity_id' : self.entity_name,
+                    'temperature': target_temp
+                }, self.entity_attribute('temperature') != target_temp):
+            LOGGER.info("%s: Normalizing temperature state", self._entity_name)
             return True
         else:
             return False
@@ -1,16 +1,18 @@
 
 from typing import Union
 
+from homeassistant.core import callback
+
+from .cached_entity_wrapper import push_cached
 from .valve_actuator import ValveActuator
 
 class ValveActuatorBosch(ValveActuator):
+    BACKEND = "bosch"
+    VALUE_ATTRIBUTES = ("local_temperature",)
+    # pi_heating_demand is the valve's own demand, not the written valve position
+    REPORTS_WRITTEN_POSITION = False
 
-    @property
-    def value(self) -> Union[float, None]:
-        value = self.entity_attribute("local_temperature")
-        return None if value is None else float(value)
-
-    @property
+    @push_cached
     def valve_position(self) -> Union[float, None]:
         valve_position = self.entity_attribute("pi_heating_demand")
         #valve_position = self.entity_attribute("valve_position")
@@ -25,10 +27,11 @@ class ValveActuatorBosch(ValveActuator):
             'payload': f"{{ \"pi_heating_demand\": {int(value)} }}"
         }, blocking=True)
 
-    def normalize_valve_state(self) -> bool:
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         if not self.available:
             return False
-        res = self.normalize_hvac_mode("auto", "heat")
+        res = self.async_normalize_hvac_mode("auto", "heat")
         #res = res or self.normalize_target_temp(30)
         # "Poll" local temperature
         # self._home_assistant.services.call('mqtt', 'publish', {
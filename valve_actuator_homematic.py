@@ -1,16 +1,17 @@
 
 from typing import Union
 
+from homeassistant.core import callback
+
+from .cached_entity_wrapper import push_cached
 from .const import LOGGER
 from .valve_actuator import ValveActuator
 
 class ValveActuatorHomematic(ValveActuator):
-    @property
-    def value(self) -> Union[float, None]:
-        value = self.entity_attribute("current_temperature")
-        return None if value is None else float(value)
+    BACKEND = "homematic"
+    VALUE_ATTRIBUTES = ("current_temperature",)
 
-    @property
+    @push_cached
     def valve_position(self) -> Union[float, None]:
         # homematic
         valve_position = self.entity_attribute("valve")
@@ -34,12 +35,13 @@ class ValveActuatorHomematic(ValveActuator):
         LOGGER.info("%s: Got resp %s", self._entity_name, resp)
         return True
 
-    def normalize_valve_state(self) -> bool:
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         if not self.available:
             return False
-        res = self.normalize_hvac_mode()
-        if self._home_assistant.states.get("input_boolean.heating_on").state == "on":
+        res = self.async_normalize_hvac_mode()
+        if self._states.get("input_boolean.heating_on").state == "on":
             target_temp = 30.5
         else:
             target_temp = 4.5
-        return res or self.normalize_target_temp(target_temp)
+        return res or self.async_normalize_target_temp(target_temp)
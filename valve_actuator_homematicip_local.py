@@ -1,27 +1,29 @@
 from typing import Union
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import entity_registry
 
+from .cached_entity_wrapper import push_cached
 from .const import LOGGER
 from .valve_actuator import ValveActuator
 
 class ValveActuatorHomematicIPLocal(ValveActuator):
-    def __init__(self, home_assistant:HomeAssistant, valve_config:dict):
-        super().__init__(home_assistant, valve_config)
-        self._device_id = None
+    BACKEND = "homematicip_local"
+    VALUE_ATTRIBUTES = ("current_temperature",)
 
-    @property
-    def value(self) -> Union[float, None]:
-        value = self.entity_attribute("current_temperature")
-        return None if value is None else float(value)
+    def __init__(self, home_assistant:HomeAssistant, valve_config:dict, states=None,
+            push:bool = False, valves_queue=None, device_ids=None):
+        super().__init__(home_assistant, valve_config, states, push, valves_queue, device_ids)
+        # put_paramset payloads by urgent, without the paramset, for the device_id
+        self._payloads_device_id = None
+        self._payloads = {}
 
-    @property
+    @push_cached
     def valve_position(self) -> Union[float, None]:
         valve_position_id = self._valve_config.get("valve_position", None)
         if valve_position_id is None:
             raise ValueError("valve_position missing in config!")
-        valve_position_state = self._home_assistant.states.get(valve_position_id)
+        valve_position_state = self.state_of(valve_position_id)
         if valve_position_state is None:
             LOGGER.info("%s: valve_position valve_position_state is None",
                             self._entity_name)
@@ -31,22 +33,39 @@ class ValveActuatorHomematicIPLocal(ValveActuator):
         #                 self._entity_name, valve_position)
         return None if valve_position is None else float(valve_position)
 
-    async def async_set_valve_position(self, value:float, urgent:bool) -> bool:
-        if self._device_id is None:
-            registry = entity_registry.async_get(self._home_assistant)
-            entry = registry.async_get(self._entity_name)
-            LOGGER.info("%s: device json %s", self._entity_name, entry.display_json_repr)
-            self._device_id = entry.device_id
-            LOGGER.info("%s: Got device_id %s",
-                    self._entity_name, self._device_id)
+    @property
+    def device_id(self) -> Union[str, None]:
+        if self._device_ids is not None:
+            return self._device_ids.device_id(self._entity_name)
+        entry = entity_registry.async_get(self._home_assistant).async_get(self._entity_name)
+        return None if entry is None else entry.device_id
 
+    def payload(self, urgent:bool) -> Union[dict, None]:
+        device_id = self.device_id
+        if device_id is None:
+            return None
+        if device_id != self._payloads_device_id:
+            LOGGER.info("%s: Using device_id %s", self._entity_name, device_id)
+            self._payloads_device_id = device_id
+            self._payloads = {
+                rx_urgent: {
+                    "device_id": device_id,
+                    "paramset_key": "MASTER",
+                    "rx_mode": "BURST" if rx_urgent else "WAKEUP"
+                } for rx_urgent in (True, False)
+            }
+        return self._payloads[urgent]
+
+    async def async_set_valve_position(self, value:float, urgent:bool) -> bool:
+        payload = self.payload(urgent)
+        if payload is None:
+            LOGGER.warning("%s: No device_id in entity registry", self._entity_name)
+            return False
         data = {
-            "device_id": self._device_id,
-            "paramset_key": "MASTER",
+            **payload,
             "paramset": {
                 "VALVE_MAXIMUM_POSITION": value
-            },
-            "rx_mode": "BURST" if urgent else "WAKEUP"
+            }
         }
         resp = await self._home_assistant.services.async_call(
                 "homematicip_local",
@@ -56,12 +75,13 @@ class ValveActuatorHomematicIPLocal(ValveActuator):
         LOGGER.info("%s: Got resp %s", self._entity_name, resp)
         return True
 
-    def normalize_valve_state(self) -> bool:
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         if not self.available:
             return False
-        res = self.normalize_hvac_mode()
-        if self._home_assistant.states.get("input_boolean.heating_on").state == "on":
+        res = self.async_normalize_hvac_mode()
+        if self._states.get("input_boolean.heating_on").state == "on":
             target_temp = 30.5
         else:
             target_temp = 4.5
-        return res or self.normalize_target_temp(target_temp)
+        return res or self.async_normalize_target_temp(target_temp)
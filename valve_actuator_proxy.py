@@ -2,18 +2,20 @@
 from typing import Union
 
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, State, callback
 
-from .valve_actuator_bosch import ValveActuatorBosch
-from .valve_actuator_eurotronic import ValveActuatorEurotronic
-from .valve_actuator_homematic import ValveActuatorHomematic
-from .valve_actuator_homematicip_local import ValveActuatorHomematicIPLocal
-from .valve_actuator_shelly import ValveActuatorShelly
+from .const import LOGGER
+from .valve_actuator_types import VALVE_ACTUATOR_TYPES
 
 class ValveActuatorProxy:
 
-    def __init__(self, home_assistant:HomeAssistant, valve_config:dict):
+    def __init__(self, home_assistant:HomeAssistant, valve_config:dict, states=None,
+            push:bool = False, valves_queue=None, device_ids=None):
         self._home_assistant = home_assistant
+        self._valves_queue = valves_queue
+        self._device_ids = device_ids
+        self._states = home_assistant.states if states is None else states
+        self._push = push
         self._valve_config = valve_config
         self._entity_name = valve_config["id"]
         self._valve_actuator = None
@@ -26,12 +28,18 @@ class ValveActuatorProxy:
     def type(self) -> str:
         return self._valve_config.get("type", "auto")
 
+    @property
+    def backend(self) -> Union[str, None]:
+        valve_actuator = self.__get_valve_actuator()
+        return None if valve_actuator is None else valve_actuator.BACKEND
+
     @property
     def entity(self):
-        return self._home_assistant.states.get(self._entity_name)
+        return self._states.get(self._entity_name)
 
     def entity_attribute(self, attribute_name:str):
-        return None if self.entity is None else self.entity.attributes.get(attribute_name)
+        entity = self.entity
+        return None if entity is None else entity.attributes.get(attribute_name)
 
     @property
     def available(self) -> bool:
@@ -43,14 +51,29 @@ class ValveActuatorProxy:
         valve_actuator = self.__get_valve_actuator()
         return None if valve_actuator is None else valve_actuator.value
 
+    def state_value(self, state:State) -> Union[float, None]:
+        valve_actuator = self.__get_valve_actuator()
+        return None if valve_actuator is None else valve_actuator.state_value(state)
+
     @property
     def valve_position(self) -> Union[float, None]:
         valve_actuator = self.__get_valve_actuator()
         return None if valve_actuator is None else valve_actuator.valve_position
 
-    def normalize_valve_state(self) -> bool:
+    @property
+    def reports_written_position(self) -> bool:
+        valve_actuator = self.__get_valve_actuator()
+        return False if valve_actuator is None else valve_actuator.REPORTS_WRITTEN_POSITION
+
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         valve_actuator = self.__get_valve_actuator()
-        return False if valve_actuator is None else valve_actuator.normalize_valve_state()
+        return False if valve_actuator is None else valve_actuator.async_normalize_valve_state()
+
+    @callback
+    def async_unsubscribe(self) -> None:
+        if self._valve_actuator is not None:
+            self._valve_actuator.async_unsubscribe()
 
     async def async_set_valve_position(self, value:float, urgent:bool) -> bool:
         valve_actuator = self.__get_valve_actuator()
@@ -59,26 +82,21 @@ class ValveActuatorProxy:
         else:
             return False
 
+    @property
+    def resolved(self) -> bool:
+        return self._valve_actuator is not None
+
+    def resolve(self, valve_actuator_type:str) -> bool:
+        # Creates the actuator of the given type. Detection and retries are done in
+        # bulk by the ValveActuatorResolver, so accessing an unresolved proxy is cheap.
+        valve_actuator_class = VALVE_ACTUATOR_TYPES.get(valve_actuator_type)
+        if valve_actuator_class is None:
+            LOGGER.error("%s: Unknown valve type %s", self._entity_name, valve_actuator_type)
+            return False
+        self._valve_actuator = valve_actuator_class(
+                self._home_assistant, self._valve_config, self._states, self._push,
+                self._valves_queue, self._device_ids)
+        return True
+
     def __get_valve_actuator(self):
-        if self._valve_actuator is None:
-            if (self.type == "auto" and self.entity_attribute("eurotronic_system_mode") is not None
-                    or self.type == "eurotronic"):
-                self._valve_actuator = ValveActuatorEurotronic(
-                        self._home_assistant, self._valve_config)
-            elif (self.type == "auto" and self.entity_attribute("interface") == "rf"
-                    or self.type == "homematic"):
-                self._valve_actuator = ValveActuatorHomematic(
-                        self._home_assistant, self._valve_config)
-            elif (self.type == "auto"
-                    and self.entity_attribute("interface_id") is not None
-                    and self.entity_attribute("interface_id").endswith("-BidCos-RF")
-                    or self.type == "homematicip_local"):
-                self._valve_actuator = ValveActuatorHomematicIPLocal(
-                        self._home_assistant, self._valve_config)
-            elif self.type == "bosch":
-                self._valve_actuator = ValveActuatorBosch(
-                        self._home_assistant, self._valve_config)
-            elif self.type == "shelly":
-                self._valve_actuator = ValveActuatorShelly(
-                        self._home_assistant, self._valve_config)
         return self._valve_actuator
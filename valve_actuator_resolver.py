@@ -0,0 +1,113 @@
+from typing import Union
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import Event, HomeAssistant, State, callback
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    LOGGER,
+    STORAGE_SAVE_DELAY,
+    VALVE_TYPES_STORAGE_KEY,
+    VALVE_TYPES_STORAGE_VERSION
+)
+from .valve_actuator_proxy import ValveActuatorProxy
+from .valve_actuator_types import VALVE_ACTUATOR_TYPES, detect_valve_actuator_type
+
+class ValveActuatorResolver:
+    # Resolves the valve type of all ValveActuatorProxys once at setup. Valves whose
+    # entity is not loaded yet are resolved on their first state event. Detected types
+    # are persisted, so after a restart the valves can be used before their entities
+    # are loaded. A persisted type is checked against the first live state of the valve.
+
+    def __init__(self, hass:HomeAssistant):
+        self._hass = hass
+        self._store = Store(hass, VALVE_TYPES_STORAGE_VERSION, VALVE_TYPES_STORAGE_KEY)
+        self._detected_types: dict[str, str] = {}
+        self._unresolved: dict[str, ValveActuatorProxy] = {}
+        # resolved with a persisted type before their entity reported a live state
+        self._unvalidated: dict[str, ValveActuatorProxy] = {}
+        self._unsub_state_changed = None
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        if data is None:
+            return
+        for entity_name, valve_actuator_type in data.get("types", {}).items():
+            if valve_actuator_type in VALVE_ACTUATOR_TYPES:
+                self._detected_types[entity_name] = valve_actuator_type
+
+    @callback
+    def async_resolve(self, valve_actuators:list[ValveActuatorProxy]) -> None:
+        for valve_actuator in valve_actuators:
+            # a configured type which is unknown won't get known by waiting
+            if not self.resolve(valve_actuator) and valve_actuator.type == "auto":
+                self._unresolved[valve_actuator.entity_name] = valve_actuator
+        # forget types of valves which are not configured anymore
+        entity_names = set(valve_actuator.entity_name for valve_actuator in valve_actuators)
+        for entity_name in list(self._detected_types.keys()):
+            if entity_name not in entity_names:
+                del self._detected_types[entity_name]
+                self.async_schedule_save()
+        LOGGER.info("Resolved %d of %d valve types",
+                len(valve_actuators) - len(self._unresolved), len(valve_actuators))
+        waiting = sorted(set(self._unresolved.keys()) | set(self._unvalidated.keys()))
+        if len(waiting) > 0:
+            LOGGER.info("Waiting for %s to resolve or validate their valve types", waiting)
+            self._unsub_state_changed = async_track_state_change_event(
+                    self._hass, waiting, self.async_state_changed)
+
+    def resolve(self, valve_actuator:ValveActuatorProxy,
+            state:Union[State, None] = None) -> bool:
+        entity_name = valve_actuator.entity_name
+        if valve_actuator.type != "auto":
+            return valve_actuator.resolve(valve_actuator.type)
+        if state is None:
+            state = valve_actuator.entity
+        live = state is not None and state.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN)
+        valve_actuator_type = self._detected_types.get(entity_name)
+        if valve_actuator_type is not None and live:
+            # the live state wins over a persisted type, e.g. after the TRV was replaced
+            self._unvalidated.pop(entity_name, None)
+            detected_type = detect_valve_actuator_type(state)
+            if detected_type is not None and detected_type != valve_actuator_type:
+                LOGGER.warning("%s: Detected valve type %s instead of persisted %s",
+                        entity_name, detected_type, valve_actuator_type)
+                valve_actuator_type = detected_type
+                self._detected_types[entity_name] = valve_actuator_type
+                self.async_schedule_save()
+        elif valve_actuator_type is not None:
+            LOGGER.info("%s: Using persisted valve type %s", entity_name, valve_actuator_type)
+            self._unvalidated[entity_name] = valve_actuator
+        else:
+            valve_actuator_type = detect_valve_actuator_type(state)
+            if valve_actuator_type is None:
+                return False
+            LOGGER.info("%s: Detected valve type %s", entity_name, valve_actuator_type)
+            self._detected_types[entity_name] = valve_actuator_type
+            self.async_schedule_save()
+        if valve_actuator.backend == valve_actuator_type:
+            return True
+        # e.g. resolved with a persisted type which turned out to be wrong
+        valve_actuator.async_unsubscribe()
+        return valve_actuator.resolve(valve_actuator_type)
+
+    @callback
+    def async_state_changed(self, event:Event) -> None:
+        entity_name = event.data.get("entity_id")
+        valve_actuator = self._unresolved.get(entity_name, self._unvalidated.get(entity_name))
+        if (valve_actuator is None
+                or not self.resolve(valve_actuator, event.data.get("new_state"))):
+            return
+        self._unresolved.pop(entity_name, None)
+        if (len(self._unresolved) == 0 and len(self._unvalidated) == 0
+                and self._unsub_state_changed is not None):
+            self._unsub_state_changed()
+            self._unsub_state_changed = None
+
+    @callback
+    def async_schedule_save(self) -> None:
+        self._store.async_delay_save(self.data_to_save, STORAGE_SAVE_DELAY.total_seconds())
+
+    def data_to_save(self) -> dict:
+        return {"types": dict(self._detected_types)}
@@ -1,21 +1,22 @@
 
 from typing import Union
 
+from homeassistant.core import callback
+
+from .cached_entity_wrapper import push_cached
 from .const import LOGGER
 from .valve_actuator import ValveActuator
 
 class ValveActuatorShelly(ValveActuator):
-    @property
-    def value(self) -> Union[float, None]:
-        value = self.entity_attribute("current_temperature")
-        return None if value is None else float(value)
+    BACKEND = "shelly"
+    VALUE_ATTRIBUTES = ("current_temperature",)
 
-    @property
+    @push_cached
     def valve_position(self) -> Union[float, None]:
         valve_position_id = self._valve_config.get("valve_position", None)
         if valve_position_id is None:
             raise ValueError("valve_position missing in config!")
-        valve_position_state = self._home_assistant.states.get(valve_position_id)
+        valve_position_state = self.state_of(valve_position_id)
         if valve_position_state is None:
             return None
         valve_position = valve_position_state.state
@@ -35,6 +36,7 @@ class ValveActuatorShelly(ValveActuator):
         LOGGER.info("%s: Got resp %s", self._entity_name, resp)
         return True
 
-    def normalize_valve_state(self) -> bool:
+    @callback
+    def async_normalize_valve_state(self) -> bool:
         # Nothing to normalize for Shelly
         return False
@@ -0,0 +1,53 @@
+from typing import Callable, Union
+
+from homeassistant.core import State
+
+from .valve_actuator import ValveActuator
+from .valve_actuator_bosch import ValveActuatorBosch
+from .valve_actuator_eurotronic import ValveActuatorEurotronic
+from .valve_actuator_homematic import ValveActuatorHomematic
+from .valve_actuator_homematicip_local import ValveActuatorHomematicIPLocal
+from .valve_actuator_shelly import ValveActuatorShelly
+
+# Valve actuator classes by type in detection order. A detector returns True if the
+# state of a TRV entity belongs to its type. Types without detector need to be set
+# with "type" in the valves config.
+VALVE_ACTUATOR_TYPES: dict[str, type] = {}
+VALVE_ACTUATOR_DETECTORS: dict[str, Callable[[State], bool]] = {}
+
+def register_valve_actuator_type(valve_actuator_class:type,
+        detector:Union[Callable[[State], bool], None] = None) -> None:
+    if not issubclass(valve_actuator_class, ValveActuator):
+        raise TypeError(f"{valve_actuator_class} is not a ValveActuator")
+    VALVE_ACTUATOR_TYPES[valve_actuator_class.BACKEND] = valve_actuator_class
+    if detector is not None:
+        VALVE_ACTUATOR_DETECTORS[valve_actuator_class.BACKEND] = detector
+
+
+def detect_valve_actuator_type(state:Union[State, None]) -> Union[str, None]:
+    if state is None:
+        return None
+    for valve_actuator_type, detector in VALVE_ACTUATOR_DETECTORS.items():
+        if detector(state):
+            return valve_actuator_type
+    return None
+
+
+def is_eurotronic(state:State) -> bool:
+    return state.attributes.get("eurotronic_system_mode") is not None
+
+
+def is_homematic(state:State) -> bool:
+    return state.attributes.get("interface") == "rf"
+
+
+def is_homematicip_local(state:State) -> bool:
+    interface_id = state.attributes.get("interface_id")
+    return interface_id is not None and interface_id.endswith("-BidCos-RF")
+
+
+register_valve_actuator_type(ValveActuatorEurotronic, is_eurotronic)
+register_valve_actuator_type(ValveActuatorHomematic, is_homematic)
+register_valve_actuator_type(ValveActuatorHomematicIPLocal, is_homematicip_local)
+register_valve_actuator_type(ValveActuatorBosch)
+register_valve_actuator_type(ValveActuatorShelly)
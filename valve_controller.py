@@ -0,0 +1,335 @@
+import math
+
+from datetime import datetime, timedelta, timezone
+from typing import Union
+
+from .const import (
+    DEFAULT_ERROR_EXP_FACTOR,
+    DEFAULT_ERROR_EXP_RATE,
+    DEFAULT_FELT_RATIO,
+    DEFAULT_LEARN_RATE,
+    DEFAULT_MAX_TARGET_TEMPERATURE_CONFIGS,
+    DELAY_LEARN_AFTER_TEMPERATURE_CHANGE,
+    SLOPE_ESTIMATOR_DELTA,
+    LOGGER
+)
+from .target_temperature_configs import TargetTemperatureConfigs
+from .temperature_history import TemperatureHistory
+
+# heating_started_at if not heating, timezone aware to compare with now
+HEATING_NOT_STARTED = datetime.min.replace(tzinfo=timezone.utc)
+
+class ValveController:
+    # Control and learning loop of one valve without any Home Assistant dependency.
+    # The current time is passed in, so the same code runs in ValveCover and in the
+    # offline simulator.
+
+    def __init__(self, name:str, valve_config:dict, update_interval:float, now:datetime):
+        self.name = name
+        # Kp=1.5 was ok without sweet_spot multiply, try 1.5/15 = 0.1
+        # 0.1 was ok, but a bit too high
+        self.position_factor = float(valve_config.get("position_factor", 0.07)) # Kp
+        # share of the thermostat temperature in the felt temperature
+        self.felt_ratio = float(valve_config.get("felt_ratio", DEFAULT_FELT_RATIO))
+        # error_exp = factor * error * e^(rate * |error|)
+        self.error_exp_factor = float(
+                valve_config.get("error_exp_factor", DEFAULT_ERROR_EXP_FACTOR))
+        self.error_exp_rate = float(valve_config.get("error_exp_rate", DEFAULT_ERROR_EXP_RATE))
+        # learn weight of felt_temp_delta and sweet_spot per second of update interval
+        self.learn_rate = float(valve_config.get("learn_rate", DEFAULT_LEARN_RATE))
+        self.update_interval = update_interval
+        self.min_position = valve_config.get("min_position", 0)
+        self.max_position = valve_config.get("max_position", 80)
+
+        self.position = 0
+        self.raw_position = -1
+        self.raw_position_changed_at = now
+        self.target_temperature = -1.0
+        self.target_temperature_changed = False
+        # value of sensor.temperature_adjust
+        self.temperature_adjust = 0.0
+        self.configs = TargetTemperatureConfigs(
+                valve_config.get(
+                        "max_target_temperature_configs", DEFAULT_MAX_TARGET_TEMPERATURE_CONFIGS),
+                bool(valve_config.get("target_temperature_interpolation", False)))
+        self.thermostat_temperature = -1.0
+        self.adjusted_felt_temp = -1.0
+        self.felt_temp = -1.0
+        self.real_error = -1.0
+        self.error = -1.0
+        self.error_exp = -1.0
+        self.thermostat_history = TemperatureHistory(
+                timedelta(minutes=60),
+                slope_estimator=valve_config.get("thermostat_slope", SLOPE_ESTIMATOR_DELTA))
+        self.valve_history = TemperatureHistory(
+                timedelta(minutes=10),
+                slope_estimator=valve_config.get("valve_slope", SLOPE_ESTIMATOR_DELTA))
+        self.next_temp_adjust_at = now
+        self.last_valve_adjust_at = now - timedelta(seconds=update_interval / 2)
+        self.last_target_temperature_changed_at = now - DELAY_LEARN_AFTER_TEMPERATURE_CHANGE
+        self.heating_started_at = HEATING_NOT_STARTED
+        self.heating_until_target_temperature = False
+        self._now = now
+
+    def get_adjusted_target_temperature(
+            self,
+            target_temperature: Union[float, None] = None) -> float:
+        if target_temperature is None:
+            target_temperature = self.target_temperature
+        return target_temperature + self.temperature_adjust
+
+    @property
+    def felt_temp_delta(self) -> float:
+        return self.configs.lookup(self.get_adjusted_target_temperature())[0]
+
+    @felt_temp_delta.setter
+    def felt_temp_delta(self, value:float):
+        target_temperature_config = self.configs.find_or_initialize(
+                self.get_adjusted_target_temperature())
+        target_temperature_config.felt_temp_delta = value
+        self.configs.changed()
+
+    @property
+    def sweet_spot(self) -> float:
+        return self.configs.lookup(self.get_adjusted_target_temperature())[1]
+
+    @sweet_spot.setter
+    def sweet_spot(self, value:float):
+        target_temperature_config = self.configs.find_or_initialize(
+                self.get_adjusted_target_temperature())
+        # ensure minimum value
+        target_temperature_config.sweet_spot = max(1.0, value)
+        self.configs.changed()
+
+    @property
+    def thermostat_slope(self) -> float:
+        return self.thermostat_history.slope_at(self._now.timestamp())
+
+    @property
+    def valve_slope(self) -> float:
+        return self.valve_history.slope_at(self._now.timestamp())
+
+    def observe_position(self, raw_position:float, now:datetime) -> None:
+        self._now = now
+        if raw_position != self.raw_position:
+            if raw_position == math.ceil(self.position):
+                LOGGER.info("%s: Position changed from %.1f to %.1f",
+                        self.name, self.raw_position, raw_position)
+            else:
+                LOGGER.info("%s: Position changed by third party from %.1f to %.1f",
+                        self.name, self.raw_position, raw_position)
+                self.position = raw_position
+            self.raw_position = raw_position
+            self.raw_position_changed_at = now
+
+    def set_target_temperature(self, target_temperature:float, now:datetime) -> None:
+        # target_temperature is already adjusted by temperature_adjust
+        self._now = now
+        if (self.target_temperature >= 0 and
+                abs(self.target_temperature - target_temperature) >= 0.5):
+            self.last_valve_adjust_at = now - timedelta(seconds=self.update_interval)
+            self.last_target_temperature_changed_at = now
+            self.target_temperature_changed = True
+        if self.target_temperature != target_temperature:
+            self.target_temperature = target_temperature
+            # ignore heating caused by changed target temperature
+            self.heating_started_at = HEATING_NOT_STARTED
+
+    def update(self, now:datetime, thermostat_temperature:float, valve_temperature:float,
+            peer_felt_temp_delta:Union[float, None] = None) -> None:
+        self._now = now
+        self.thermostat_temperature = thermostat_temperature
+        self.thermostat_history.add_value(thermostat_temperature, now.timestamp())
+        self.valve_history.add_value(valve_temperature, now.timestamp())
+
+        felt_ratio = self.felt_ratio
+        self.felt_temp = (
+            thermostat_temperature * felt_ratio
+            + valve_temperature * (1.0 - felt_ratio))
+        adjusted_felt_temp_delta = self.felt_temp_delta
+        if peer_felt_temp_delta is not None:
+            diff = self.felt_temp_delta - float(peer_felt_temp_delta)
+            # "+=" would be wrong here - tested with Wohnzimmer valves where
+            # the colder turned off earlier
+            # weight with only 0.25 instead of 0.5 (=average)
+            adjusted_felt_temp_delta -= 0.25 * diff
+
+        # kd with felt_ratio of 0.5: 0.5 overshoots, 1.0 turns off too early
+        # kd with felt_ratio of 0.667: try 0.5
+        self.real_error = round(thermostat_temperature - self.target_temperature, 3)
+        self.adjusted_felt_temp = (
+            self.felt_temp
+            + max(-0.5, min(0.5, self.thermostat_slope * 0.5)) # kd, clamp to +/-0.5
+            - adjusted_felt_temp_delta)
+        self.error = self.adjusted_felt_temp - self.target_temperature
+
+        # make delta exponential, see https://www.wolframalpha.com/input/
+        # and https://www.desmos.com/calculator
+        # 0.1=>0.1, 0.5=>1.0 => a=0.84, b=1.73
+        # a*0.1*e^(b*0.1)=0.1,a*0.3*e^(b*0.3)=0.6 => a=0.71, b=3.47
+        self.error_exp = (
+                self.error_exp_factor
+                * self.error
+                * math.exp(self.error_exp_rate * abs(self.error)))
+
+    def window_closed(self, now:datetime) -> None:
+        self._now = now
+        self.thermostat_history.reset(now.timestamp())
+        self.last_valve_adjust_at = now
+
+    def adjust(self, now:datetime) -> tuple[bool, Union[int, None]]:
+        # Returns if the adjustment was due and the new valve position if it differs
+        # from the reported one
+        self._now = now
+        self.next_temp_adjust_at = (
+                self.last_valve_adjust_at +
+                timedelta(seconds=self.update_interval))
+        if now < self.next_temp_adjust_at:
+            return False, None
+        self.last_valve_adjust_at = now
+        return True, self.adjust_position(now)
+
+    def adjust_position(self, now:datetime) -> Union[int, None]:
+        self._now = now
+        # use raw_position instead of position for learning because,
+        # e.g. for eurotronic they may differ alot.
+        if self.raw_position > 0:
+            felt_temp_delta = self.felt_temp - self.thermostat_temperature
+            # felt_temp_delta < 0 will decrease ratio, 0 is 1, > 0 will incrase ratio
+            #felt_temp_learn_weight = learn_weight * math.exp(felt_temp_delta)
+            # (felt_temp_delta - self.felt_temp_delta) < 0 will decrease, 0 is 1, > 0 will increase
+            felt_temp_delta_delta = felt_temp_delta - self.felt_temp_delta
+            felt_temp_sigmoid = 1.0 / (1.0 + math.exp(-felt_temp_delta_delta * 3.0))
+            felt_temp_learn_weight = (
+                self.learn_rate
+                * self.update_interval
+                * (1.0 + felt_temp_sigmoid))
+            # default simple method
+            #felt_temp_learn_weight = learn_weight
+            #felt_temp_learn_weight = felt_temp_learn_weight * 100.0 # only temporary: faster!
+            self.felt_temp_delta = (
+                self.felt_temp_delta * (1.0 - felt_temp_learn_weight)
+                + felt_temp_delta * felt_temp_learn_weight)
+            LOGGER.info((
+                    "%s: New felt_temp learn: felt_temp_delta=%.3f"
+                    ", felt_temp_delta_delta=%.3f"
+                    ", felt_temp_sigmoid=%.3f"
+                    ", felt_temp_learn_weight=%.3f"),
+                self.name,
+                self.felt_temp_delta,
+                felt_temp_delta_delta,
+                felt_temp_sigmoid,
+                felt_temp_learn_weight)
+
+            # update sweet spot only when not heating to target or last target temp change was more
+            # than 4 hours ago
+            if (not self.heating_until_target_temperature
+                    or now >= self.last_target_temperature_changed_at +
+                            DELAY_LEARN_AFTER_TEMPERATURE_CHANGE):
+                combined_fitness = max(
+                        0.5,
+                        1.0 - abs(self.thermostat_slope) - abs(self.real_error))
+                learn_weight = self.learn_rate * self.update_interval * combined_fitness
+
+                sweet_spot_learn_weight = learn_weight
+                # cap sweet spot at half of maximum position
+                self.sweet_spot = min(self.max_position / 2.0,(
+                        self.sweet_spot * (1.0 - sweet_spot_learn_weight)
+                        + float(self.raw_position) * sweet_spot_learn_weight))
+                LOGGER.info((
+                        "%s: New sweet spot learn: real_error=%.3f, slope=%.3f"
+                        ", learn_weight=%.3f, sweet_spot_learn_weight=%.3f"),
+                    self.name,
+                    self.real_error,
+                    self.thermostat_slope,
+                    learn_weight,
+                    sweet_spot_learn_weight)
+
+        average_sweet_spot = self.sweet_spot
+
+        valve_pos = self.position
+        new_valve_pos = -1.0
+        if self.target_temperature_changed:
+            new_valve_pos = valve_pos - 2.0 * self.error * self.sweet_spot
+
+        # If it's colder than 0.5 degress from target temperature, enable
+        # heating_until_target_temperature
+        if (self.thermostat_temperature < self.target_temperature - 0.5
+                and not self.heating_until_target_temperature):
+            LOGGER.info("%s: Start heating to target temperature.",
+                    self.name)
+            self.heating_until_target_temperature = True
+        elif (self.thermostat_temperature >= self.target_temperature
+                and self.heating_until_target_temperature):
+            self.heating_until_target_temperature = False
+            if self.raw_position > self.sweet_spot:
+                LOGGER.info("%s: Reached target temperature after heating. "
+                        "Going to sweet spot %.2f.",
+                        self.name, self.sweet_spot)
+                new_valve_pos = self.sweet_spot
+            else:
+                LOGGER.info("%s: Reached target temperature after heating but position below"
+                        " sweet spot - performing standard adjust.",
+                        self.name)
+
+        # If new_valve_pos was not yet set by a special case perform standard adjust
+        if new_valve_pos < 0.0:
+            valve_delta = float(-self.error_exp * self.position_factor * average_sweet_spot)
+            # ensure minimum change
+            if valve_delta >= 0:
+                valve_delta = max(0.333, valve_delta)
+            else:
+                valve_delta = min(-0.333, valve_delta)
+            # put valve delta on a logarithmic scale: valve_pos 0=>1, 20=>2
+            #valve_delta = valve_delta * math.exp(math.log(2) * valve_pos / 20.0)
+            new_valve_pos = valve_pos + valve_delta
+
+        adaptive_max_position = max(5.0, min(self.max_position, self.sweet_spot * 2.0))
+        new_valve_pos = min(adaptive_max_position, max(self.min_position, new_valve_pos))
+        # if coming from position 0 directly jump to ratio of sweet spot
+        # (depending on slope disabled for now)
+        if (not self.target_temperature_changed
+                and self.position == 0
+                and new_valve_pos > 0):
+            # slope factor 1.0 was a too agressive (esp. during night)
+            # slope_factor = 0.75
+            # new_valve_pos = max(
+            #         new_valve_pos,
+            #         self.sweet_spot * slope_factor * -self.thermostat_slope)
+            new_valve_pos = self.sweet_spot
+            self.heating_started_at = now
+            LOGGER.info("%s: Turning on from position 0. Directly go to %.2f.",
+                    self.name, new_valve_pos)
+
+        valve_pos_changes = math.ceil(new_valve_pos) != self.raw_position
+
+        # Reset target_temperature_changed
+        self.target_temperature_changed = False
+
+        self.position = new_valve_pos
+        if not valve_pos_changes:
+            return None
+
+        if (new_valve_pos == 0
+                and self.heating_started_at != HEATING_NOT_STARTED):
+            heating_duration = now - self.heating_started_at
+            if heating_duration < timedelta(hours=3):
+                # if we heated less than 3 hours sweet spot is probably too high
+                self.sweet_spot = self.sweet_spot * 0.67
+                LOGGER.info("%s: Heating period too short => decreased sweetspot to %.1f",
+                            self.name,
+                            self.sweet_spot)
+            self.heating_started_at = HEATING_NOT_STARTED
+
+        LOGGER.info((
+                    "%s: adjusted: "
+                    "  current_temperature=%.2f  target_temperature=%.2f  "
+                    "  error=%.2f  valve_pos=%.2f  new_valve_pos=%.2f"
+                ),
+                self.name,
+                self.thermostat_temperature,
+                self.target_temperature,
+                self.error,
+                valve_pos,
+                new_valve_pos)
+        return math.ceil(new_valve_pos)
@@ -0,0 +1,142 @@
+import time
+
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Union
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    METRICS_DURATION_BUCKETS_MS,
+    METRICS_WAIT_BUCKETS_S
+)
+from .valves_profiler import ValvesProfiler
+
+class Histogram:
+    # Fixed bucket histogram. A value lands in the first bucket whose upper bound
+    # is greater or equal, the last bucket has no upper bound.
+
+    def __init__(self, bounds:tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def record(self, value:float) -> None:
+        index = bisect_left(self._bounds, value)
+        self._counts[index] += 1
+        self._count += 1
+        self._total += value
+        if value > self._max:
+            self._max = value
+
+    def percentile(self, fraction:float) -> float:
+        # upper bound of the bucket containing the percentile, max for the last bucket
+        if self._count == 0:
+            return 0.0
+        rank = fraction * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if index < len(self._bounds):
+                    return min(self._bounds[index], self._max)
+                return self._max
+        return self._max
+
+    @property
+    def average(self) -> float:
+        return self._total / self._count if self._count > 0 else 0.0
+
+    @property
+    def attributes(self) -> dict[str, Any]:
+        buckets = {}
+        for index, count in enumerate(self._counts):
+            name = f"le_{self._bounds[index]:g}" if index < len(self._bounds) else "inf"
+            buckets[name] = count
+        return {
+            "count": self._count,
+            "avg": round(self.average, 3),
+            "p50": round(self.percentile(0.5), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "max": round(self._max, 3),
+            "buckets": buckets
+        }
+
+
+class ValvesMetrics:
+    # Timings of the hot paths, published as states next to valves.valves_queue:
+    #   valves.valves_update_duration        ValveCover update in ms
+    #   valves.valves_queue_wait             set_valve to dispatch in seconds
+    #   valves.valves_service_latency_<backend>  valve write service call in ms
+    #   valves.valves_queue_retries          failed writes which are retried
+
+    def __init__(self, hass:HomeAssistant, profiler:Union[ValvesProfiler, None] = None):
+        self._hass = hass
+        self._profiler = ValvesProfiler(hass) if profiler is None else profiler
+        self._update_duration = Histogram(METRICS_DURATION_BUCKETS_MS)
+        self._queue_wait = Histogram(METRICS_WAIT_BUCKETS_S)
+        self._service_latency: dict[str, Histogram] = {}
+        self._retries: dict[str, int] = {}
+        self._failures: dict[str, int] = {}
+        self._parked: dict[str, int] = {}
+
+    @property
+    def profiler(self) -> ValvesProfiler:
+        return self._profiler
+
+    async def async_measure_update(self, update:Callable[[], Awaitable[Any]]) -> Any:
+        started_at = time.perf_counter()
+        try:
+            return await update()
+        finally:
+            self._update_duration.record((time.perf_counter() - started_at) * 1000.0)
+
+    def record_queue_wait(self, seconds:float) -> None:
+        self._queue_wait.record(seconds)
+
+    def record_service_latency(self, backend:str, seconds:float) -> None:
+        histogram = self._service_latency.get(backend)
+        if histogram is None:
+            histogram = Histogram(METRICS_DURATION_BUCKETS_MS)
+            self._service_latency[backend] = histogram
+        histogram.record(seconds * 1000.0)
+
+    def record_failure(self, backend:str) -> None:
+        self._failures[backend] = self._failures.get(backend, 0) + 1
+
+    def record_retry(self, backend:str) -> None:
+        self._retries[backend] = self._retries.get(backend, 0) + 1
+
+    def record_parked(self, backend:str) -> None:
+        self._parked[backend] = self._parked.get(backend, 0) + 1
+
+    @callback
+    def async_update_state(self, now=None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (now)
+
+        self._hass.states.async_set(
+                'valves.valves_update_duration',
+                round(self._update_duration.average, 3),
+                {**self._update_duration.attributes, "unit_of_measurement": "ms"})
+        self._hass.states.async_set(
+                'valves.valves_queue_wait',
+                round(self._queue_wait.average, 1),
+                {**self._queue_wait.attributes, "unit_of_measurement": "s"})
+        for backend, histogram in self._service_latency.items():
+            self._hass.states.async_set(
+                    f"valves.valves_service_latency_{backend}",
+                    round(histogram.average, 1),
+                    {**histogram.attributes, "unit_of_measurement": "ms"})
+        attributes = {}
+        for backend in sorted(set(self._retries) | set(self._failures) | set(self._parked)):
+            attributes[f"{backend}_failures"] = self._failures.get(backend, 0)
+            attributes[f"{backend}_retries"] = self._retries.get(backend, 0)
+            attributes[f"{backend}_parked"] = self._parked.get(backend, 0)
+        self._hass.states.async_set(
+                'valves.valves_queue_retries', sum(self._retries.values()), attributes)
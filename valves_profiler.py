@@ -0,0 +1,94 @@
+import cProfile
+import io
+import pstats
+
+from datetime import timedelta
+from typing import Union
+
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import utcnow
+
+from .const import (
+    LOGGER,
+    PROFILER_DEFAULT_DURATION,
+    PROFILER_MAX_DURATION,
+    PROFILER_TOP_ENTRIES
+)
+
+class ValvesProfiler:
+    # cProfile hook which can be toggled at runtime via the services valves.profile_start
+    # and valves.profile_stop. While a sampling window is open, the event loop, which runs
+    # the ValveCover updates and the queue, is profiled. The stats are written to
+    # <config>/valves_profile_<time>.prof for snakeviz & co.
+
+    def __init__(self, hass:HomeAssistant):
+        self._hass = hass
+        self._loop_profile: Union[cProfile.Profile, None] = None
+        self._started_at = None
+        self._unsub_stop = None
+        self._last_file = None
+        self.update_state()
+
+    @property
+    def active(self) -> bool:
+        return self._loop_profile is not None
+
+    def update_state(self) -> None:
+        attributes = {}
+        if self._started_at is not None:
+            attributes["started_at"] = self._started_at.isoformat()
+        if self._last_file is not None:
+            attributes["last_file"] = self._last_file
+        self._hass.states.async_set(
+                'valves.valves_profiler', "on" if self.active else "off", attributes)
+
+    @callback
+    def async_start(self, duration:timedelta = PROFILER_DEFAULT_DURATION) -> None:
+        if self.active:
+            LOGGER.warning("Profiler already running since %s", self._started_at)
+            return
+        duration = min(duration, PROFILER_MAX_DURATION)
+        LOGGER.info("Starting profiler for %s", duration)
+        self._loop_profile = cProfile.Profile()
+        self._loop_profile.enable()
+        self._started_at = utcnow()
+        self._unsub_stop = async_call_later(
+                self._hass, duration.total_seconds(), self.async_stop)
+        self.update_state()
+
+    async def async_stop(self, now=None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (now)
+
+        if not self.active:
+            return
+        if self._unsub_stop is not None:
+            self._unsub_stop()
+            self._unsub_stop = None
+        loop_profile = self._loop_profile
+        loop_profile.disable()
+        self._loop_profile = None
+        file_name = self._hass.config.path(
+                f"valves_profile_{self._started_at.strftime('%Y%m%d_%H%M%S')}.prof")
+        self._started_at = None
+        self._last_file = await self._hass.async_add_executor_job(
+                self.write_stats, loop_profile, file_name)
+        self.update_state()
+
+    def write_stats(self, loop_profile:cProfile.Profile, file_name:str) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(loop_profile, stream=stream)
+        stats.dump_stats(file_name)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILER_TOP_ENTRIES)
+        LOGGER.info("Profile written to %s\n%s", file_name, stream.getvalue())
+        return file_name
+
+    async def async_handle_start(self, call:ServiceCall) -> None:
+        self.async_start(call.data["duration"])
+
+    async def async_handle_stop(self, call:ServiceCall) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (call)
+
+        await self.async_stop()
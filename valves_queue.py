@@ -1,95 +1,560 @@
 
 import asyncio
+import math
+import random
+import time
 
-from datetime import datetime
-from collections import OrderedDict
+from datetime import datetime, timedelta
 from typing import Union
 
-from homeassistant.core import HomeAssistant
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.storage import Store
 from homeassistant.util import utcnow
 
+from .duty_cycle_budget import DutyCycleBudget
+from .pending_commands import PendingCommands
 from .const import (
+    DEFAULT_BACKEND_CONCURRENCY,
+    DEFAULT_QUEUE_BATCH_SIZE,
+    DEFAULT_QUEUE_MAX_ATTEMPTS,
+    HOMEMATIC_BACKENDS,
     LOGGER,
-    QUEUE_INTERVAL_TIMEDELTA
+    NORMALIZE_CONFIRMATION_TIMEOUT,
+    PRIORITY_NAMES,
+    PRIORITY_NORMAL,
+    PRIORITY_URGENT,
+    QUEUE_INTERVAL_TIMEDELTA,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    STORAGE_KEY,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+    UNKNOWN_BACKEND,
+    WRITE_CONFIRMATION_TIMEOUT
 )
 from .valve_actuator_proxy import ValveActuatorProxy
+from .valves_metrics import ValvesMetrics
+from .valves_queue_lane import ValvesQueueLane
 
 class ValvesQueue:
-    def __init__(self, hass:HomeAssistant, homematic_duty_cycle_sensor:Union[str, None]):
+    def __init__(self, hass:HomeAssistant, homematic_duty_cycle_sensor:Union[str, None],
+            batch_size:int = DEFAULT_QUEUE_BATCH_SIZE,
+            backend_concurrency:Union[dict[str, int], None] = None,
+            backend_interval:Union[dict[str, float], None] = None,
+            duty_cycle_budget:Union[DutyCycleBudget, None] = None,
+            max_attempts:int = DEFAULT_QUEUE_MAX_ATTEMPTS,
+            metrics:Union[ValvesMetrics, None] = None):
         self._hass = hass
-        self._homematic_duty_cycle_sensor = homematic_duty_cycle_sensor
+        self._metrics = ValvesMetrics(hass) if metrics is None else metrics
+        self._max_attempts = max(1, int(max_attempts))
+        if duty_cycle_budget is None:
+            duty_cycle_budget = DutyCycleBudget(hass, homematic_duty_cycle_sensor)
+        self._duty_cycle_budget = duty_cycle_budget
+        self._batch_size = max(1, int(batch_size))
+        self._backend_concurrency = dict(DEFAULT_BACKEND_CONCURRENCY)
+        if backend_concurrency is not None:
+            self._backend_concurrency.update(backend_concurrency)
+        self._backend_interval = {}
+        if backend_interval is not None:
+            for backend, interval in backend_interval.items():
+                self._backend_interval[backend] = timedelta(seconds=float(interval))
 
-        self._queue = OrderedDict()
-        self._updated_at = utcnow()
+        self._lanes: dict[str, ValvesQueueLane] = {}
+        self._wait_time_stats: dict[int, dict[str, float]] = {}
+        # failed attempts per entity, or per room for grouped writes
+        self._retry_attempts: dict[str, int] = {}
+        # valves which are written together, by room and room by valve
+        self._room_members: dict[str, list[str]] = {}
+        self._rooms: dict[str, str] = {}
+        self._dead_letters: dict[str, dict] = {}
+        self._dead_letter_unsubs = {}
+        # last successfully sent position and send time per entity
+        self._sent_positions: dict[str, tuple[int, float]] = {}
+        self._elided_writes = 0
+        # normalize commands waiting for the device to report the expected state
+        self._pending_commands = PendingCommands()
+        self._suppressed_commands = 0
+        # persisted entries waiting for their ValveCover to be added
+        self._restored_entries: dict[str, dict] = {}
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
         self.update_state()
 
     def update_state(self):
-        self._hass.states.async_set('valves.valves_queue', self.queue_size)
+        self._hass.states.async_set('valves.valves_queue', self.queue_size, self.attributes)
+        for lane in self._lanes.values():
+            self._hass.states.async_set(
+                    f"valves.valves_queue_{lane.backend}", lane.queue_size)
+        self._hass.states.async_set(
+                'valves.valves_queue_dead_letters',
+                len(self._dead_letters),
+                {"entity_ids": sorted(self._dead_letters.keys())})
+
+    @property
+    def metrics(self) -> ValvesMetrics:
+        return self._metrics
 
     @property
     def queue_size(self):
-        return len(self._queue)
+        return sum(lane.queue_size for lane in self._lanes.values())
 
-    def set_valve(self, valve_actuator:ValveActuatorProxy, value:int, urgent:bool = True) -> None:
-        self._queue[valve_actuator.entity_name] = {
-            "valve_actuator": valve_actuator,
-            "value": value,
-            "urgent": urgent
+    @property
+    def attributes(self) -> dict[str, float]:
+        attributes = {
+            "elided_writes": self._elided_writes,
+            "pending_commands": len(self._pending_commands),
+            "suppressed_commands": self._suppressed_commands
         }
+        for priority, stats in sorted(self._wait_time_stats.items()):
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            attributes[f"wait_time_{name}_count"] = int(stats["count"])
+            attributes[f"wait_time_{name}_avg"] = round(stats["total"] / stats["count"], 1)
+            attributes[f"wait_time_{name}_max"] = round(stats["max"], 1)
+        return attributes
+
+    @property
+    def dead_letters(self) -> list[str]:
+        return sorted(self._dead_letters.keys())
+
+    def retry_delay(self, attempts:int) -> float:
+        delay = min(RETRY_BACKOFF_MAX.total_seconds(),
+                RETRY_BACKOFF_BASE.total_seconds() * 2 ** (attempts - 1))
+        # jitter spreads retries of valves which failed at the same time
+        return delay * random.uniform(0.5, 1.0)
+
+    def set_rooms(self, rooms:dict[str, list[str]]) -> None:
+        self._room_members = {room: list(members) for room, members in rooms.items()}
+        self._rooms = {}
+        for room, members in self._room_members.items():
+            for entity_name in members:
+                self._rooms[entity_name] = room
+        LOGGER.info("Grouping writes of rooms %s", self._room_members)
+
+    def park(self, entry:dict, attempts:int) -> None:
+        entity_name = entry["valve_actuator"].entity_name
+        LOGGER.warning("Failed to set %s %d times. Parking it until it is back online "
+                "or for %s.", entity_name, attempts, RETRY_BACKOFF_MAX)
+        entry["parked_at"] = utcnow().timestamp()
+        self._dead_letters[entity_name] = entry
+        if entity_name not in self._dead_letter_unsubs:
+            self._dead_letter_unsubs[entity_name] = async_track_state_change_event(
+                    self._hass, [entity_name], self.async_readmit)
+
+    def drop_dead_letter(self, entity_name:str) -> Union[dict, None]:
+        unsub = self._dead_letter_unsubs.pop(entity_name, None)
+        if unsub is not None:
+            unsub()
+        return self._dead_letters.pop(entity_name, None)
+
+    @callback
+    def async_readmit(self, event:Event) -> None:
+        # Only a valve coming back online is worth a new try. A valve which is online
+        # but rejects writes keeps reporting temperatures and would loop forever.
+        entity_name = event.data.get("entity_id")
+        old_state = event.data.get("old_state")
+        new_state = event.data.get("new_state")
+        if new_state is None or new_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return
+        if old_state is not None and old_state.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+            return
+        entry = self.drop_dead_letter(entity_name)
+        if entry is None:
+            return
+        LOGGER.info("%s reported state %s. Re-admitting it to the queue.",
+                entity_name, new_state.state)
+        self.reset_retry_attempts(entity_name)
+        self.readmit(entry)
+
+    def readmit(self, entry:dict) -> None:
+        entry.pop("retry_at", None)
+        entry.pop("parked_at", None)
+        entry["enqueued_at"] = utcnow().timestamp()
+        self.enqueue(entry)
         self.update_state()
-        asyncio.run_coroutine_threadsafe(self.async_process_queue(), self._hass.loop)
 
-    async def async_process_queue(self, now=None) -> None:
+    def retry_parked(self, now:float) -> None:
+        # A valve which stays online but rejected the writes gets a slow retry. Its
+        # attempts are kept, so another failure parks it again right away.
+        for entity_name, entry in list(self._dead_letters.items()):
+            if now < entry["parked_at"] + RETRY_BACKOFF_MAX.total_seconds():
+                continue
+            LOGGER.info("%s parked for %s. Re-admitting it to the queue.",
+                    entity_name, RETRY_BACKOFF_MAX)
+            self.drop_dead_letter(entity_name)
+            self.readmit(entry)
+
+    def reset_retry_attempts(self, entity_name:str) -> None:
+        self._retry_attempts.pop(entity_name, None)
+        room = self._rooms.get(entity_name)
+        if room is not None:
+            self._retry_attempts.pop(room, None)
+
+    def queued_value(self, entity_name:str) -> Union[int, None]:
+        entry = self._dead_letters.get(entity_name)
+        for lane in self._lanes.values():
+            if entry is not None:
+                break
+            entry = lane.get(entity_name)
+        return None if entry is None else int(entry["value"])
+
+    @callback
+    def async_unsubscribe(self, event:Union[Event, None] = None) -> None:
         # Get rid of "pylint unused argument warning"
-        _ = (now)
+        _ = (event)
+
+        for unsub in self._dead_letter_unsubs.values():
+            unsub()
+        self._dead_letter_unsubs = {}
 
-        if self.queue_size == 0:
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        if data is None:
             return
-        if utcnow() < self._updated_at + QUEUE_INTERVAL_TIMEDELTA:
+        for stored_entry in data.get("entries", []):
+            self._restored_entries[stored_entry["entity_id"]] = stored_entry
+        LOGGER.info("Loaded %d persisted queue entries", len(self._restored_entries))
+
+    def prune_restored(self, entity_names:list[str]) -> None:
+        # entries of valves removed from the configuration would be saved back forever
+        removed = [name for name in self._restored_entries if name not in entity_names]
+        if len(removed) == 0:
             return
-        if self.duty_cycle_too_high:
+        for entity_name in removed:
+            del self._restored_entries[entity_name]
+        LOGGER.info("Dropped persisted queue entries of removed valves %s", removed)
+        self.async_schedule_save()
+
+    def restore_valve(self, valve_actuator:ValveActuatorProxy) -> None:
+        stored_entry = self._restored_entries.pop(valve_actuator.entity_name, None)
+        if stored_entry is None:
             return
-        if self.decalcification_time:
-            LOGGER.info("decalcification time")
+        value = int(stored_entry["value"])
+        valve_position = valve_actuator.valve_position
+        if (valve_actuator.reports_written_position and valve_position is not None
+                and math.ceil(valve_position) == value):
+            LOGGER.info("%s already at persisted queue value %d. Dropping it.",
+                    valve_actuator.entity_name, value)
+            self.async_schedule_save()
             return
+        LOGGER.info("%s: Restored queue entry with value %d",
+                valve_actuator.entity_name, value)
+        self.enqueue({
+            "valve_actuator": valve_actuator,
+            "value": value,
+            "urgent": bool(stored_entry["urgent"]),
+            "priority": int(stored_entry["priority"]),
+            "enqueued_at": float(stored_entry["enqueued_at"])
+        })
+        self.update_state()
+
+    @callback
+    def async_schedule_save(self) -> None:
+        self._store.async_delay_save(self.data_to_save, STORAGE_SAVE_DELAY.total_seconds())
+
+    def data_to_save(self) -> dict:
+        stored_entries = list(self._restored_entries.values())
+        for lane in self._lanes.values():
+            for entry in lane.entries:
+                if "service_call" in entry:
+                    # normalize commands are requested again by the next update
+                    continue
+                stored_entries.append({
+                    "entity_id": entry["valve_actuator"].entity_name,
+                    "value": int(entry["value"]),
+                    "urgent": bool(entry["urgent"]),
+                    "priority": int(entry["priority"]),
+                    "enqueued_at": entry["enqueued_at"]
+                })
+        return {"entries": stored_entries}
 
-        self._updated_at = utcnow()
-        entry = self._queue.popitem(False)[1]
+    def record_wait_time(self, entry:dict) -> None:
+        wait_time = utcnow().timestamp() - entry["enqueued_at"]
+        stats = self._wait_time_stats.setdefault(
+                entry["priority"], {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += wait_time
+        stats["max"] = max(stats["max"], wait_time)
+        self._metrics.record_queue_wait(wait_time)
+
+    @property
+    def tick_interval(self) -> timedelta:
+        return min([QUEUE_INTERVAL_TIMEDELTA] + list(self._backend_interval.values()))
+
+    def backend_concurrency(self, backend:str) -> int:
+        return max(1, int(self._backend_concurrency.get(backend, 1)))
+
+    def lane(self, backend:Union[str, None]) -> ValvesQueueLane:
+        if backend is None:
+            backend = UNKNOWN_BACKEND
+        lane = self._lanes.get(backend)
+        if lane is None:
+            admit = None
+            if backend in HOMEMATIC_BACKENDS:
+                admit = self.admit_homematic
+            lane = ValvesQueueLane(
+                    backend,
+                    self._backend_interval.get(backend, QUEUE_INTERVAL_TIMEDELTA),
+                    self.backend_concurrency(backend),
+                    [lambda: self.decalcification_time],
+                    admit)
+            self._lanes[backend] = lane
+            LOGGER.info("Created queue lane %s with interval %s and concurrency %d",
+                    backend, lane.interval, lane.concurrency)
+        return lane
+
+    def admit_homematic(self, entry:dict) -> bool:
+        # both Homematic lanes share the radio and with it the duty cycle budget
+        return self._duty_cycle_budget.try_consume(bool(entry["urgent"]))
+
+    def enqueue(self, entry:dict) -> None:
         valve_actuator = entry["valve_actuator"]
-        value = int(entry["value"])
-        urgent = bool(entry["urgent"])
+        entity_name = valve_actuator.entity_name
+        lane = self.lane(valve_actuator.backend)
+        # the backend may have been resolved since the entity was queued last time
+        for other_lane in self._lanes.values():
+            if other_lane is not lane:
+                other_lane.remove(entity_name)
+        lane.put(entity_name, entry)
+
+    def is_queued(self, entity_name:str) -> bool:
+        for lane in self._lanes.values():
+            if entity_name in lane:
+                return True
+        return False
+
+    def is_redundant(self, valve_actuator:ValveActuatorProxy, value:int) -> bool:
+        entity_name = valve_actuator.entity_name
+        if valve_actuator.reports_written_position:
+            valve_position = valve_actuator.valve_position
+            # the controllers write the ceiled position
+            if valve_position is not None and math.ceil(valve_position) == value:
+                return True
+        sent_position = self._sent_positions.get(entity_name)
+        if sent_position is None:
+            return False
+        sent_value, sent_at = sent_position
+        # the valve may report a sent position with delay, e.g. Homematic in WAKEUP mode
+        return (sent_value == value
+                and utcnow().timestamp() < sent_at + WRITE_CONFIRMATION_TIMEOUT.total_seconds())
+
+    @callback
+    def async_set_valve(self, valve_actuator:ValveActuatorProxy, value:int, urgent:bool = True,
+            priority:Union[int, None] = None) -> None:
+        entity_name = valve_actuator.entity_name
+        if self.is_redundant(valve_actuator, int(value)):
+            self._elided_writes += 1
+            # a queued different value would move the valve away from the requested one
+            for lane in self._lanes.values():
+                lane.remove(entity_name)
+            self.drop_dead_letter(entity_name)
+            LOGGER.info("%s already at %d - skipping write. Elided writes=%d",
+                    entity_name, value, self._elided_writes)
+            self.update_state()
+            self.async_schedule_save()
+            return
+        if priority is None:
+            priority = PRIORITY_URGENT if urgent else PRIORITY_NORMAL
+        entry = {
+            "valve_actuator": valve_actuator,
+            "value": value,
+            "urgent": urgent,
+            "priority": priority,
+            "enqueued_at": utcnow().timestamp()
+        }
+        if self.queued_value(entity_name) != int(value):
+            # failures of an older value don't count towards parking the new one
+            self.reset_retry_attempts(entity_name)
+        if entity_name in self._dead_letters:
+            # keep it parked with the latest value until it's re-admitted
+            entry["parked_at"] = self._dead_letters[entity_name]["parked_at"]
+            self._dead_letters[entity_name] = entry
+            return
+        self.enqueue(entry)
+        self.update_state()
+        self.async_schedule_save()
+        self._hass.async_create_task(self.async_process_queue())
+
+    @callback
+    def async_normalize(self, entity_name:str, backend:Union[str, None], name:str,
+            domain:str, service:str, data:dict, needed:bool = True,
+            timeout:timedelta = NORMALIZE_CONFIRMATION_TIMEOUT) -> bool:
+        # Queues a service call which brings a device into the expected state, e.g.
+        # its hvac_mode. The same call is not repeated while it's in flight, i.e. until
+        # the device reports the expected state (needed is False) or the timeout elapsed.
+        # Returns True if the call was queued.
+        key = f"{entity_name}/{name}"
+        if not needed:
+            self._pending_commands.confirm(key)
+            return False
+        now = utcnow().timestamp()
+        if self._pending_commands.is_pending(key, data, now):
+            self._suppressed_commands += 1
+            return False
+        self._pending_commands.add(key, data, now + timeout.total_seconds())
+        self.lane(backend).put(key, {
+            "key": key,
+            "entity_name": entity_name,
+            "backend": backend,
+            "service_call": (domain, service, data),
+            "urgent": False,
+            "priority": PRIORITY_NORMAL,
+            "enqueued_at": now
+        })
+        self.update_state()
+        self._hass.async_create_task(self.async_process_queue())
+        return True
+
+    async def async_process_queue(self, now=None) -> None:
+        # Get rid of "pylint unused argument warning"
+        _ = (now)
+
+        self.retry_parked(utcnow().timestamp())
+        entries = []
+        for lane in list(self._lanes.values()):
+            if lane.ready:
+                entries.extend(lane.pop_batch(self._batch_size))
+        if len(entries) == 0:
+            return
+        groups = self.group_entries(entries)
+        for _, group in groups:
+            for entry in group:
+                self.record_wait_time(entry)
         self.update_state()
+        self.async_schedule_save()
+        await asyncio.gather(*[
+            self.async_dispatch(group[0]) if room is None
+            else self.async_dispatch_group(room, group)
+            for room, group in groups
+        ])
+
+    def group_entries(self, entries:list[dict]) -> list[tuple[Union[str, None], list[dict]]]:
+        # Writes of valves in the same room are dispatched together. Queued writes of
+        # the other valves in the room join the group even if their lane is not ready,
+        # so the valves of a room don't drift apart by several queue ticks.
+        groups = []
+        room_groups: dict[str, list[dict]] = {}
+        for entry in entries:
+            room = None
+            if "service_call" not in entry:
+                room = self._rooms.get(entry["valve_actuator"].entity_name)
+            if room is None:
+                groups.append((None, [entry]))
+            elif room in room_groups:
+                room_groups[room].append(entry)
+            else:
+                room_groups[room] = [entry]
+                groups.append((room, room_groups[room]))
+        now = utcnow().timestamp()
+        for room, group in room_groups.items():
+            grouped = set(entry["valve_actuator"].entity_name for entry in group)
+            for entity_name in self._room_members[room]:
+                if entity_name in grouped:
+                    continue
+                for lane in self._lanes.values():
+                    entry = lane.take(entity_name, now)
+                    if entry is not None:
+                        group.append(entry)
+                        break
+        return groups
+
+    async def async_dispatch_service_call(self, entry:dict) -> bool:
+        domain, service, data = entry["service_call"]
+        backend = entry["backend"] or UNKNOWN_BACKEND
+        started_at = time.perf_counter()
         try:
-            result = await valve_actuator.async_set_valve_position(value, urgent)
+            await self._hass.services.async_call(domain, service, data, blocking=True)
+            result = True
         except Exception as exception:  # pylint: disable=broad-except
             LOGGER.error(exception)
             result = False
+        self._metrics.record_service_latency(backend, time.perf_counter() - started_at)
         if result:
-            LOGGER.info("%s set to %d via queue. Queue size=%d",
-                    valve_actuator.entity_name, value, self.queue_size)
+            LOGGER.info("%s: Called %s.%s via queue. Queue size=%d",
+                    entry["key"], domain, service, self.queue_size)
         else:
-            LOGGER.warning("Failed to set %s to %d via queue. Rescheduling. Queue size=%d",
-                    valve_actuator.entity_name, value, self.queue_size)
-            self._queue[valve_actuator.entity_name] = entry
+            self._metrics.record_failure(backend)
+            # not in flight anymore - the next update requests it again
+            self._pending_commands.confirm(entry["key"])
+        return result
 
-    @property
-    def duty_cycle_too_high(self):
-        if self._homematic_duty_cycle_sensor is None:
-            LOGGER.warning("duty_cycle_too_high: homematic_duty_cycle_sensor missing in config")
-            return False
-        homematic_duty_cycle_sensor = self._hass.states.get(self._homematic_duty_cycle_sensor)
-        if homematic_duty_cycle_sensor is None:
-            LOGGER.warning("duty_cycle_too_high: homematic_duty_cycle_sensor does not exist")
-            return False
-        duty_cycle = homematic_duty_cycle_sensor.state
-        if duty_cycle is None:
-            LOGGER.warning("duty_cycle_too_high: homematic_duty_cycle_sensor state is missing")
-            return False
-        too_high = float(duty_cycle) > 75
-        if too_high:
-            LOGGER.warning("duty cycle too high: %d - don't process queue with keys %s",
-                    float(duty_cycle), list(self._queue.keys()))
-        return too_high
+    async def async_dispatch(self, entry:dict) -> bool:
+        if "service_call" in entry:
+            return await self.async_dispatch_service_call(entry)
+        entity_name = entry["valve_actuator"].entity_name
+        result = await self.async_send(entry)
+        if result:
+            self._retry_attempts.pop(entity_name, None)
+            self.sent(entry)
+        else:
+            attempts = self._retry_attempts.get(entity_name, 0) + 1
+            self._retry_attempts[entity_name] = attempts
+            self.failed(entry, attempts, self.retry_delay(attempts))
+        return result
+
+    async def async_dispatch_group(self, room:str, entries:list[dict]) -> bool:
+        results = await asyncio.gather(*[self.async_send(entry) for entry in entries])
+        failed_entries = []
+        for entry, result in zip(entries, results):
+            if result:
+                self._retry_attempts.pop(entry["valve_actuator"].entity_name, None)
+                self.sent(entry)
+            else:
+                failed_entries.append(entry)
+        if len(failed_entries) == 0:
+            self._retry_attempts.pop(room, None)
+            return True
+        attempts = self._retry_attempts.get(room, 0) + 1
+        self._retry_attempts[room] = attempts
+        # one backoff for the room, so the failed valves are retried together
+        retry_delay = self.retry_delay(attempts)
+        for entry in failed_entries:
+            self.failed(entry, attempts, retry_delay)
+        return False
+
+    async def async_send(self, entry:dict) -> bool:
+        valve_actuator = entry["valve_actuator"]
+        backend = valve_actuator.backend or UNKNOWN_BACKEND
+        started_at = time.perf_counter()
+        try:
+            result = await valve_actuator.async_set_valve_position(
+                    int(entry["value"]), bool(entry["urgent"]))
+        except Exception as exception:  # pylint: disable=broad-except
+            LOGGER.error(exception)
+            result = False
+        self._metrics.record_service_latency(backend, time.perf_counter() - started_at)
+        return result
+
+    def sent(self, entry:dict) -> None:
+        entity_name = entry["valve_actuator"].entity_name
+        value = int(entry["value"])
+        self._sent_positions[entity_name] = (value, utcnow().timestamp())
+        LOGGER.info("%s set to %d via queue. Queue size=%d",
+                entity_name, value, self.queue_size)
+
+    def failed(self, entry:dict, attempts:int, retry_delay:float) -> None:
+        entity_name = entry["valve_actuator"].entity_name
+        value = int(entry["value"])
+        backend = entry["valve_actuator"].backend or UNKNOWN_BACKEND
+        self._metrics.record_failure(backend)
+        if self.is_queued(entity_name):
+            LOGGER.warning("Failed to set %s to %d via queue. Newer value already queued. "
+                    "Queue size=%d",
+                    entity_name, value, self.queue_size)
+        elif attempts >= self._max_attempts:
+            self._metrics.record_parked(backend)
+            self.park(entry, attempts)
+            self.update_state()
+        else:
+            LOGGER.warning("Failed to set %s to %d via queue (attempt %d). "
+                    "Rescheduling in %ds. Queue size=%d",
+                    entity_name, value, attempts, retry_delay, self.queue_size)
+            self._metrics.record_retry(backend)
+            entry["enqueued_at"] = utcnow().timestamp()
+            entry["retry_at"] = entry["enqueued_at"] + retry_delay
+            self.enqueue(entry)
+            self.update_state()
+            self.async_schedule_save()
 
     @property
     def decalcification_time(self):
@@ -98,4 +563,7 @@ class ValvesQueue:
         if now.weekday() != 5:
             return False
         now_str = now.strftime("%H:%M:%S")
-        return now_str >= "10:55:00" and now_str <= "11:05:00"
+        decalcification_time = now_str >= "10:55:00" and now_str <= "11:05:00"
+        if decalcification_time:
+            LOGGER.info("decalcification time")
+        return decalcification_time
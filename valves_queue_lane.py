@@ -0,0 +1,133 @@
+import heapq
+
+from datetime import timedelta
+from typing import Callable, Union
+
+from homeassistant.util import utcnow
+
+from .const import PRIORITY_AGING_SECONDS
+
+class ValvesQueueLane:
+    def __init__(self, backend:str, interval:timedelta, concurrency:int,
+            gates:list[Callable[[], bool]],
+            admit:Union[Callable[[dict], bool], None] = None):
+        self._backend = backend
+        self._interval = interval
+        self._concurrency = max(1, int(concurrency))
+        # A gate returns True if the lane must not dispatch right now
+        self._gates = gates
+        # admit decides per entry if it may be dispatched now, e.g. by duty cycle budget
+        self._admit = admit
+
+        # Heap of (key, seq, entity_name) with one live entry per entity in _entries.
+        # Heap items whose seq doesn't match the live entry are stale and skipped.
+        self._heap = []
+        self._entries: dict[str, dict] = {}
+        self._seq = 0
+        self._updated_at = utcnow()
+
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    @property
+    def interval(self) -> timedelta:
+        return self._interval
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._entries)
+
+    @property
+    def entity_names(self) -> list[str]:
+        return [item[2] for item in sorted(self._heap) if self.is_live(item)]
+
+    @property
+    def entries(self) -> list[dict]:
+        return [self._entries[entity_name] for entity_name in self.entity_names]
+
+    def __contains__(self, entity_name:str) -> bool:
+        return entity_name in self._entries
+
+    def is_live(self, item:tuple) -> bool:
+        entry = self._entries.get(item[2])
+        return entry is not None and entry["seq"] == item[1]
+
+    @staticmethod
+    def key(entry:dict) -> float:
+        # Each priority level is worth PRIORITY_AGING_SECONDS of waiting time, so
+        # long waiting entries eventually overtake newer ones of higher priority.
+        return entry["enqueued_at"] + entry["priority"] * PRIORITY_AGING_SECONDS
+
+    def put(self, entity_name:str, entry:dict) -> None:
+        queued_entry = self._entries.get(entity_name)
+        if queued_entry is not None:
+            # coalesce: keep the place in the queue, the higher priority and urgency
+            entry["enqueued_at"] = min(entry["enqueued_at"], queued_entry["enqueued_at"])
+            entry["priority"] = min(entry["priority"], queued_entry["priority"])
+            entry["urgent"] = entry["urgent"] or queued_entry["urgent"]
+            # a new value must not bypass the backoff of a failing valve
+            if "retry_at" in queued_entry:
+                entry["retry_at"] = max(entry.get("retry_at", 0.0), queued_entry["retry_at"])
+        self._seq += 1
+        entry["seq"] = self._seq
+        self._entries[entity_name] = entry
+        heapq.heappush(self._heap, (self.key(entry), self._seq, entity_name))
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [item for item in self._heap if self.is_live(item)]
+            heapq.heapify(self._heap)
+
+    def get(self, entity_name:str) -> Union[dict, None]:
+        return self._entries.get(entity_name)
+
+    def remove(self, entity_name:str) -> None:
+        self._entries.pop(entity_name, None)
+
+    def take(self, entity_name:str, now:float) -> Union[dict, None]:
+        # Removes the entry of an entity out of order if it may be dispatched now,
+        # e.g. to send it together with the writes of the other valves in its room.
+        entry = self._entries.get(entity_name)
+        if entry is None or entry.get("retry_at", 0.0) > now:
+            return None
+        if self._admit is not None and not self._admit(entry):
+            return None
+        del self._entries[entity_name]
+        return entry
+
+    @property
+    def ready(self) -> bool:
+        if self.queue_size == 0:
+            return False
+        if utcnow() < self._updated_at + self._interval:
+            return False
+        for gate in self._gates:
+            if gate():
+                return False
+        return True
+
+    def pop_batch(self, batch_size:int) -> list[dict]:
+        now = utcnow().timestamp()
+        entries = []
+        skipped = []
+        while len(self._heap) > 0 and len(entries) < min(batch_size, self._concurrency):
+            item = heapq.heappop(self._heap)
+            if not self.is_live(item):
+                continue
+            entry = self._entries[item[2]]
+            if entry.get("retry_at", 0.0) > now:
+                skipped.append(item)
+                continue
+            if self._admit is not None and not self._admit(entry):
+                skipped.append(item)
+                continue
+            del self._entries[item[2]]
+            entries.append(entry)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        if len(entries) > 0:
+            self._updated_at = utcnow()
+        return entries